@@ -5,8 +5,9 @@ Author:  Nathan Cordner
 
 """
 
-from basic_arc import basic_arc_plot
-import matplotlib.pyplot as plt
+from itertools import permutations
+
+from count_crossing import count_graph_crossings
 
 
 def dfs(dfs_stack, order, explored, adj_list):
@@ -74,7 +75,194 @@ def minimize_crossings(node_labels = [], arcs = []):
     return order           
             
 
+def canonical_rotation(order, reference):
+    """
+
+    Canonical form of a circular order:  rotated so that the first node of
+    'reference' comes first, and reflected if needed so that the second
+    node precedes the last one in 'reference'. Two orders have the same
+    crossing count whenever their canonical forms are equal.
+
+    Inputs:
+    -- order:  list of node labels
+    -- reference:  list of the same labels, fixing the anchor and the
+       direction
+
+    """
+
+    rank = {n: k for k, n in enumerate(reference)}
+    start = order.index(reference[0])
+    order = order[start:] + order[:start]
+    if len(order) > 2 and rank[order[1]] > rank[order[-1]]:
+        order = [order[0]] + order[:0:-1]
+    return order
+
+
+def exact_circular_order(node_labels = [], arcs = []):
+    """
+
+    Crossing-minimal circular order by exhaustive search, for a handful of
+    nodes. Crossings do not change under rotation or reflection, so the
+    first node stays fixed and only orders whose second node precedes their
+    last node are counted: (n - 1)! / 2 orders instead of n!.
+
+    Inputs:
+    -- node_labels:  a list of unique node labels
+    -- arcs:  a list of tuples of format (node_label_1, node_label_2)
+
+    Output:  the best order, in canonical form (see canonical_rotation)
+
+    """
+
+    if len(node_labels) < 4:
+        return list(node_labels)
+
+    anchor, rest = node_labels[0], list(node_labels[1:])
+    best = None
+    for perm in permutations(range(len(rest))):
+        if perm[0] > perm[-1]:
+            continue  # reflection of an order already counted
+        order = [anchor] + [rest[k] for k in perm]
+        crossings = count_graph_crossings(order, arcs)
+        if best is None or crossings < best[0]:
+            best = (crossings, order)
+            if crossings == 0:
+                break
+    return best[1]
+
+
+# Graphs up to this size get an exact dense eigendecomposition; larger ones
+# use Lanczos iterations on the sparse Laplacian
+DENSE_LIMIT = 800
+LANCZOS_STEPS = 60
+
+
+def _laplacian_product(size, rows, cols, vals, degree):
+    """
+    Returns x -> L x for the weighted Laplacian L = D - A given as edge
+    arrays (each undirected edge listed in both directions): O(m) per call.
+    """
+    import numpy as np
+
+    def product(x):
+        return degree * x - np.bincount(rows, weights=vals * x[cols],
+                                        minlength=size)
+
+    return product
+
+
+def _fiedler_vector(size, rows, cols, vals):
+    """
+    Eigenvector of the second-smallest eigenvalue of the weighted Laplacian:
+    dense eigh up to DENSE_LIMIT nodes, otherwise LANCZOS_STEPS Lanczos
+    steps with full reorthogonalization, started orthogonal to the constant
+    vector (the smallest eigenvector).
+    """
+    import numpy as np
+
+    degree = np.bincount(rows, weights=vals, minlength=size)
+    if size <= DENSE_LIMIT:
+        laplacian = np.diag(degree)
+        np.subtract.at(laplacian, (rows, cols), vals)
+        return np.linalg.eigh(laplacian)[1][:, 1]
+
+    product = _laplacian_product(size, rows, cols, vals, degree)
+    q = np.random.default_rng(0).standard_normal(size)
+    q -= q.mean()
+    basis = [q / np.linalg.norm(q)]
+    alphas, betas = [], []
+    for _ in range(min(LANCZOS_STEPS, size - 1)):
+        w = product(basis[-1])
+        alphas.append(w @ basis[-1])
+        Q = np.array(basis)
+        w -= Q.T @ (Q @ w)
+        w -= w.mean()
+        beta = np.linalg.norm(w)
+        if beta < 1e-10:
+            break
+        betas.append(beta)
+        basis.append(w / beta)
+
+    k = len(alphas)
+    T = np.diag(alphas) + np.diag(betas[:k - 1], 1) + np.diag(betas[:k - 1], -1)
+    ritz = np.linalg.eigh(T)[1][:, 0]
+    return np.array(basis[:k]).T @ ritz
+
+
+def spectral_order(node_labels = [], arcs = [], group_dict = None, weights = None):
+    """
+
+    Spectral ordering:  nodes sorted by the Fiedler vector of the weighted
+    graph Laplacian, so strongly connected nodes end up close together.
+    Costs one dense eigendecomposition for small graphs, otherwise O(m) per
+    Lanczos step; meant as a starting order for local_adjusting, LS and
+    multilevel refinement.
+
+    Inputs:
+    -- node_labels:  a list of unique node labels
+    -- arcs:  a list of tuples whose first two entries are node labels
+    -- group_dict:  optional {node_label: group_label}. Each group is then
+       ordered by the Fiedler vector of its own subgraph, and groups stay
+       contiguous, in the order of their first node in node_labels. Each
+       group is flipped so that nodes linked to earlier groups come first
+    -- weights:  optional arc weights (default: each arc weighs 1, so a
+       repeated arc weighs its multiplicity). Self-loops are ignored
+
+    Output:  new list of node labels
+
+    """
+    import numpy as np
+
+    if group_dict is None:
+        group_of = {n: None for n in node_labels}
+    else:
+        group_of = {n: group_dict[n] for n in node_labels}
+    blocks = list(dict.fromkeys(group_of.values()))
+    block_rank = {g: k for k, g in enumerate(blocks)}
+
+    members = {g: [] for g in blocks}
+    for n in node_labels:
+        members[group_of[n]].append(n)
+
+    inside = {g: [] for g in blocks}
+    # sum of (block of far end - own block) * weight over edges that leave
+    # the group; negative when a node mostly links to earlier groups
+    pull = {n: 0.0 for n in node_labels}
+    for k, arc in enumerate(arcs):
+        a, b = arc[0], arc[1]
+        if a == b:
+            continue
+        w = 1.0 if weights is None else float(weights[k])
+        if group_of[a] == group_of[b]:
+            inside[group_of[a]].append((a, b, w))
+        else:
+            pull[a] += (block_rank[group_of[b]] - block_rank[group_of[a]]) * w
+            pull[b] += (block_rank[group_of[a]] - block_rank[group_of[b]]) * w
+
+    order = []
+    for g in blocks:
+        nodes = members[g]
+        if len(nodes) < 3 or not inside[g]:
+            order += sorted(nodes, key=lambda n: pull[n])
+            continue
+        index = {n: i for i, n in enumerate(nodes)}
+        edges = np.array([(index[a], index[b], w) for a, b, w in inside[g]])
+        rows = np.concatenate([edges[:, 0], edges[:, 1]]).astype(np.int64)
+        cols = np.concatenate([edges[:, 1], edges[:, 0]]).astype(np.int64)
+        vals = np.concatenate([edges[:, 2], edges[:, 2]])
+
+        fiedler = _fiedler_vector(len(nodes), rows, cols, vals)
+        if fiedler @ np.array([pull[n] for n in nodes]) < 0:
+            fiedler = -fiedler
+        order += [nodes[i] for i in np.argsort(fiedler, kind="stable")]
+
+    return order
+
+
 if __name__ == "__main__":
+    from basic_arc import basic_arc_plot
+    import matplotlib.pyplot as plt
+
     # Test case    
     node_order =  ["Amina", "Diego", "Liam", "Mei", "Zanele"]
     arcs = [
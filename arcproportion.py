@@ -0,0 +1,348 @@
+"""
+Batch chart rendering
+
+    python -m arcproportion render manifest.json [-j WORKERS]
+
+-- renders every job in a JSON manifest with the headless layout + svg_backend
+   path (Agg for PNG, direct writer for SVG); no interactive backend is used
+-- jobs run in a process pool, in batches of jobs on the same input file;
+   a worker loads a dataset at most once and reuses it for the rest of its
+   batch (and any later batch on the same file)
+-- prints one timing line per job and can write all timings as JSON
+
+Manifest format (paths are relative to the manifest's directory):
+
+    {
+      "datasets": {"hp": "datasets/hp_top_ten.csv"},
+      "jobs": [
+        {"input": "hp", "chart": "proportion_arc", "output": "out/hp.png",
+         "options": {"source_col": "source", "dest_col": "target",
+                     "value_col": "weight", "crossing_method": null}},
+        {"input": "datasets/myrtle_edges.csv", "chart": "grouped_arc",
+         "groups": "datasets/myrtle_houses.csv", "output": "out/myrtle.svg",
+         "options": {"dest_col": "target"}}
+      ]
+    }
+
+-- "input" is a name from "datasets" or a CSV path
+-- "chart" is one of basic_arc, grouped_arc, proportion_arc, chord
+-- "groups" (optional) is a node,group CSV turned into ``group_dict``
+-- "options" are passed to the chart's ``compute_*_layout`` function
+-- "output" ends in .svg, .png or .json (the layout itself)
+
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+CHART_TYPES = ("basic_arc", "grouped_arc", "proportion_arc", "chord")
+OUTPUT_TYPES = (".svg", ".png", ".json")
+
+# Per-process dataset caches, keyed by absolute path
+_TABLES = {}
+_GROUPS = {}
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _load_table(path):
+    if path not in _TABLES:
+        import pandas as pd
+        _TABLES[path] = pd.read_csv(path)
+    return _TABLES[path]
+
+
+def _load_groups(path, node_col="node", group_col="group"):
+    key = (path, node_col, group_col)
+    if key not in _GROUPS:
+        df = _load_table(path)
+        _GROUPS[key] = dict(zip(df[node_col], df[group_col]))
+    return _GROUPS[key]
+
+
+def _with_defaults(df, defaults):
+    """
+    Add any missing optional edge columns (color, width) with the defaults
+    basic_arc uses, without touching the cached DataFrame.
+
+    """
+    missing = {col: value for col, value in defaults.items()
+               if col not in df.columns}
+    return df.assign(**missing) if missing else df
+
+
+def compute_layout(chart, df, group_dict=None, options=None):
+    """
+    Dispatch one job to its chart module's layout function.
+
+    Inputs:
+        chart:       one of CHART_TYPES
+        df:          edge list
+        group_dict:  node -> group (needed by grouped_arc)
+        options:     keyword arguments for the chart's compute_*_layout
+
+    Output:  the chart's ``Layout``
+
+    """
+    options = {} if options is None else options
+    if chart == "basic_arc":
+        from basic_arc import compute_basic_arc_layout
+        return compute_basic_arc_layout(df=df, **options)
+
+    if chart == "grouped_arc":
+        from cluster_arc import compute_grouped_arc_layout
+        if group_dict is None:
+            raise ValueError("grouped_arc jobs need a \"groups\" file.")
+        df = _with_defaults(df, {options.get("color_col", "color"): "lightgray",
+                                 options.get("width_col", "width"): 1})
+        return compute_grouped_arc_layout(group_dict, df=df, **options)
+
+    if chart == "proportion_arc":
+        from proportion_arc import compute_proportion_arc_layout
+        df = _with_defaults(df, {options.get("color_col", "color"): "lightgray"})
+        return compute_proportion_arc_layout(df=df, group_dict=group_dict,
+                                             **options)
+
+    if chart == "chord":
+        from chord_chart import compute_chord_layout
+        return compute_chord_layout(df=df, group_dict=group_dict, **options)
+
+    raise ValueError(f"Unknown chart type {chart!r}; expected one of "
+                     f"{', '.join(CHART_TYPES)}.")
+
+
+def run_job(job, tessellation="fixed", dpi=100, stats=False):
+    """
+    Load, lay out and write a single resolved job (see ``load_manifest``).
+
+    Output:  dict with the job's index, output path, status ("ok" or
+             "error"), error message and per-stage timings in seconds
+             (load, layout, render, total). With `stats`, the job runs
+             inside an ``instrument.recording()`` and the result also has
+             "stages" (seconds per pipeline stage) and "counters"
+             (crossing evaluations, moves tried / accepted, ...).
+
+    """
+    from contextlib import nullcontext
+    from instrument import recording
+    from svg_backend import save_layout
+
+    result = {"index": job["index"], "output": job["output"], "status": "ok",
+              "error": None}
+    start = time.perf_counter()
+    try:
+        df = _load_table(job["input"])
+        group_dict = None
+        if job.get("groups"):
+            group_dict = _load_groups(job["groups"])
+        loaded = time.perf_counter()
+
+        with recording() if stats else nullcontext() as recorded:
+            layout = compute_layout(job["chart"], df, group_dict,
+                                     job.get("options", {}))
+            laid_out = time.perf_counter()
+
+            out_dir = os.path.dirname(job["output"])
+            if out_dir:
+                os.makedirs(out_dir, exist_ok=True)
+            if job["output"].lower().endswith(".json"):
+                layout.save(job["output"])
+            else:
+                save_layout(layout, job["output"], tessellation=tessellation,
+                            dpi=dpi)
+            done = time.perf_counter()
+
+        if recorded is not None:
+            result["stages"] = recorded.by_stage()
+            result["counters"] = recorded.totals()
+            result["values"] = recorded.noted()
+
+        result["timings"] = {"load": loaded - start,
+                             "layout": laid_out - loaded,
+                             "render": done - laid_out,
+                             "total": done - start}
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["timings"] = {"total": time.perf_counter() - start}
+
+    return result
+
+
+def _run_batch(jobs, tessellation="fixed", dpi=100, stats=False):
+    """
+    Run jobs that share an input file one after another in this process, so
+    the file is read once.
+
+    """
+    return [run_job(job, tessellation, dpi, stats) for job in jobs]
+
+
+def _batches(jobs, workers):
+    """
+    Split the jobs into batches of the same input file, in manifest order
+    within each batch. Inputs with more jobs than an even share of the pool
+    are cut into several batches, so one large dataset doesn't leave the
+    other workers idle.
+
+    """
+    by_input = {}
+    for job in sorted(jobs, key=lambda job: (job["input"], job["index"])):
+        by_input.setdefault(job["input"], []).append(job)
+    size = max(1, -(-len(jobs) // workers))
+    return [group[start:start + size] for group in by_input.values()
+            for start in range(0, len(group), size)]
+
+
+def load_manifest(file_name):
+    """
+    Read a manifest and resolve every job's input, groups and output paths
+    relative to the manifest's directory.
+
+    Output:  list of job dicts, each with an added "index"
+
+    """
+    with open(file_name, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(file_name))
+    datasets = manifest.get("datasets", {})
+
+    def resolve(path):
+        return os.path.normpath(os.path.join(base, path))
+
+    jobs = []
+    for i, job in enumerate(manifest["jobs"]):
+        for key in ("input", "chart", "output"):
+            if key not in job:
+                raise ValueError(f"Job {i} is missing {key!r}.")
+        if job["chart"] not in CHART_TYPES:
+            raise ValueError(f"Job {i}: unknown chart type {job['chart']!r}.")
+        if os.path.splitext(job["output"])[1].lower() not in OUTPUT_TYPES:
+            raise ValueError(f"Job {i}: unknown output format "
+                             f"{job['output']!r}; expected one of "
+                             f"{', '.join(OUTPUT_TYPES)}.")
+
+        resolved = dict(job, index=i,
+                        input=resolve(datasets.get(job["input"], job["input"])),
+                        output=resolve(job["output"]))
+        if job.get("groups"):
+            resolved["groups"] = resolve(datasets.get(job["groups"],
+                                                      job["groups"]))
+        jobs.append(resolved)
+    return jobs
+
+
+def render_manifest(jobs, workers=None, tessellation="fixed", dpi=100,
+                    report=None, stats=False):
+    """
+    Run resolved jobs in a process pool and collect their results in
+    manifest order. Jobs are submitted in batches of the same input file
+    (see ``_batches``), so a dataset is read once per batch rather than
+    once per job.
+
+    Inputs:
+        jobs:          output of ``load_manifest``
+        workers:       pool size (default: CPU count); 1 runs in-process
+        tessellation:  "fixed" or "adaptive" ribbon sampling
+        dpi:           output resolution for PNG files
+        report:        optional callable, called with each result as it
+                       finishes
+        stats:         record per-stage timings and counters for each job
+                       (costs one extra crossing count per job)
+
+    Output:  list of result dicts (see ``run_job``)
+
+    """
+    results = []
+
+    if workers == 1:
+        _init_worker()
+        for job in sorted(jobs, key=lambda job: (job["input"], job["index"])):
+            results.append(run_job(job, tessellation, dpi, stats))
+            if report:
+                report(results[-1])
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker) as pool:
+            futures = [pool.submit(_run_batch, batch, tessellation, dpi, stats)
+                       for batch in _batches(jobs, workers)]
+            for future in as_completed(futures):
+                for result in future.result():
+                    results.append(result)
+                    if report:
+                        report(result)
+
+    return sorted(results, key=lambda r: r["index"])
+
+
+def _print_result(result):
+    t = result["timings"]
+    if result["status"] == "ok":
+        print(f"[{result['index']:>4}] ok     {t['total']:8.3f}s  "
+              f"(load {t['load']:.3f}  layout {t['layout']:.3f}  "
+              f"render {t['render']:.3f})  {result['output']}", flush=True)
+        if result.get("counters"):
+            print("       " + ", ".join(f"{k}={v}" for k, v
+                                        in result["counters"].items()),
+                  flush=True)
+    else:
+        print(f"[{result['index']:>4}] FAILED {t['total']:8.3f}s  "
+              f"{result['output']}: {result['error']}", flush=True)
+
+
+def _render_command(args):
+    jobs = load_manifest(args.manifest)
+    start = time.perf_counter()
+    results = render_manifest(jobs, workers=args.workers,
+                              tessellation=args.tessellation, dpi=args.dpi,
+                              stats=args.stats,
+                              report=_print_result)
+    wall = time.perf_counter() - start
+
+    failed = sum(r["status"] != "ok" for r in results)
+    print(f"{len(results) - failed}/{len(results)} charts rendered in "
+          f"{wall:.2f}s wall time")
+
+    if args.timings:
+        with open(args.timings, "w", encoding="utf-8") as f:
+            json.dump({"wall": wall, "jobs": results}, f, indent=2)
+
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m arcproportion")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    render = commands.add_parser("render",
+                                 help="render every job in a manifest")
+    render.add_argument("manifest", help="JSON manifest of chart jobs")
+    render.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes (default: CPU count; 1 runs "
+                             "in-process)")
+    render.add_argument("--tessellation", choices=("fixed", "adaptive"),
+                        default="fixed")
+    render.add_argument("--dpi", type=int, default=100)
+    render.add_argument("--timings", metavar="FILE",
+                        help="also write per-job timings as JSON")
+    render.add_argument("--stats", action="store_true",
+                        help="record per-stage timings and counters "
+                             "(crossing evaluations, moves) per job")
+
+    args = parser.parse_args(argv)
+    if args.command == "render":
+        return _render_command(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
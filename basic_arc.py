@@ -8,11 +8,9 @@ Author:  Nathan Cordner
 
 """
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-import pandas as pd
-
-from helper import auto_resize, wrap_labels
+from helper import auto_resize, new_figure, wrap_labels
+from instrument import staged
+from layout import Layout
 
 
 class Arc:
@@ -27,6 +25,7 @@ class Arc:
         self.color = color
         self.width = width
 
+@staged("ingest")
 def _labels_from_df(df, source_col="source", dest_col="dest"):
     """
     Return node labels from Pandas dataframe
@@ -41,6 +40,7 @@ def _labels_from_df(df, source_col="source", dest_col="dest"):
     # list and sort
     return sorted(list(combined))
 
+@staged("ingest")
 def _arcs_from_df(df, node_index, source_col="source", dest_col="dest",
                   color_col="color", width_col="width",
                   default_color="lightgray", default_width=1):
@@ -48,6 +48,8 @@ def _arcs_from_df(df, node_index, source_col="source", dest_col="dest",
     Create list of Arc objects from Pandas dataframe 
 
     """
+    import pandas as pd
+
     arcs = []
     for i in range(len(df)):
         row = df.iloc[i]
@@ -83,6 +85,8 @@ def _draw_arc(arc:  Arc, ax):
     radius = right - midpoint
     
     # draw arc with provided customizations 
+    import matplotlib.patches as mpatches
+
     new_arc = mpatches.Arc(xy = (midpoint, 0),  width = 2 * radius, height = radius,
                            theta1 = 0, theta2 = 180, color = arc.color, lw = arc.width)
     ax.add_patch(new_arc)
@@ -91,33 +95,18 @@ def _draw_arc(arc:  Arc, ax):
     return radius  
     
   
-def basic_arc_plot(df=None, node_labels=[], arcs=[], figsize="auto",
-                   title="", default_color="lightgray", default_width=1,
-                   source_col="source", dest_col="dest",
-                   color_col="color", width_col="width"):
+@staged("layout")
+def compute_basic_arc_layout(df=None, node_labels=[], arcs=[], figsize="auto",
+                             title="", default_color="lightgray",
+                             default_width=1, source_col="source",
+                             dest_col="dest", color_col="color",
+                             width_col="width"):
     """
-        
-    Function for creating a basic arc plot
-    
-    Inputs:
-    -- df:  Pandas data frame (columns configurable via source_col, dest_col,
-            color_col, width_col)
-    
-    If no dataframe provided, then required inputs are
-    -- node_labels:  a list of unique strings that define node positions
-    -- arcs:  a list of tuples: (source, dest), (source, dest, color),
-              or (source, dest, color, width)
-    
-    Optional inputs include
-    -- figsize:  if set to "auto", figure is resized based on node label length
-    -- title:  prints a title on the chart
-    -- default_color:  fallback arc color (default "lightgray")
-    -- default_width:  fallback arc line width (default 1)
-    -- source_col:  name of source column in DataFrame (default "source")
-    -- dest_col:  name of dest column in DataFrame (default "dest")
-    -- color_col:  name of color column in DataFrame (default "color")
-    -- width_col:  name of width column in DataFrame (default "width")
-    
+    Compute the layout of a basic arc plot without drawing it. Inputs are
+    the same as ``basic_arc_plot``.
+
+    Output:  ``Layout`` with chart type "basic_arc" (see layout.py)
+
     """
     
     if not df is None:
@@ -149,13 +138,11 @@ def basic_arc_plot(df=None, node_labels=[], arcs=[], figsize="auto",
         fig_height = fig_width / 4 + 0.25 * max(0, max_lines - 1)
         figsize = (fig_width, fig_height)
 
-    fig, ax = plt.subplots(figsize=figsize)
-
-    # Plot nodes
+    # Arc endpoints
     x_vals = range(len(node_labels))
-    ax.set_xticks(x_vals, wrapped_labels)
-     
-    # Plot arcs
+    arc_ends = []
+    arc_colors = []
+    arc_widths = []
     max_height = 0
     for arc in arcs:
         if not isinstance(arc, Arc):
@@ -168,23 +155,109 @@ def basic_arc_plot(df=None, node_labels=[], arcs=[], figsize="auto",
         else:
             cur_arc = arc
 
-        radius = _draw_arc(cur_arc, ax)
+        # assume that left has the lower coordinate value
+        left, right = sorted((cur_arc.source, cur_arc.dest))
+        arc_ends.append((left, right))
+        arc_colors.append(cur_arc.color)
+        arc_widths.append(cur_arc.width)
+
+        radius = (right - left) / 2
         if radius > max_height:
             max_height = radius
+
+    return Layout(
+        chart="basic_arc",
+        figsize=tuple(figsize),
+        title=title,
+        xlim=(0 - x_vals[-1] * 0.01, x_vals[-1] * 1.01),
+        ylim=(0, (max_height / 2) * 1.01),
+        nodes=list(node_labels),
+        labels=wrapped_labels,
+        x_positions=list(x_vals),
+        label_colors=["black"] * len(node_labels),
+        arcs=arc_ends,
+        arc_colors=arc_colors,
+        arc_widths=arc_widths,
+    )
+
+
+@staged("render")
+def render_basic_arc_layout(layout, ax):
+    """
+    Draw a basic arc layout (from ``compute_basic_arc_layout``) onto ``ax``.
+    
+    """
+
+    # Plot nodes
+    ax.set_xticks(layout["x_positions"], layout["labels"])
+    for xtick, color in zip(ax.get_xticklabels(), layout["label_colors"]):
+        xtick.set_color(color)
+     
+    # Plot arcs
+    for (left, right), color, width in zip(layout["arcs"],
+                                           layout["arc_colors"],
+                                           layout["arc_widths"]):
+        _draw_arc(Arc(left, right, color=color, width=width), ax)
     
     # final adjustments
-    ax.set_ylim(0, (max_height / 2) * 1.01)  
-    ax.set_xlim(0 - x_vals[-1] * 0.01, x_vals[-1] * 1.01)
+    ax.set_ylim(*layout["ylim"])
+    ax.set_xlim(*layout["xlim"])
 
     ax.set_yticklabels([])
     ax.spines[["left", "right", "top", "bottom"]].set_visible(False)
     ax.tick_params(axis = "both", length = 0)
-    ax.set_title(title)
+    ax.set_title(layout["title"])
+
+  
+def basic_arc_plot(df=None, node_labels=[], arcs=[], figsize="auto",
+                   title="", default_color="lightgray", default_width=1,
+                   source_col="source", dest_col="dest",
+                   color_col="color", width_col="width", pyplot=True):
+    """
+        
+    Function for creating a basic arc plot
+    
+    Inputs:
+    -- df:  Pandas data frame (columns configurable via source_col, dest_col,
+            color_col, width_col)
+    
+    If no dataframe provided, then required inputs are
+    -- node_labels:  a list of unique strings that define node positions
+    -- arcs:  a list of tuples: (source, dest), (source, dest, color),
+              or (source, dest, color, width)
+    
+    Optional inputs include
+    -- figsize:  if set to "auto", figure is resized based on node label length
+    -- title:  prints a title on the chart
+    -- default_color:  fallback arc color (default "lightgray")
+    -- default_width:  fallback arc line width (default 1)
+    -- source_col:  name of source column in DataFrame (default "source")
+    -- dest_col:  name of dest column in DataFrame (default "dest")
+    -- color_col:  name of color column in DataFrame (default "color")
+    -- width_col:  name of width column in DataFrame (default "width")
+    -- pyplot:  True (default) draws on a pyplot figure; False draws on a
+                standalone Agg Figure that pyplot never sees (thread-safe,
+                freed once the caller drops it)
+
+    Output:  (fig, ax)
+    
+    """
+    
+    layout = compute_basic_arc_layout(df=df, node_labels=node_labels,
+                                      arcs=arcs, figsize=figsize, title=title,
+                                      default_color=default_color,
+                                      default_width=default_width,
+                                      source_col=source_col, dest_col=dest_col,
+                                      color_col=color_col, width_col=width_col)
+
+    fig, ax = new_figure(layout["figsize"], pyplot=pyplot)
+    render_basic_arc_layout(layout, ax)
     
     return fig, ax
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
 
     # Test Run
     cities = ["Los Angeles", "Denver", "Texas", "Chicago", "Washington D.C.", "Philadelphia", "New York City"]
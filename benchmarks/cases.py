@@ -0,0 +1,105 @@
+"""
+Benchmark graphs
+-- the bundled datasets and synthetic graphs the benchmark scripts run on,
+   and the options each chart's layout function gets for them
+-- shared by pipeline.py, schedule.py and checks.py
+
+"""
+
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+DATASET_DIR = os.path.join(REPO_ROOT, "datasets")
+
+# Bundled datasets: edge file, its column names, optional node,group file
+DATASETS = {
+    "arXiv_final_25": {"file": "arXiv_final_25.csv",
+                       "value_col": "connections"},
+    "arXiv_final_35": {"file": "arXiv_final_35.csv",
+                       "value_col": "connections"},
+    "arXiv_final_50": {"file": "arXiv_final_50.csv",
+                       "value_col": "connections"},
+    "harry_potter_house_interactions": {
+        "file": "harry_potter_house_interactions.csv",
+        "value_col": "connections"},
+    "hp_character_interactions": {"file": "hp_character_interactions.csv",
+                                  "value_col": "weight",
+                                  "groups": "hp_character_houses.csv"},
+    "hp_top_ten": {"file": "hp_top_ten.csv", "dest_col": "target",
+                   "value_col": "weight"},
+    "myrtle_edges": {"file": "myrtle_edges.csv", "dest_col": "target",
+                     "value_col": "weight", "groups": "myrtle_houses.csv"},
+    "power_grid": {"file": "power_grid.csv", "value_col": "connections",
+                   "groups": "power_grid_groups.csv"},
+}
+
+# Datasets small enough for --quick
+QUICK_DATASETS = ("arXiv_final_25", "harry_potter_house_interactions",
+                  "power_grid")
+
+# Synthetic graph generators and sizes (nodes); edges = 2 * nodes
+KINDS = ("erdos_renyi", "power_law", "planted_clusters", "flow_graph")
+SIZES = (10, 20, 40)
+QUICK_SIZES = (10,)
+
+
+def graph_sources(quick, sizes, kinds):
+    """
+    Yield (name, loader) for every graph to benchmark. A loader returns
+    (df, group_dict or None, column options).
+
+    """
+    import pandas as pd
+
+    for name, spec in DATASETS.items():
+        if quick and name not in QUICK_DATASETS:
+            continue
+
+        def load(spec=spec):
+            df = pd.read_csv(os.path.join(DATASET_DIR, spec["file"]))
+            group_dict = None
+            if spec.get("groups"):
+                groups = pd.read_csv(os.path.join(DATASET_DIR,
+                                                  spec["groups"]))
+                group_dict = dict(zip(groups["node"], groups["group"]))
+            columns = {"source_col": spec.get("source_col", "source"),
+                       "dest_col": spec.get("dest_col", "dest"),
+                       "value_col": spec["value_col"]}
+            return df, group_dict, columns
+
+        yield name, load
+
+    for kind in kinds:
+        for n in sizes:
+            def load(kind=kind, n=n):
+                from synthetic import generate, to_dataframe
+
+                _, edges, group_dict = generate(kind, n, 2 * n, seed=n)
+                return to_dataframe(edges), group_dict, {
+                    "source_col": "source", "dest_col": "dest",
+                    "value_col": "value"}
+
+            yield f"{kind}_{n}", load
+
+
+def chart_options(chart, columns, method, group_dict):
+    """
+    Keyword arguments for ``arcproportion.compute_layout``.
+
+    """
+    options = {"source_col": columns["source_col"],
+               "dest_col": columns["dest_col"]}
+    if chart == "proportion_arc":
+        options["value_col"] = columns["value_col"]
+        options["crossing_method"] = method
+    elif chart == "grouped_arc":
+        options["crossing_method"] = method
+    elif chart == "chord":
+        options["weight_col"] = columns["value_col"]
+        options["crossing_method"] = method
+        if group_dict is not None:
+            options["groups"] = sorted(set(group_dict.values()), key=str)
+    return options
@@ -0,0 +1,208 @@
+"""
+Behavior checks
+-- small regression checks for the ordering heuristics, run on synthetic
+   graphs through the public entry points; count_crossing.verify covers
+   the crossing counts themselves
+-- prints one line per check and exits with status 1 if any fails
+
+Run from the repository root:
+
+    python benchmarks/checks.py [--only NAME] [--seeds 5]
+
+New checks go in CHECKS below. A check takes the number of seeds and
+returns None when it passes, otherwise a message describing the first
+failure.
+
+"""
+
+import argparse
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from synthetic import GENERATORS, generate  # noqa: E402
+
+
+def _graphs(seeds, sizes=(6, 9), edges_per_node=2, groups=3):
+    """
+    Yield (name, nodes, arcs, group_dict) for small synthetic graphs: every
+    generator, every size, 'seeds' seeds.
+
+    """
+    for kind in GENERATORS:
+        for n in sizes:
+            for seed in range(seeds):
+                nodes, edges, group_dict = generate(
+                    kind, n, edges_per_node * n, seed=seed, groups=groups)
+                yield f"{kind}_{n}/seed {seed}", nodes, edges, group_dict
+
+
+def check_chord_local_search(seeds):
+    """
+    Chord LS inside clusters tries every ordered pair of distinct nodes in
+    each group once, and never ends with more crossings than it started.
+
+    """
+    from chord_chart import compute_chord_layout
+    from instrument import recording
+
+    for name, nodes, edges, group_dict in _graphs(seeds):
+        groups = sorted(set(group_dict.values()))
+        with recording() as stats:
+            compute_chord_layout(node_labels=nodes,
+                                 chords=[(a, b) for a, b, _ in edges],
+                                 groups=groups, group_dict=group_dict,
+                                 crossing_method="LS")
+        record = next(r for r in stats.heuristics
+                      if r.name == "local_search_grouped")
+        sizes = [list(group_dict.values()).count(g) for g in groups]
+        expected = sum(s * (s - 1) for s in sizes)
+        tried = record.counters.get("moves_tried", 0)
+        if tried != expected:
+            return f"{name}: tried {tried} swaps, expected {expected}"
+        if record.best_crossings > record.start_crossings:
+            return (f"{name}: ended with {record.best_crossings} crossings, "
+                    f"started with {record.start_crossings}")
+    return None
+
+
+def check_refine_clusters(seeds):
+    """
+    count_crossing.schedule.refine_clusters gives the order of refining
+    the clusters one after another, in-process and in a process pool, for
+    both LS and LA.
+
+    """
+    from cluster_arc import local_search_inside_clusters
+    from count_crossing import count_graph_crossings
+    from count_crossing.schedule import (adjusting_inside_cluster,
+                                         refine_clusters)
+
+    # sparse enough that some colors hold several clusters, so workers=2
+    # really runs a process pool
+    for name, nodes, edges, group_dict in _graphs(seeds, sizes=(12,),
+                                                  edges_per_node=1,
+                                                  groups=6):
+        nodes = sorted(nodes, key=lambda node: group_dict[node])
+        arcs = [(a, b) for a, b, _ in edges]
+        for refine in (local_search_inside_clusters,
+                       adjusting_inside_cluster):
+            in_order = list(nodes)
+            start, crossings = 0, count_graph_crossings(in_order, arcs)
+            while start < len(in_order):
+                start, crossings = refine(start, crossings, in_order, arcs,
+                                          group_dict)
+            for workers in (1, 2):
+                scheduled = list(nodes)
+                refine_clusters(scheduled, arcs, group_dict, refine, workers)
+                if scheduled != in_order:
+                    return (f"{name}: {refine.__name__} with workers="
+                            f"{workers} gave {scheduled}, in order gave "
+                            f"{in_order}")
+    return None
+
+
+def check_sort_ports(seeds):
+    """
+    On graphs without parallel arcs, the split graph's reference crossing
+    count after sort_ports equals the reference count of the node order:
+    no port order can do better.
+
+    """
+    import random
+
+    from count_crossing import count_graph_crossings
+    from proportion_arc import convert_to_basic_arc, sort_ports
+
+    for name, nodes, edges, _ in _graphs(seeds):
+        seen = set()
+        arcs = []
+        for a, b, value in edges:
+            if frozenset((a, b)) not in seen:
+                seen.add(frozenset((a, b)))
+                arcs.append((a, b, value))
+        nodes = list(nodes)
+        random.Random(name).shuffle(nodes)
+
+        ports, port_arcs, port_node, _ = convert_to_basic_arc(nodes, arcs)
+        sort_ports(nodes, ports, port_arcs, port_node)
+        got = count_graph_crossings(ports, [a[:2] for a in port_arcs])
+        expected = count_graph_crossings(nodes, [a[:2] for a in arcs])
+        if got != expected:
+            return (f"{name}: {got} crossings after sort_ports, the node "
+                    f"order has {expected}")
+    return None
+
+
+def check_auto_choice(seeds):
+    """
+    With the stored cost model, crossing_method="auto" picks a method the
+    graph's size band ranks, whose estimate fits the budget unless none
+    does, and picks something other than "multilevel" for at least one
+    chart and graph size: the ranking and the LS / LA estimates take part
+    in the choice.
+
+    """
+    from crossing_cost import (CHARTS, TARGET_SECONDS, choose_crossing_method,
+                               describe, estimate_seconds, load_model)
+    from instrument import recording
+
+    model = load_model()
+    others = set()
+    for name, nodes, edges, group_dict in _graphs(seeds, sizes=(10, 20, 40)):
+        for chart in CHARTS:
+            groups = None if chart == "proportion_arc" else group_dict
+            with recording() as stats:
+                method, _ = choose_crossing_method(chart, nodes, edges,
+                                                   groups)
+            estimates = stats.noted()["auto_estimates"]
+            if str(method) not in estimates:
+                return (f"{name}/{chart}: picked {method}, not among the "
+                        f"methods it estimated, {list(estimates)}")
+            graph = describe(chart, nodes, edges, groups)
+            seconds = estimate_seconds(chart, method, graph, model)
+            if seconds > TARGET_SECONDS and seconds > min(estimates.values()):
+                return (f"{name}/{chart}: picked {method} at {seconds:.2f}s "
+                        f"over a {TARGET_SECONDS}s budget")
+            if method != "multilevel":
+                others.add((chart, method))
+    if not others:
+        return "picked multilevel for every chart and graph size"
+    return None
+
+
+# name -> f(seeds) -> None or failure message
+CHECKS = {
+    "auto_choice": check_auto_choice,
+    "chord_local_search": check_chord_local_search,
+    "refine_clusters": check_refine_clusters,
+    "sort_ports": check_sort_ports,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--only", metavar="NAME", choices=sorted(CHECKS),
+                        help="run only this check")
+    parser.add_argument("--seeds", type=int, default=5,
+                        help="graphs per generator and size (default 5)")
+    args = parser.parse_args(argv)
+
+    import matplotlib
+    matplotlib.use("Agg")
+
+    failures = 0
+    for name, check in CHECKS.items():
+        if args.only and name != args.only:
+            continue
+        message = check(args.seeds)
+        failures += message is not None
+        print(f"{name:<28} {'ok' if message is None else 'FAIL: ' + message}",
+              flush=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Import-time benchmark
+-- imports each module in a fresh interpreter and reports the best
+   wall time over several runs
+-- fails (exit status 1) if a module pulls in matplotlib or pandas at import
+   time, or takes longer than --budget-ms
+
+Run from the repository root:
+
+    python benchmarks/import_time.py [--runs 5] [--budget-ms 500] [--json FILE]
+
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Algorithmic core: must never need the plotting stack
+CORE_MODULES = ["count_crossing", "arc_crossing", "preprocessing",
+                "layout_solver", "instrument", "synthetic"]
+
+# Chart and output modules: matplotlib / pandas load on first use only
+CHART_MODULES = ["geometry", "layout", "helper", "basic_arc", "cluster_arc",
+                 "proportion_arc", "chord_chart", "svg_backend",
+                 "arcproportion"]
+
+HEAVY_MODULES = ["matplotlib", "pandas"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed,
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module, runs=5):
+    """
+    Import `module` in `runs` fresh interpreters.
+
+    Output:  dict with the best import time in seconds and the heavy
+             modules that were loaded as a side effect
+
+    """
+    best = None
+    loaded = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c",
+             _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or result["seconds"] < best:
+            best = result["seconds"]
+        loaded = result["loaded"]
+    return {"module": module, "seconds": best, "loaded": loaded}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5,
+                        help="fresh interpreters per module (default 5)")
+    parser.add_argument("--budget-ms", type=float, default=500,
+                        help="maximum allowed import time per module")
+    parser.add_argument("--json", metavar="FILE",
+                        help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    failures = []
+    for module in CORE_MODULES + CHART_MODULES:
+        result = time_import(module, args.runs)
+        results.append(result)
+
+        ms = result["seconds"] * 1000
+        status = "ok"
+        if result["loaded"]:
+            status = "FAIL: imports " + ", ".join(result["loaded"])
+        elif ms > args.budget_ms:
+            status = f"FAIL: over {args.budget_ms:g} ms budget"
+        if status != "ok":
+            failures.append(module)
+        print(f"{module:<16} {ms:8.1f} ms  {status}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
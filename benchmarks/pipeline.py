@@ -0,0 +1,489 @@
+"""
+Pipeline benchmark
+-- times loading, ingestion, each crossing-reduction method, layout and
+   rendering for every bundled dataset and for synthetic graphs (see
+   synthetic.py) of increasing size
+-- per-stage times come from ``instrument.recording()``, so they match what
+   ``python -m arcproportion render --stats`` reports
+-- records the crossing count each case ends with and the number of
+   crossing-count evaluations it took
+-- writes all results as JSON so two commits can be compared, and with
+   ``--check BASELINE`` reruns the baseline's cases and exits non-zero when
+   a case got slower or ends with more crossings than the baseline allows
+-- with ``--calibrate FILE`` fits the cost model behind
+   ``crossing_method="auto"`` (see crossing_cost.py) to the results and
+   writes it to FILE; ``--max-ordering-seconds`` skips the LA / LS cases
+   the stored model expects to run for hours
+
+Run from the repository root:
+
+    python benchmarks/pipeline.py [--quick] [--repeat 3] [--json FILE]
+                                  [--only PATTERN] [--sizes 10,20,40]
+                                  [--kinds erdos_renyi,planted_clusters]
+    python benchmarks/pipeline.py --check benchmarks/baseline.json
+                                  [--time-tolerance 0.5] [--min-seconds 0.25]
+                                  [--crossing-tolerance 0]
+    python benchmarks/pipeline.py --max-ordering-seconds 600 \
+                                  --calibrate crossing_cost.json
+
+Each case is named ``<graph>/<chart>/<method>`` (e.g.
+``hp_top_ten/proportion_arc/LA``, ``power_law_40/chord/LS``); ``--only`` runs the cases whose name
+contains PATTERN. ``--quick`` keeps the small datasets and graphs and skips
+LA / LS where they would take more than a few seconds (each crossing count
+is O(n^4); LS on hp_top_ten takes minutes).
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cases import (KINDS, QUICK_SIZES, REPO_ROOT, SIZES,  # noqa: E402
+                   chart_options, graph_sources)
+
+# Crossing-reduction methods per chart; grouped_arc and grouped chord charts
+# always order the groups, so they have no "none" case
+METHODS = {"basic_arc": (None,),
+           "proportion_arc": (None, "sort", "multilevel", "LA", "LS",
+                              "auto"),
+           "grouped_arc": ("LA", "LS", "multilevel", "auto"),
+           "chord": (None, "LA", "LS", "multilevel", "auto")}
+
+# Stages compared by --check: the crossing reducers, the renderers, and the
+# whole case
+CHECK_STAGES = ("ordering", "render", "total")
+
+# --quick skips LA and LS on graphs with more edges than this. Proportional
+# charts order the split graph (two nodes per edge), so their limit is
+# lower: LA on power_grid (36 edges) already takes a minute.
+QUICK_ORDERING_EDGES = {"proportion_arc": 20}
+QUICK_ORDERING_EDGES_DEFAULT = 40
+
+
+def _cases(quick, sizes, kinds):
+    """
+    Yield (case name, loader, chart, method) in run order.
+
+    """
+    for graph, load in graph_sources(quick, sizes, kinds):
+        for chart, methods in METHODS.items():
+            for method in methods:
+                yield f"{graph}/{chart}/{method or 'none'}", load, chart, method
+
+
+def _final_crossings(layout, df, columns, recorded):
+    """
+    Crossings of the finished layout: the split-graph count noted by the
+    proportional chart, otherwise a count over the layout's node order.
+
+    """
+    from count_crossing import count_graph_crossings
+
+    noted = recorded.noted()
+    if "final_crossings" in noted:
+        return noted["final_crossings"]
+    pairs = [(a, b) for a, b in zip(df[columns["source_col"]],
+                                    df[columns["dest_col"]]) if a != b]
+    return count_graph_crossings(list(layout["nodes"]), pairs)
+
+
+def _describe(chart, df, columns, group_dict):
+    """
+    The case's graph as crossing_cost.describe sees it.
+
+    """
+    from crossing_cost import describe
+
+    sources, dests = df[columns["source_col"]], df[columns["dest_col"]]
+    nodes = list(dict.fromkeys([*sources, *dests]))
+    arcs = list(zip(sources, dests))
+    if chart != "proportion_arc":
+        arcs = [(a, b) for a, b in arcs if a != b]
+    return describe(chart, nodes, arcs, group_dict)
+
+
+def run_case(load, chart, method, repeat=1, out_dir=None):
+    """
+    Run one case `repeat` times and keep the fastest run of each stage.
+
+    Output:  dict with graph size, per-stage seconds (load, every recorded
+             pipeline stage, total), crossings and crossing evaluations;
+             charts with a crossing_method also get the "graph" the cost
+             model is fitted on, and "auto" cases the method it chose
+
+    """
+    from arcproportion import compute_layout
+    from crossing_cost import CHARTS
+    from instrument import EVALUATION_COUNTERS, recording
+    from svg_backend import save_layout
+
+    best = {}
+    result = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df, group_dict, columns = load()
+        loaded = time.perf_counter()
+
+        if group_dict is None and (chart == "grouped_arc"
+                                   or (chart == "chord" and method)):
+            return None    # ordering only applies to grouped charts
+        options = chart_options(chart, columns, method, group_dict)
+        with recording() as recorded:
+            layout = compute_layout(chart, df, group_dict, options)
+            save_layout(layout, os.path.join(out_dir, "chart.png"))
+        done = time.perf_counter()
+
+        seconds = {"load": loaded - start, **recorded.by_stage(),
+                   "total": done - start}
+        for name, value in seconds.items():
+            best[name] = min(best.get(name, value), value)
+
+        totals = recorded.totals()
+        result = {"nodes": len(layout["nodes"]), "edges": len(df),
+                  "evaluations": sum(totals.get(name, 0)
+                                     for name in EVALUATION_COUNTERS),
+                  "crossings": _final_crossings(layout, df, columns,
+                                                recorded)}
+        if chart in CHARTS:
+            result["graph"] = _describe(chart, df, columns, group_dict)
+        if method == "auto":
+            result["chosen"] = recorded.noted().get("auto_crossing_method")
+
+    result["seconds"] = best
+    return result
+
+
+def _warm_up(out_dir):
+    """
+    Run every chart type once on a tiny graph, untimed, so font caches and
+    lazy imports don't land in the first measured case.
+
+    """
+    def load():
+        from synthetic import generate, to_dataframe
+
+        _, edges, group_dict = generate("erdos_renyi", 6, 6, groups=2)
+        return to_dataframe(edges), group_dict, {
+            "source_col": "source", "dest_col": "dest", "value_col": "value"}
+
+    for chart, methods in METHODS.items():
+        run_case(load, chart, methods[0], 1, out_dir)
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             cwd=REPO_ROOT, capture_output=True, text=True,
+                             check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _estimated_ordering_seconds(load, chart, method):
+    """
+    Ordering seconds the stored cost model expects for a case.
+
+    """
+    from crossing_cost import CHARTS, estimate_seconds
+
+    if chart not in CHARTS:
+        return 0.0
+    df, group_dict, columns = load()
+    return estimate_seconds(chart, method,
+                            _describe(chart, df, columns, group_dict))
+
+
+def run_suite(quick=False, repeat=1, only=None, sizes=None, kinds=KINDS,
+              report=None, cases=None, auto=True, max_ordering_seconds=None):
+    """
+    Run every selected case.
+
+    Inputs:
+        quick:   small graphs only, and no LA / LS above
+                 QUICK_ORDERING_EDGES edges
+        repeat:  runs per case; the fastest time of each stage is kept
+        only:    run only cases whose name contains this string
+        sizes:   synthetic graph sizes (default SIZES, or QUICK_SIZES)
+        kinds:   synthetic graph generators (names in synthetic.GENERATORS)
+        report:  optional callable, called with each case result
+        cases:   optional collection of exact case names to run
+        auto:    also run the crossing_method="auto" cases (they need a
+                 fitted cost model)
+        max_ordering_seconds:  skip LA / LS cases whose ordering stage the
+                 stored cost model (crossing_cost.json) estimates at more
+                 than this
+
+    Output:  dict with "meta" (commit, python, platform, options) and
+             "results" (one dict per case, see ``run_case``)
+
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+    if sizes is None:
+        sizes = QUICK_SIZES if quick else SIZES
+
+    results = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        _warm_up(out_dir)
+        for case, load, chart, method in _cases(quick, sizes, kinds):
+            if only and only not in case:
+                continue
+            if cases is not None and case not in cases:
+                continue
+            if method == "auto" and not auto:
+                continue
+            limit = QUICK_ORDERING_EDGES.get(chart,
+                                             QUICK_ORDERING_EDGES_DEFAULT)
+            if quick and method in ("LA", "LS") and len(load()[0]) > limit:
+                continue
+            if (max_ordering_seconds is not None and method in ("LA", "LS")
+                    and _estimated_ordering_seconds(load, chart, method)
+                    > max_ordering_seconds):
+                continue
+            result = run_case(load, chart, method, repeat, out_dir)
+            if result is None:
+                continue
+            result = {"case": case, "chart": chart, "method": method,
+                      **result}
+            results.append(result)
+            if report:
+                report(result)
+
+    meta = {"commit": _git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick, "repeat": repeat, "only": only,
+            "max_ordering_seconds": max_ordering_seconds,
+            "sizes": list(sizes), "kinds": list(kinds),
+            "hashseed": os.environ.get("PYTHONHASHSEED")}
+    return {"meta": meta, "results": results}
+
+
+def compare(baseline, current, time_tolerance=0.5, min_seconds=0.25,
+            crossing_tolerance=0, stages=CHECK_STAGES):
+    """
+    Compare two suite results case by case.
+
+    Inputs:
+        baseline, current:   outputs of ``run_suite``
+        time_tolerance:      allowed slowdown as a fraction (0.5 = a stage
+                             may take up to 1.5x its baseline time)
+        min_seconds:         stages faster than this in the baseline are
+                             too noisy to compare and are skipped (the
+                             summed total of all common cases is always
+                             compared)
+        crossing_tolerance:  allowed increase in final crossings
+        stages:              stage names whose times are compared
+
+    Output:  (regressions, notes), lists of (case, kind, message) with kind
+             "time", "crossings" or "missing". Regressions are slowdowns,
+             more crossings and cases that no longer run; notes are new
+             cases, fewer crossings and large speedups. The suite-wide total
+             uses the case name "all".
+
+    """
+    regressions = []
+    notes = []
+    current_cases = {r["case"]: r for r in current["results"]}
+    baseline_cases = {r["case"]: r for r in baseline["results"]}
+
+    def timing(case, label, before, after):
+        ratio = after / before if before else 1.0
+        message = f"{label} {before:.3f}s -> {after:.3f}s ({ratio:.2f}x)"
+        if ratio > 1 + time_tolerance:
+            regressions.append((case, "time", message))
+        elif ratio < 1 / (1 + time_tolerance):
+            notes.append((case, "time", message))
+
+    for case, old in baseline_cases.items():
+        new = current_cases.get(case)
+        if new is None:
+            regressions.append((case, "missing",
+                                "missing from the current run"))
+            continue
+
+        message = f"crossings {old['crossings']} -> {new['crossings']}"
+        if new["crossings"] > old["crossings"] + crossing_tolerance:
+            regressions.append((case, "crossings", message))
+        elif new["crossings"] < old["crossings"]:
+            notes.append((case, "crossings", message))
+
+        for stage in stages:
+            before = old["seconds"].get(stage)
+            after = new["seconds"].get(stage)
+            if before is not None and after is not None \
+                    and before >= min_seconds:
+                timing(case, stage, before, after)
+
+    for case in current_cases:
+        if case not in baseline_cases:
+            notes.append((case, "new", "not in the baseline"))
+
+    common = [case for case in baseline_cases if case in current_cases]
+    if common:
+        timing("all", f"{len(common)} cases total",
+               sum(baseline_cases[c]["seconds"]["total"] for c in common),
+               sum(current_cases[c]["seconds"]["total"] for c in common))
+    return regressions, notes
+
+
+def _check_command(args):
+    """
+    Rerun the cases recorded in the baseline with the baseline's options and
+    compare. Runs in a child process when PYTHONHASHSEED differs from the
+    baseline's, so grouped charts order their groups the same way.
+
+    """
+    with open(args.check, encoding="utf-8") as f:
+        baseline = json.load(f)
+    meta = baseline["meta"]
+
+    hashseed = meta.get("hashseed")
+    if hashseed is not None and os.environ.get("PYTHONHASHSEED") != hashseed:
+        env = dict(os.environ, PYTHONHASHSEED=hashseed)
+        return subprocess.run([sys.executable] + sys.argv, env=env).returncode
+
+    print(f"checking against {args.check} (commit {meta.get('commit')}, "
+          f"{meta.get('platform')})", flush=True)
+    if args.only:
+        baseline = dict(baseline, results=[r for r in baseline["results"]
+                                           if args.only in r["case"]])
+    sizes = args.sizes or meta.get("sizes")
+    options = {"quick": meta.get("quick", False),
+               "repeat": args.repeat or meta.get("repeat", 1),
+               "only": args.only or meta.get("only"),
+               "sizes": tuple(sizes) if sizes else None,
+               "kinds": tuple(args.kinds or meta.get("kinds", KINDS))}
+    current = run_suite(report=_print_result, **options)
+
+    def check():
+        return compare(baseline, current, args.time_tolerance,
+                       args.min_seconds, args.crossing_tolerance)
+
+    regressions, notes = check()
+
+    # Timings of sub-second stages are noisy, so rerun the cases that look
+    # slower and keep each stage's fastest time before reporting them
+    for _ in range(args.retries):
+        slow = {case for case, kind, _ in regressions
+                if kind == "time" and case != "all"}
+        if not slow:
+            break
+        print(f"rerunning {len(slow)} case(s) that look slower", flush=True)
+        rerun = run_suite(cases=slow, **options)
+        rerun_cases = {r["case"]: r for r in rerun["results"]}
+        for result in current["results"]:
+            again = rerun_cases.get(result["case"])
+            if again is not None:
+                result["seconds"] = {
+                    name: min(value, again["seconds"].get(name, value))
+                    for name, value in result["seconds"].items()}
+        regressions, notes = check()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+
+    for case, _, message in notes:
+        print(f"  note: {case}: {message}")
+    for case, _, message in regressions:
+        print(f"  REGRESSION: {case}: {message}")
+    print(f"{len(regressions)} regression(s) in {len(current['results'])} "
+          f"cases (time tolerance +{args.time_tolerance:.0%}, crossing "
+          f"tolerance +{args.crossing_tolerance})")
+    return 1 if regressions else 0
+
+
+def _print_result(result):
+    s = result["seconds"]
+    stages = "  ".join(f"{name} {s[name]:.3f}" for name in
+                       ("ingest", "ordering", "layout", "render") if name in s)
+    print(f"{result['case']:<52} {s['total']:8.3f}s  "
+          f"crossings={result['crossings']:<6} "
+          f"evals={result['evaluations']:<6} {stages}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--quick", action="store_true",
+                        help="small graphs only, skip slow LA / LS cases")
+    parser.add_argument("--repeat", type=int, default=None,
+                        help="runs per case; the fastest is kept (default 1, "
+                             "or the baseline's with --check)")
+    parser.add_argument("--only", metavar="PATTERN",
+                        help="run only cases whose name contains PATTERN")
+    parser.add_argument("--sizes", metavar="N,N,...",
+                        help="synthetic graph sizes (nodes)")
+    parser.add_argument("--kinds", metavar="KIND,KIND,...",
+                        help="synthetic graph generators (default: all of "
+                             + ", ".join(KINDS) + ")")
+    parser.add_argument("--json", metavar="FILE",
+                        help="write the results as JSON")
+    parser.add_argument("--calibrate", metavar="FILE",
+                        help="fit the crossing_method='auto' cost model to "
+                             "the results and write it to FILE")
+    parser.add_argument("--max-ordering-seconds", type=float,
+                        metavar="SECONDS",
+                        help="skip LA / LS cases the stored cost model "
+                             "expects to order for longer than SECONDS")
+    parser.add_argument("--check", metavar="BASELINE",
+                        help="rerun the baseline's cases and exit 1 on "
+                             "regressions")
+    parser.add_argument("--time-tolerance", type=float, default=0.5,
+                        help="--check: allowed slowdown per stage as a "
+                             "fraction (default 0.5)")
+    parser.add_argument("--min-seconds", type=float, default=0.25,
+                        help="--check: skip stages faster than this in the "
+                             "baseline (default 0.25)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="--check: rerun cases that look slower up to "
+                             "this many times before failing (default 2)")
+    parser.add_argument("--crossing-tolerance", type=int, default=0,
+                        help="--check: allowed increase in final crossings "
+                             "(default 0)")
+    args = parser.parse_args(argv)
+
+    if args.sizes:
+        args.sizes = tuple(int(n) for n in args.sizes.split(","))
+    if args.kinds:
+        args.kinds = tuple(args.kinds.split(","))
+    if args.check:
+        return _check_command(args)
+
+    if os.environ.get("PYTHONHASHSEED") is None:
+        # Group order comes from a set, so crossings vary between runs
+        print("note: PYTHONHASHSEED is unset; crossing counts of grouped "
+              "charts may vary between runs", file=sys.stderr)
+
+    suite = run_suite(quick=args.quick, repeat=args.repeat or 1,
+                      only=args.only, sizes=args.sizes,
+                      kinds=args.kinds or KINDS, report=_print_result,
+                      auto=not args.calibrate,
+                      max_ordering_seconds=args.max_ordering_seconds)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(suite, f, indent=2)
+    if args.calibrate:
+        from crossing_cost import fit_model
+
+        model = {"meta": suite["meta"], **fit_model(suite["results"])}
+        with open(args.calibrate, "w", encoding="utf-8") as f:
+            json.dump(model, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Parallel schedule check
+-- lays out grouped graphs with LS and LA at workers=1 (clusters refined
+   one after another) and workers=2 (count_crossing.schedule in a process
+   pool), and fails (exit status 1) if the two layouts differ
+-- grouped arc charts on the bundled grouped datasets and on synthetic
+   graphs; proportional charts, whose split graph makes LS / LA slow, on
+   graphs with at most --proportion-edges edges
+
+Run from the repository root:
+
+    python benchmarks/schedule.py [--sizes 10,20] [--kinds erdos_renyi,...]
+                                  [--proportion-edges 20]
+
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cases import KINDS, chart_options, graph_sources  # noqa: E402
+
+
+def _layouts_agree(chart, df, group_dict, columns, method):
+    """
+    Lay out one graph at workers=1 and workers=2.
+
+    Output:  True if both layouts are identical
+    """
+    from arcproportion import compute_layout
+
+    layouts = []
+    for workers in (1, 2):
+        options = dict(chart_options(chart, columns, method, group_dict),
+                       workers=workers)
+        layouts.append(compute_layout(chart, df, group_dict,
+                                      options).to_json())
+    return layouts[0] == layouts[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10,20", metavar="N,N,...",
+                        help="synthetic graph sizes (default 10,20)")
+    parser.add_argument("--kinds", metavar="KIND,KIND,...",
+                        help="synthetic graph generators (default: all)")
+    parser.add_argument("--proportion-edges", type=int, default=20,
+                        help="largest graph checked as a proportional chart "
+                             "(default 20)")
+    args = parser.parse_args(argv)
+
+    import matplotlib
+    matplotlib.use("Agg")
+
+    sizes = tuple(int(n) for n in args.sizes.split(","))
+    kinds = tuple(args.kinds.split(",")) if args.kinds else KINDS
+    failures = []
+    for name, load in graph_sources(False, sizes, kinds):
+        df, group_dict, columns = load()
+        charts = []
+        if group_dict is not None:
+            charts.append("grouped_arc")
+        if len(df) <= args.proportion_edges:
+            charts.append("proportion_arc")
+        for chart in charts:
+            for method in ("LS", "LA"):
+                case = f"{name}/{chart}/{method}"
+                ok = _layouts_agree(chart, df, group_dict, columns, method)
+                if not ok:
+                    failures.append(case)
+                print(f"{case:<52} {'ok' if ok else 'FAIL: layouts differ'}",
+                      flush=True)
+
+    print(f"{len(failures)} case(s) where workers=2 differs from workers=1")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,16 +13,22 @@ Chord charts
 """
 
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from matplotlib.path import Path
-import pandas as pd
 
-from helper import auto_resize
+from helper import adaptive_steps, auto_resize, axes_pixel_size, new_figure
+from geometry import batched_by_steps, chord_ribbon_paths, node_ring_paths
+from instrument import count, heuristic, progress, staged
+from layout import Layout
 from count_crossing import count_graph_crossings, local_adjusting, cluster_local_adjusting
-from arc_crossing import minimize_crossings
+from arc_crossing import (canonical_rotation, exact_circular_order,
+                          minimize_crossings, spectral_order)
+from count_crossing.multilevel import multilevel_order
+from crossing_cost import choose_crossing_method
 
 
+# Up to this many groups, the group order is found by exhaustive search over
+# the (g - 1)! / 2 circular orders that differ by more than symmetry
+_EXACT_GROUPS = 6
+
 _DEFAULT_PALETTE = [
     "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
     "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf",
@@ -45,6 +51,7 @@ class Chord:
         self.weight = weight
 
 
+@staged("ingest")
 def _labels_from_df(df, source_col="source", dest_col="dest"):
     """
     Return node labels from Pandas dataframe
@@ -56,6 +63,7 @@ def _labels_from_df(df, source_col="source", dest_col="dest"):
     return sorted(list(combined))
 
 
+@staged("ingest")
 def _chords_from_df(df, node_index, source_col="source", dest_col="dest",
                     color_col="color", weight_col="weight",
                     default_weight=1.0):
@@ -63,6 +71,8 @@ def _chords_from_df(df, node_index, source_col="source", dest_col="dest",
     Create list of Chord objects from Pandas dataframe
 
     """
+    import pandas as pd
+
     chords = []
     for i in range(len(df)):
         row = df.iloc[i]
@@ -82,7 +92,9 @@ def _label_pairs(df_or_chords, source_col="source", dest_col="dest"):
     Normalize chord inputs into a list of (source_label, dest_label) tuples.
 
     """
-    if isinstance(df_or_chords, pd.DataFrame):
+    # DataFrames are recognized by duck typing so list inputs never
+    # import pandas
+    if hasattr(df_or_chords, "columns"):
         return [(df_or_chords[source_col].iloc[i],
                  df_or_chords[dest_col].iloc[i])
                 for i in range(len(df_or_chords))]
@@ -104,14 +116,32 @@ def _convert_to_cluster_arcs(groups, group_dict, label_arcs):
     return cluster_arcs
 
 
+@heuristic("node_cluster_order")
 def _node_cluster_order(groups, cluster_arcs):
-    before_c = count_graph_crossings(groups, cluster_arcs)
-    avsdf = minimize_crossings(groups, cluster_arcs)
-    avsdf_c = count_graph_crossings(avsdf, cluster_arcs)
-    la = local_adjusting(groups, cluster_arcs)
-    la_c = count_graph_crossings(la, cluster_arcs)
-    candidates = [(before_c, groups), (avsdf_c, avsdf), (la_c, la)]
-    return min(candidates, key=lambda c: c[0])[1]
+    """
+    Circular group order with the fewest crossings found. Crossings don't
+    change under rotation or reflection, so few groups are searched
+    exhaustively with one group fixed and reflections skipped. Otherwise
+    the candidates (input, AVSDF, spectral, local adjusting) are put in
+    canonical form first and each distinct order is counted once.
+
+    """
+    if len(groups) <= _EXACT_GROUPS:
+        best = exact_circular_order(groups, cluster_arcs)
+        progress(count_graph_crossings(best, cluster_arcs))
+        return best
+
+    candidates = {}
+    for order in (groups, minimize_crossings(groups, cluster_arcs),
+                  spectral_order(groups, cluster_arcs),
+                  local_adjusting(groups, cluster_arcs, circular=True)):
+        order = canonical_rotation(order, groups)
+        key = tuple(order)
+        if key not in candidates:
+            candidates[key] = (count_graph_crossings(order, cluster_arcs),
+                               order)
+            progress(candidates[key][0])
+    return min(candidates.values(), key=lambda c: c[0])[1]
 
 
 def _local_search_inside_cluster(start_index, cur_crossings, nodes, arcs, node_map):
@@ -119,26 +149,34 @@ def _local_search_inside_cluster(start_index, cur_crossings, nodes, arcs, node_m
     cur_group = node_map[nodes[start_index]]
     while end_index < len(nodes) and node_map[nodes[end_index]] == cur_group:
         end_index += 1
+    # Both (i, j) and (j, i) are tried: by the time the second comes up,
+    # earlier accepted swaps have changed what it does
     for i in range(start_index, end_index):
         for j in range(start_index, end_index):
             if i != j:
                 nodes[i], nodes[j] = nodes[j], nodes[i]
                 new_crossings = count_graph_crossings(nodes, arcs)
+                count("moves_tried")
                 if new_crossings < cur_crossings:
                     cur_crossings = new_crossings
+                    count("moves_accepted")
+                    progress(cur_crossings)
                 else:
                     nodes[i], nodes[j] = nodes[j], nodes[i]
     return end_index, cur_crossings
 
 
+@heuristic("local_search_grouped")
 def _local_search_grouped(nodes, arcs, node_map):
     cur_crossings = count_graph_crossings(nodes, arcs)
+    progress(cur_crossings)
     start_index = 0
     while start_index < len(nodes):
         start_index, cur_crossings = _local_search_inside_cluster(
             start_index, cur_crossings, nodes, arcs, node_map)
 
 
+@heuristic("local_adjusting_grouped")
 def _local_adjusting_grouped(nodes, arcs, node_map):
     start_index = 0
     while start_index < len(nodes):
@@ -151,6 +189,7 @@ def _local_adjusting_grouped(nodes, arcs, node_map):
         start_index = end_index
 
 
+@staged("ordering")
 def _cluster_reorder(node_labels, label_arcs, groups, group_dict, crossing_method):
     """
     Return (new_node_order, ordered_groups, group_sizes).
@@ -166,10 +205,22 @@ def _cluster_reorder(node_labels, label_arcs, groups, group_dict, crossing_metho
         new_order.extend(members)
         group_sizes.append(len(members))
 
-    if crossing_method == "LS":
-        _local_search_grouped(new_order, label_arcs, group_dict)
-    elif crossing_method == "LA":
-        _local_adjusting_grouped(new_order, label_arcs, group_dict)
+    # LS / LA run from the group order and from the spectral order inside
+    # each group; the first start wins ties, so the spectral seed never
+    # makes the result worse
+    if crossing_method in ("LS", "LA"):
+        refine = (_local_search_grouped if crossing_method == "LS"
+                  else _local_adjusting_grouped)
+        spectral = spectral_order(new_order, label_arcs, group_dict)
+        results = []
+        for start in ([new_order, spectral] if spectral != new_order
+                      else [new_order]):
+            start = list(start)
+            refine(start, label_arcs, group_dict)
+            results.append((count_graph_crossings(start, label_arcs), start))
+        new_order = min(results, key=lambda r: r[0])[1]
+    elif crossing_method == "multilevel":
+        new_order = multilevel_order(new_order, label_arcs, group_dict)
 
     return new_order, ordered_groups, group_sizes
 
@@ -259,63 +310,85 @@ def _compute_ribbon_endpoints(n, chords, node_start, node_end):
 
 # --- Drawing ---
 
-def _arc_points(theta_start, theta_end, radius=1.0, steps=24):
-    thetas = np.linspace(theta_start, theta_end, steps)
-    return [(radius * np.cos(t), radius * np.sin(t)) for t in thetas]
-
-
-def _draw_node_arc(ax, start, end, color, inner_radius=1.02, outer_radius=1.08):
+def _draw_paths(ax, verts, codes, **kwargs):
     """
-    Draw the outer ring segment for a single node as an annular wedge.
+    Add a batch of equal-length paths to `ax` as a single PathCollection.
 
     """
-    theta1 = np.degrees(end)
-    theta2 = np.degrees(start)
-    thickness = outer_radius - inner_radius
-    wedge = mpatches.Wedge((0.0, 0.0), outer_radius, theta1, theta2,
-                           width=thickness, facecolor=color,
-                           edgecolor="white", linewidth=0.5)
-    ax.add_patch(wedge)
+    from matplotlib.collections import PathCollection
+    from matplotlib.path import Path
 
+    paths = [Path(v, codes) for v in verts]
+    ax.add_collection(PathCollection(paths, **kwargs), autolim=False)
 
-def _draw_ribbon(ax, src_arc, dst_arc, color, alpha=0.6, arc_steps=24):
-    """
-    Draw a filled ribbon whose endpoints are arcs on the unit circle and
-    whose sides are quadratic Bezier curves through the origin.
 
+def _draw_node_arcs(ax, starts, ends, colors, inner_radius=1.02,
+                    outer_radius=1.08, ring_steps=48):
     """
-    src_start, src_end = src_arc
-    dst_start, dst_end = dst_arc
-
-    verts = [(np.cos(src_start), np.sin(src_start))]
-    codes = [Path.MOVETO]
+    Draw the outer ring segments for all nodes as one collection.
 
-    # Arc along circle: src_start -> src_end
-    for pt in _arc_points(src_start, src_end, steps=arc_steps)[1:]:
-        verts.append(pt)
-        codes.append(Path.LINETO)
+    """
+    if len(starts) == 0:
+        return
+    verts, codes = node_ring_paths(starts, ends, inner_radius, outer_radius,
+                                   ring_steps=ring_steps)
+    _draw_paths(ax, verts, codes, facecolors=colors, edgecolors="white",
+                linewidths=0.5)
 
-    # Bezier: src_end -> dst_start through origin
-    verts.append((0.0, 0.0))
-    codes.append(Path.CURVE3)
-    verts.append((np.cos(dst_start), np.sin(dst_start)))
-    codes.append(Path.CURVE3)
 
-    # Arc along circle: dst_start -> dst_end
-    for pt in _arc_points(dst_start, dst_end, steps=arc_steps)[1:]:
-        verts.append(pt)
-        codes.append(Path.LINETO)
+def _draw_ribbons(ax, src_arcs, dst_arcs, colors, alpha=0.6, arc_steps=24):
+    """
+    Draw all ribbons as one collection. `arc_steps` is either one sample
+    count shared by every ribbon or an array with one count per ribbon; in
+    the latter case ribbons are built in batches of equal step count and
+    reassembled in their original (drawing) order.
 
-    # Bezier: dst_end -> src_start through origin
-    verts.append((0.0, 0.0))
-    codes.append(Path.CURVE3)
-    verts.append((np.cos(src_start), np.sin(src_start)))
-    codes.append(Path.CURVE3)
+    """
+    if len(src_arcs) == 0:
+        return
+    if np.ndim(arc_steps) == 0:
+        verts, codes = chord_ribbon_paths(src_arcs, dst_arcs,
+                                          arc_steps=arc_steps)
+        _draw_paths(ax, verts, codes, facecolors=colors, edgecolors="none",
+                    alpha=alpha)
+        return
+
+    from matplotlib.collections import PathCollection
+    from matplotlib.path import Path
+
+    paths = [Path(v, c) for v, c in batched_by_steps(
+        chord_ribbon_paths, src_arcs, dst_arcs, arc_steps)]
+    ax.add_collection(PathCollection(paths, facecolors=colors,
+                                     edgecolors="none", alpha=alpha),
+                      autolim=False)
+
+
+def _tessellation_steps(layout, tessellation="fixed", dpi=None):
+    """
+    Return (ring_steps, arc_steps) for drawing `layout`. With "fixed" every
+    ribbon end uses 24 points; with "adaptive" each ribbon end gets a count
+    picked from its length in pixels at the layout's figure size and `dpi`
+    (default rcParams['figure.dpi']), and `arc_steps` becomes an array with
+    one entry per ribbon.
 
-    path = Path(verts, codes)
-    patch = mpatches.PathPatch(path, facecolor=color, edgecolor="none",
-                               alpha=alpha)
-    ax.add_patch(patch)
+    """
+    ring_steps = 48
+    arc_steps = 24
+    if tessellation != "adaptive":
+        return ring_steps, arc_steps
+
+    # Pixels per data unit; the equal-aspect axes spans xlim
+    span = layout["xlim"][1] - layout["xlim"][0]
+    radius_px = min(axes_pixel_size(layout["figsize"], dpi)) / span
+    node_spans = np.subtract(layout["node_start"], layout["node_end"])
+    if len(node_spans):
+        ring_steps = adaptive_steps(np.max(node_spans) * 1.08 * radius_px,
+                                    max_steps=ring_steps)
+    if layout["ribbon_src"]:
+        spans = np.maximum(np.abs(np.diff(layout["ribbon_src"], axis=1)),
+                           np.abs(np.diff(layout["ribbon_dst"], axis=1)))[:, 0]
+        arc_steps = adaptive_steps(spans * radius_px, max_steps=arc_steps)
+    return ring_steps, arc_steps
 
 
 def _draw_label(angle, text, ax, color="black", label_radius=1.14):
@@ -340,43 +413,20 @@ def _draw_label(angle, text, ax, color="black", label_radius=1.14):
 
 # --- Main API ---
 
-def chord_chart_plot(df=None, node_labels=[], chords=[], figsize="auto",
-                     title="", default_color="lightgray", default_weight=1.0,
-                     source_col="source", dest_col="dest",
-                     color_col="color", weight_col="weight",
-                     groups=None, group_dict=None, color_dict=None,
-                     crossing_method=None, node_gap=0.005, group_gap=0.03):
+@staged("layout")
+def compute_chord_layout(df=None, node_labels=[], chords=[], figsize="auto",
+                         title="", default_weight=1.0,
+                         source_col="source", dest_col="dest",
+                         color_col="color", weight_col="weight",
+                         groups=None, group_dict=None, color_dict=None,
+                         crossing_method=None, node_gap=0.005,
+                         group_gap=0.03):
     """
+    Compute everything needed to draw a chord chart, as plain lists: node
+    order and angles, ribbon endpoint angles, colors and figure size.
+    Inputs are the same as `chord_chart_plot`.
 
-    Function for creating a d3-style chord chart with weighted ribbons.
-
-    Inputs:
-    -- df:  Pandas data frame (columns configurable via source_col, dest_col,
-            color_col, weight_col)
-
-    If no dataframe provided, then required inputs are
-    -- node_labels:  a list of unique strings that define node positions
-    -- chords:  a list of tuples: (source, dest), (source, dest, color),
-                or (source, dest, color, weight)
-
-    Optional inputs include
-    -- figsize:  if set to "auto", figure is resized based on node label length
-    -- title:  prints a title on the chart
-    -- default_color:  fallback chord color (used only as a sentinel; ribbons
-                       default to their source node's color)
-    -- default_weight:  fallback ribbon weight (default 1.0)
-    -- source_col / dest_col / color_col / weight_col:  DataFrame column names
-
-    Optional clustering inputs (leave as None to disable):
-    -- groups:  list of group labels defining the group order around the circle
-    -- group_dict:  {node_label: group_label} mapping
-    -- color_dict:  {group_label: color} used to color node arcs, labels, and
-                    any ribbons without an explicit color
-    -- crossing_method:  "LS" (local search) or "LA" (local adjusting) to
-                         reorder nodes inside each cluster; default None only
-                         reorders groups
-    -- node_gap:  angular gap (radians) between consecutive nodes within a group
-    -- group_gap:  additional angular gap (radians) between groups
+    Output:  `Layout` with chart type "chord" (see layout.py)
 
     """
 
@@ -393,8 +443,16 @@ def chord_chart_plot(df=None, node_labels=[], chords=[], figsize="auto",
                                       dest_col=dest_col)
         else:
             label_arcs = _label_pairs(chords)
+        if crossing_method == "auto":
+            crossing_method, _ = choose_crossing_method(
+                "chord", list(node_labels), label_arcs, group_dict)
         node_labels, ordered_groups, group_sizes = _cluster_reorder(
             list(node_labels), label_arcs, groups, group_dict, crossing_method)
+    elif crossing_method == "auto":
+        # Without groups the node order is kept, so "auto" resolves to None
+        # (the arcs do not matter)
+        crossing_method, _ = choose_crossing_method(
+            "chord", list(node_labels), [])
 
     node_index = {n: i for i, n in enumerate(node_labels)}
 
@@ -434,46 +492,155 @@ def chord_chart_plot(df=None, node_labels=[], chords=[], figsize="auto",
     if figsize == "auto":
         fig_width = auto_resize(node_labels)
         figsize = (fig_width, fig_width)
-    fig, ax = plt.subplots(figsize=figsize)
 
     def node_color(i):
         if color_dict is not None and group_dict is not None:
             return color_dict.get(group_dict.get(node_labels[i]), "lightgray")
         return _DEFAULT_PALETTE[i % len(_DEFAULT_PALETTE)]
 
-    for i in range(n):
-        _draw_node_arc(ax, node_start[i], node_end[i], node_color(i))
+    label_colors = ["black"] * n
+    if color_dict is not None and group_dict is not None:
+        label_colors = [color_dict.get(group_dict.get(node), "black")
+                        for node in node_labels]
 
+    src_arcs = []
+    dst_arcs = []
+    ribbon_colors = []
     for ridx, ch in enumerate(chord_objs):
         if ridx not in endpoints:
             continue
         if 'src' not in endpoints[ridx] or 'dst' not in endpoints[ridx]:
             continue
-        color = ch.color if ch.color is not None else node_color(ch.source)
-        _draw_ribbon(ax, endpoints[ridx]['src'], endpoints[ridx]['dst'], color)
+        src_arcs.append(endpoints[ridx]['src'])
+        dst_arcs.append(endpoints[ridx]['dst'])
+        ribbon_colors.append(ch.color if ch.color is not None
+                             else node_color(ch.source))
+
+    return Layout(
+        chart="chord",
+        figsize=tuple(figsize),
+        title=title,
+        xlim=(-1.55, 1.55),
+        ylim=(-1.55, 1.55),
+        nodes=list(node_labels),
+        node_start=list(node_start),
+        node_end=list(node_end),
+        node_colors=[node_color(i) for i in range(n)],
+        label_colors=label_colors,
+        ribbon_src=src_arcs,
+        ribbon_dst=dst_arcs,
+        ribbon_colors=ribbon_colors,
+    )
+
+
+@staged("render")
+def render_chord_layout(layout, ax, tessellation="fixed", dpi=None):
+    """
+    Draw a chord chart layout (from `compute_chord_layout`) onto `ax`.
+    "adaptive" tessellation samples for `dpi`, the resolution the figure
+    will be saved at (default the figure's own dpi); pass the savefig dpi
+    when it differs.
 
-    for i in range(n):
-        center = (node_start[i] + node_end[i]) / 2
-        label_color = "black"
-        if color_dict is not None and group_dict is not None:
-            label_color = color_dict.get(group_dict.get(node_labels[i]), "black")
-        _draw_label(center, node_labels[i], ax, color=label_color)
+    """
+    ring_steps, arc_steps = _tessellation_steps(layout, tessellation,
+                                                dpi or ax.figure.dpi)
+
+    _draw_node_arcs(ax, layout["node_start"], layout["node_end"],
+                    layout["node_colors"], ring_steps=ring_steps)
+    _draw_ribbons(ax, layout["ribbon_src"], layout["ribbon_dst"],
+                  layout["ribbon_colors"], arc_steps=arc_steps)
+
+    for start, end, label, color in zip(layout["node_start"],
+                                        layout["node_end"], layout["nodes"],
+                                        layout["label_colors"]):
+        _draw_label((start + end) / 2, label, ax, color=color)
 
     ax.set_aspect("equal")
-    ax.set_xlim(-1.55, 1.55)
-    ax.set_ylim(-1.55, 1.55)
+    ax.set_xlim(*layout["xlim"])
+    ax.set_ylim(*layout["ylim"])
     ax.set_xticks([])
     ax.set_yticks([])
     ax.set_xticklabels([])
     ax.set_yticklabels([])
     ax.spines[["left", "right", "top", "bottom"]].set_visible(False)
     ax.tick_params(axis="both", length=0)
-    ax.set_title(title)
+    ax.set_title(layout["title"])
+
+
+def chord_chart_plot(df=None, node_labels=[], chords=[], figsize="auto",
+                     title="", default_color="lightgray", default_weight=1.0,
+                     source_col="source", dest_col="dest",
+                     color_col="color", weight_col="weight",
+                     groups=None, group_dict=None, color_dict=None,
+                     crossing_method=None, node_gap=0.005, group_gap=0.03,
+                     tessellation="fixed", pyplot=True):
+    """
+
+    Function for creating a d3-style chord chart with weighted ribbons.
+
+    Inputs:
+    -- df:  Pandas data frame (columns configurable via source_col, dest_col,
+            color_col, weight_col)
+
+    If no dataframe provided, then required inputs are
+    -- node_labels:  a list of unique strings that define node positions
+    -- chords:  a list of tuples: (source, dest), (source, dest, color),
+                or (source, dest, color, weight)
+
+    Optional inputs include
+    -- figsize:  if set to "auto", figure is resized based on node label length
+    -- title:  prints a title on the chart
+    -- default_color:  fallback chord color (used only as a sentinel; ribbons
+                       default to their source node's color)
+    -- default_weight:  fallback ribbon weight (default 1.0)
+    -- source_col / dest_col / color_col / weight_col:  DataFrame column names
+
+    Optional clustering inputs (leave as None to disable):
+    -- groups:  list of group labels defining the group order around the circle
+    -- group_dict:  {node_label: group_label} mapping
+    -- color_dict:  {group_label: color} used to color node arcs, labels, and
+                    any ribbons without an explicit color
+    -- crossing_method:  "LS" (local search), "LA" (local adjusting) or
+                         "multilevel" (count_crossing.multilevel, fast on
+                         large graphs) to reorder nodes inside each cluster,
+                         or "auto" to pick one from the graph size
+                         (crossing_cost.py; without groups it resolves to
+                         None); default None only reorders groups
+    -- node_gap:  angular gap (radians) between consecutive nodes within a group
+    -- group_gap:  additional angular gap (radians) between groups
+
+    Rendering inputs:
+    -- tessellation:  "fixed" samples every ribbon end with 24 points;
+                      "adaptive" picks the sample count per ribbon end and
+                      node ring from its on-screen size at the figure's
+                      DPI (to save at another DPI, draw the layout with
+                      render_chord_layout(..., dpi=))
+    -- pyplot:  True (default) draws on a pyplot figure; False draws on a
+                standalone Agg Figure that pyplot never sees (thread-safe,
+                freed once the caller drops it)
+
+    Output:  (fig, ax)
+
+    """
+
+    layout = compute_chord_layout(df=df, node_labels=node_labels,
+                                  chords=chords, figsize=figsize, title=title,
+                                  default_weight=default_weight,
+                                  source_col=source_col, dest_col=dest_col,
+                                  color_col=color_col, weight_col=weight_col,
+                                  groups=groups, group_dict=group_dict,
+                                  color_dict=color_dict,
+                                  crossing_method=crossing_method,
+                                  node_gap=node_gap, group_gap=group_gap)
+
+    fig, ax = new_figure(layout["figsize"], pyplot=pyplot)
+    render_chord_layout(layout, ax, tessellation=tessellation)
 
     return fig, ax
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
 
     cities = ["Los Angeles", "Denver", "Texas", "Chicago", "Washington D.C.",
               "Philadelphia", "New York City"]
@@ -7,16 +7,18 @@ Author:  Nathan Cordner
 
 """
 
-import pandas as pd
-import matplotlib.pyplot as plt
-from helper import auto_resize, draw_arc, shade_arc
+from __future__ import annotations
+
+from helper import auto_resize, draw_arc, new_figure, shade_arc
 
 from count_crossing import count_graph_crossings, local_adjusting, cluster_local_adjusting
-from arc_crossing import minimize_crossings
+from arc_crossing import minimize_crossings, spectral_order
+from count_crossing.multilevel import multilevel_order
+from count_crossing.schedule import adjusting_inside_cluster, refine_clusters
+from crossing_cost import choose_crossing_method
 
-# test code
-from basic_arc import basic_arc_plot
-import time
+from basic_arc import compute_basic_arc_layout, render_basic_arc_layout
+from instrument import count, heuristic, progress, stage, staged
 
 
 def convert_to_cluster_arc(nodes, groups, group_dict, arcs):
@@ -86,8 +88,11 @@ def local_search_inside_clusters(start_index, cur_crossings, nodes, clean_arcs,
                 # Try swapping
                 nodes[i], nodes[j] = nodes[j], nodes[i]
                 new_crossings = count_graph_crossings(nodes, clean_arcs)
+                count("moves_tried")
                 if new_crossings < cur_crossings:
                     cur_crossings = new_crossings
+                    count("moves_accepted")
+                    progress(cur_crossings)
                 else:
                     # Swap back
                     nodes[i], nodes[j] = nodes[j], nodes[i]
@@ -95,17 +100,25 @@ def local_search_inside_clusters(start_index, cur_crossings, nodes, clean_arcs,
 
 
 
-def local_search_grouped_node_order(node_groups, nodes, arcs, node_map):
+@heuristic("local_search_grouped_node_order")
+def local_search_grouped_node_order(node_groups, nodes, arcs, node_map, workers=1):
     """
         node_groups:  labels of node clusters
         nodes:  cluster_label followed by integer
         arcs:  shows edges and weights between individual nodes
         node_map:  maps node labels back to node cluster labels
+        workers:  1 searches the clusters once, in order; any other value
+                  searches clusters that share no arc in parallel
+                  (count_crossing.schedule, None for one worker per CPU),
+                  with the same result
     """
         
+    if workers != 1:
+        refine_clusters(nodes, arcs, node_map, local_search_inside_clusters, workers)
+        return
     
     cur_crossings = count_graph_crossings(nodes, arcs)
-    # print(cur_crossings)
+    progress(cur_crossings)
     
     # just swap order inside clusters
     start_index = 0
@@ -115,14 +128,20 @@ def local_search_grouped_node_order(node_groups, nodes, arcs, node_map):
     
     # print(count_graph_crossings(nodes, clean_arcs))
 
-def local_adjusting_grouped_node_order(node_groups, nodes, arcs, node_map):
+@heuristic("local_adjusting_grouped_node_order")
+def local_adjusting_grouped_node_order(node_groups, nodes, arcs, node_map, workers=1):
     """
         node_groups:  labels of node clusters
         nodes:  cluster_label followed by integer
         arcs:  shows edges and weights between individual nodes
         node_map:  maps node labels back to node cluster labels
+        workers:  as in local_search_grouped_node_order
     """
         
+    if workers != 1:
+        refine_clusters(nodes, arcs, node_map, adjusting_inside_cluster, workers)
+        return
+
     # CLUSTER LOCAL ADJUSTING
     
     start_index = 0
@@ -132,31 +151,41 @@ def local_adjusting_grouped_node_order(node_groups, nodes, arcs, node_map):
         while end_index < len(nodes) and node_map[nodes[end_index]] == cur_group:
             end_index += 1
         
-        nodes = cluster_local_adjusting(start_index, end_index - 1, nodes = nodes, arcs = arcs)
+        nodes[:] = cluster_local_adjusting(start_index, end_index - 1, nodes = nodes, arcs = arcs)
         start_index = end_index
     
 
+@heuristic("node_cluster_order")
 def node_cluster_order(groups, cluster_arcs):
     """
-        Compute best of AVSDF, Local Adjusting 
+        Compute best of AVSDF, spectral, Local Adjusting 
         
         Edit node group order accordingly    
     
     """
 
     before_crossings = count_graph_crossings(groups, cluster_arcs)
+    progress(before_crossings)
         
     # AVSDF
     avsdf_order = minimize_crossings(groups, cluster_arcs)
     avsdf_crossings = count_graph_crossings(avsdf_order, cluster_arcs)
+    progress(avsdf_crossings)
+
+    # Spectral
+    spectral = spectral_order(groups, cluster_arcs)
+    spectral_crossings = count_graph_crossings(spectral, cluster_arcs)
+    progress(spectral_crossings)
            
     # Local Adjusting    
     local_order = local_adjusting(groups, cluster_arcs)
     local_crossings = count_graph_crossings(local_order, cluster_arcs)
+    progress(local_crossings)
         
     # Find best
     candidates = [(before_crossings, groups),
                   (avsdf_crossings, avsdf_order),
+                  (spectral_crossings, spectral),
                   (local_crossings, local_order)]
     
     # print(before_crossings, avsdf_crossings, local_crossings)
@@ -164,6 +193,7 @@ def node_cluster_order(groups, cluster_arcs):
     # return node order of smallest number of crossings
     return min(candidates)[1]
 
+@staged("ingest")
 def _arcs_and_nodes_from_df(df:pd.DataFrame, source_col="source", dest_col="dest", color_col="color", width_col="width"):
         """
         Build the ``(arcs, nodes)`` pair consumed by ``grouped_arc_chart`` from
@@ -178,12 +208,16 @@ def _arcs_and_nodes_from_df(df:pd.DataFrame, source_col="source", dest_col="dest
             width_col:   name of the arc line-width column (default "width")
 
         Output:
-            arcs:   list of ``(source, dest, color, width)`` tuples
+            arcs:   list of ``(source, dest, color, width)`` tuples; empty
+                    color / width cells fall back to "lightgray" / 1, as
+                    in basic_arc
             nodes:  list of unique node labels appearing in ``source_col`` or
                     ``dest_col``; order is insertion order into the set, so
                     callers that care about deterministic order should sort.
 
         """
+        import pandas as pd
+
         arcs = []
         nodes = set()
         for _, row in df.iterrows():
@@ -193,32 +227,19 @@ def _arcs_and_nodes_from_df(df:pd.DataFrame, source_col="source", dest_col="dest
                 nodes.add(dest)
             if not source in nodes:
                 nodes.add(source)
-            arcs.append((row[source_col], row[dest_col], row[color_col], row[width_col]))
+            color = "lightgray" if pd.isna(row[color_col]) else row[color_col]
+            width = 1 if pd.isna(row[width_col]) else row[width_col]
+            arcs.append((row[source_col], row[dest_col], color, width))
         nodes = list(nodes)
         return arcs, nodes
 
-def grouped_arc_chart(group_dict:dict, df:pd.DataFrame=None, source_col="source", dest_col="dest", color_col="color", width_col="width", nodes=[], arcs=[], crossing_method = "LS", figsize = "auto", title: str = "", x_label_padding: float = 1.05, group_coloring_map:dict|None = None):
+def compute_grouped_arc_layout(group_dict:dict, df:pd.DataFrame=None, source_col="source", dest_col="dest", color_col="color", width_col="width", nodes=[], arcs=[], crossing_method = "LS", figsize = "auto", title: str = "", x_label_padding: float = 1.05, group_coloring_map:dict|None = None, workers=1):
     """
-    Inputs:
-    -- group_dict:  dictionary containing node : group pairs
-    -- df:  Pandas data frame (columns configurable via source_col, dest_col,
-            color_col, width_col)
-    -- source_col:  name of source column in DataFrame (default "source")
-    -- dest_col:  name of dest column in DataFrame (default "dest")
-    -- color_col:  name of color column in DataFrame (default "color")
-    -- width_col:  name of width column in DataFrame (default "width")
-    -- nodes:  list of input nodes
-    -- groups:  list of node groups
-    -- arcs:  list of tuples to specify arcs (undirected)
-      -- Index 0:  label of node 1
-      -- Index 1:  label of node 2
-      -- Index 2:  color of arc
-      -- Index 3:  width of arc
-    -- crossing_method:  LS for local search, LA for local adjusting
-    -- group_coloring_map: dictionary mapping group names to node label text colors
+    Order the nodes of a grouped arc chart and compute its layout without
+    drawing it. Inputs are the same as ``grouped_arc_chart``.
 
-    
-    Output: grouped arc chart showing connection from sources to destinations
+    Output:  ``Layout`` with chart type "basic_arc" (see layout.py); x-tick
+             label colors follow ``group_coloring_map`` when given
 
     """
 
@@ -237,42 +258,106 @@ def grouped_arc_chart(group_dict:dict, df:pd.DataFrame=None, source_col="source"
 
     groups = list(groups)
 
-    # Create cluster nodes based off of node groups and arcs 
-    cluster_arcs = convert_to_cluster_arc(nodes, groups, group_dict, pure_arcs)
-    
-    # compute node group order
-    groups = node_cluster_order(groups, cluster_arcs)
-    
-    # Fill in nodes by group order
-    new_node_order = []
-    for g in groups:
-        for n in nodes:
-            if group_dict[n] == g:
-                new_node_order.append(n)
-    # Reassign
-    nodes = new_node_order
-    
-    #  print(groups)
-    # print(nodes)
-    
-    # Redo node order
-    if crossing_method == "LS":
-        local_search_grouped_node_order(groups, nodes, pure_arcs, group_dict)
-    else:
-        local_adjusting_grouped_node_order(groups, nodes, pure_arcs, group_dict)
+    if crossing_method == "auto":
+        crossing_method, workers = choose_crossing_method(
+            "grouped_arc", nodes, pure_arcs, group_dict, workers=workers)
 
-    
-    fig, ax = basic_arc_plot(node_labels = nodes, arcs = arcs)
+    with stage("ordering"):
+        # Create cluster nodes based off of node groups and arcs 
+        cluster_arcs = convert_to_cluster_arc(nodes, groups, group_dict, pure_arcs)
+        
+        # compute node group order
+        groups = node_cluster_order(groups, cluster_arcs)
+        
+        # Fill in nodes by group order
+        new_node_order = []
+        for g in groups:
+            for n in nodes:
+                if group_dict[n] == g:
+                    new_node_order.append(n)
+        # Reassign
+        nodes = new_node_order
+        
+        #  print(groups)
+        # print(nodes)
+        
+        # Redo node order. LS / LA run from the input order and from the
+        # spectral order inside each group; the input start wins ties, so
+        # the spectral seed never makes the result worse
+        if crossing_method in ("LS", "LA"):
+            refine = (local_search_grouped_node_order if crossing_method == "LS"
+                      else local_adjusting_grouped_node_order)
+            spectral = spectral_order(nodes, pure_arcs, group_dict)
+            results = []
+            for start in ([nodes, spectral] if spectral != nodes else [nodes]):
+                start = list(start)
+                refine(groups, start, pure_arcs, group_dict, workers)
+                results.append((count_graph_crossings(start, pure_arcs), start))
+            nodes = min(results, key=lambda r: r[0])[1]
+        elif crossing_method == "multilevel":
+            nodes = multilevel_order(nodes, pure_arcs, group_dict)
+
+    
+    layout = compute_basic_arc_layout(node_labels = nodes, arcs = arcs,
+                                      figsize = figsize, title = title)
 
     if group_coloring_map is not None:
-        # xtick labels may be line-wrapped; resolve color by node index
-        # (xticks are set in the same order as `nodes`)
-        for i, xtick in enumerate(ax.get_xticklabels()):
-            if i >= len(nodes):
-                break
-            group_name = group_dict.get(nodes[i])
-            if group_name in group_coloring_map:
-                xtick.set_color(group_coloring_map[group_name])
+        layout["label_colors"] = [
+            group_coloring_map.get(group_dict.get(node), "black")
+            for node in nodes
+        ]
+
+    return layout
+
+
+def grouped_arc_chart(group_dict:dict, df:pd.DataFrame=None, source_col="source", dest_col="dest", color_col="color", width_col="width", nodes=[], arcs=[], crossing_method = "LS", figsize = "auto", title: str = "", x_label_padding: float = 1.05, group_coloring_map:dict|None = None, pyplot=True, workers=1):
+    """
+    Inputs:
+    -- group_dict:  dictionary containing node : group pairs
+    -- df:  Pandas data frame (columns configurable via source_col, dest_col,
+            color_col, width_col)
+    -- source_col:  name of source column in DataFrame (default "source")
+    -- dest_col:  name of dest column in DataFrame (default "dest")
+    -- color_col:  name of color column in DataFrame (default "color")
+    -- width_col:  name of width column in DataFrame (default "width")
+    -- nodes:  list of input nodes
+    -- groups:  list of node groups
+    -- arcs:  list of tuples to specify arcs (undirected)
+      -- Index 0:  label of node 1
+      -- Index 1:  label of node 2
+      -- Index 2:  color of arc
+      -- Index 3:  width of arc
+    -- crossing_method:  LS for local search, LA for local adjusting,
+                         "multilevel" for count_crossing.multilevel (fast on
+                         large graphs), "auto" to pick one of these (and
+                         'workers') from the graph size (crossing_cost.py)
+    -- workers:  for LS / LA, refine groups that share no arc in this many
+                 processes at once (None: one per CPU); 1 (default)
+                 refines the groups one after another. Both give the same
+                 order. With "auto", the most processes it may use
+    -- group_coloring_map: dictionary mapping group names to node label text colors
+    -- pyplot:  True (default) draws on a pyplot figure; False draws on a
+                standalone Agg Figure that pyplot never sees (thread-safe,
+                freed once the caller drops it)
+
+    
+    Output: grouped arc chart showing connection from sources to destinations,
+            returned as (fig, ax)
+
+    """
+
+    layout = compute_grouped_arc_layout(group_dict, df=df, source_col=source_col,
+                                        dest_col=dest_col, color_col=color_col,
+                                        width_col=width_col, nodes=nodes,
+                                        arcs=arcs,
+                                        crossing_method=crossing_method,
+                                        figsize=figsize, title=title,
+                                        x_label_padding=x_label_padding,
+                                        group_coloring_map=group_coloring_map,
+                                        workers=workers)
+
+    fig, ax = new_figure(layout["figsize"], pyplot=pyplot)
+    render_basic_arc_layout(layout, ax)
 
     return fig, ax
 
@@ -286,6 +371,7 @@ def read_edges(file_name, source_col = "source", dest_col = "dest"):
         Total of each location = sum of arc weights where location is either source or dest
     
     """
+    import pandas as pd
 
     df = pd.read_csv(file_name)
                 
@@ -316,6 +402,8 @@ def read_nodes(file_name, node_col = "node", group_col = "group"):
         group_dict:  dict mapping node label to its group label
 
     """
+    import pandas as pd
+
     df = pd.read_csv(file_name)
     nodes = list(df[node_col])
     
@@ -335,6 +423,11 @@ def read_nodes(file_name, node_col = "node", group_col = "group"):
 
 
 if __name__ == "__main__":
+    # test code
+    import time
+    import matplotlib.pyplot as plt
+    from basic_arc import basic_arc_plot
+
     """
     Data format:
         (Source, Destination, Weight)
@@ -1,11 +1,17 @@
 from warnings import warn
 from collections.abc import Callable
 
+from instrument import count, heuristic, progress
+
 # Type Annotations (using type hinting as of Python 3.10)
 NodeLabel = str
 ArcTuple = tuple[NodeLabel, NodeLabel]
 AdjacencyMatrix = list[list[int]]
 
+# Arc count above which count_graph_crossings counts in parallel
+# (count_crossing.parallel)
+PARALLEL_THRESHOLD = 200_000
+
 def construct_adj_list(
     node_labels: list[NodeLabel] = [],
     arcs: list[ArcTuple] = []
@@ -66,13 +72,37 @@ def construct_adj_matrix(
 #      part of their arguments, instead of building it in situ.
 def count_graph_crossings(
     node_labels: list[NodeLabel] = [],
-    arcs: list[ArcTuple] = []
+    arcs: list[ArcTuple] = [],
+    backend: str = "reference"
 ) -> int:
     """
     Returns the crossing count of the circular drawing of the graph
     ('node_labels', 'arcs'), where 'node_labels' represents the nodes, and
     'arcs' represets the edges.
+
+    'backend' is "reference" (the adjacency-matrix sum below), "bitset"
+    (count_crossing.bitset: packed uint64 rows and popcounts, ~n^2 / 8
+    bytes), "accel" (count_crossing.accel: the Fenwick-tree sweep,
+    compiled with numba when it is installed) or "parallel"
+    (count_crossing.parallel: the sweep split across a process pool). The
+    reference switches to "parallel" above PARALLEL_THRESHOLD arcs, where
+    its O(n^4) sum could never finish.
     """
+    count("crossing_evaluations")
+    if backend == "parallel" or (backend == "reference"
+                                 and len(arcs) > PARALLEL_THRESHOLD):
+        from count_crossing.parallel import count_graph_crossings_parallel
+        return count_graph_crossings_parallel(node_labels, arcs)
+    if backend == "bitset":
+        from count_crossing.bitset import count_graph_crossings_bitset
+        return count_graph_crossings_bitset(node_labels, arcs)
+    if backend == "accel":
+        from count_crossing.accel import count_graph_crossings_accel
+        return count_graph_crossings_accel(node_labels, arcs)
+    if backend != "reference": raise ValueError(
+            f"Unknown crossing-count backend {backend!r}"
+        )
+
     adjacency_matrix = construct_adj_matrix(node_labels, arcs)
 
     # print(adjacency_matrix)
@@ -92,17 +122,30 @@ def count_graph_crossings(
 def count_node_crossings(
     node: NodeLabel,
     node_labels: list[NodeLabel] = [],
-    arcs: list[ArcTuple] = []
+    arcs: list[ArcTuple] = [],
+    backend: str = "reference"
 ) -> int:
     """
     Returns the count of crossings on the incident edges of 'node' in the
     graph ('node_labels', 'arcs'), where 'node_labels' represents the nodes,
-    and 'arcs' represets the edges.
+    and 'arcs' represets the edges. 'backend' is as in
+    count_graph_crossings.
     """
     if node not in node_labels: raise ValueError(
             f"Node {node} is not in node_labels: {node_labels}"
         )
 
+    count("node_crossing_evaluations")
+    if backend == "bitset":
+        from count_crossing.bitset import count_node_crossings_bitset
+        return count_node_crossings_bitset(node, node_labels, arcs)
+    if backend == "accel":
+        from count_crossing.accel import count_node_crossings_accel
+        return count_node_crossings_accel(node, node_labels, arcs)
+    if backend != "reference": raise ValueError(
+            f"Unknown crossing-count backend {backend!r}"
+        )
+
     adjacency_matrix = construct_adj_matrix(node_labels, arcs)
 
     node_size = len(node_labels)
@@ -170,14 +213,22 @@ def permutator(matrix_size: int, offset: int) -> Callable[[int], int]:
 
 
 
-def local_adjusting(nodes = [], arcs = []):
+@heuristic("local_adjusting")
+def local_adjusting(nodes = [], arcs = [], circular = False):
     """
     Re-orders the list from higher to lower crossing counts. 
     Then it grabs the the first node and places it in all positions and inserts it in the best position. 
     Repeats for all nodes. Then moves to the next node in the ranked list.
+
+    With 'circular' set, the last position is not tried: once the node is
+    popped, inserting it at the end is a rotation of inserting it at the
+    front, with the same crossing count.
     """
 
     order = list(nodes)
+    positions = len(nodes)
+    if circular and positions > 1:
+        positions -= 1
 
     node_crossing_counts = []
     for node in nodes:
@@ -200,7 +251,7 @@ def local_adjusting(nodes = [], arcs = []):
         best_pos = 0
         best_cnt = None
         
-        for pos in range(len(nodes)):
+        for pos in range(positions):
             order.insert(pos, node)
             
             cnt = count_graph_crossings(order, arcs)
@@ -210,14 +261,32 @@ def local_adjusting(nodes = [], arcs = []):
                 best_pos = pos
             order.pop(pos)
         order.insert(best_pos, node)
+        progress(best_cnt)
+        count("moves_tried", positions)
+        if best_pos != current % positions:
+            count("moves_accepted")
         
     return order
 
+@heuristic("cluster_local_adjusting")
 def cluster_local_adjusting(start_index, stop_index, nodes = [], arcs = []):
     """
     Re-orders the list from higher to lower crossing counts. 
     Then it grabs the the first node and places it in all positions and inserts it in the best position. 
     Repeats for all nodes. Then moves to the next node in the ranked list.
+
+    Inputs:
+        start_index:  first position of the run to reorder
+        stop_index:   index of the run's last node, as every caller passes
+                      it (a cluster's end_index - 1). Only
+                      nodes[start_index:stop_index] are reordered; the node
+                      at stop_index keeps its position
+        nodes, arcs:  the whole drawing, which every count is taken over
+
+    Each node is tried in every slot of the run, the end of the run
+    included (len + 1 slots), so it can always stay where it was.
+
+    Output:  new list of all node labels
     """
 
     order = list(nodes[start_index:stop_index])  # CHANGED
@@ -243,7 +312,8 @@ def cluster_local_adjusting(start_index, stop_index, nodes = [], arcs = []):
         best_pos = 0
         best_cnt = None
         
-        for pos in range(len(order)):
+        # every slot, the end included, so the node can always stay put
+        for pos in range(len(order) + 1):
             order.insert(pos, node)
             
             cnt = count_graph_crossings(nodes[:start_index] + order + nodes[stop_index:], arcs)
@@ -252,7 +322,11 @@ def cluster_local_adjusting(start_index, stop_index, nodes = [], arcs = []):
                 best_cnt = cnt
                 best_pos = pos
             order.pop(pos)
+        count("moves_tried", len(order) + 1)
         order.insert(best_pos, node)
+        progress(best_cnt)
+        if best_pos != current:
+            count("moves_accepted")
         
     return nodes[:start_index] + order + nodes[stop_index:]
 
@@ -0,0 +1,279 @@
+"""
+Accelerated crossing kernels
+-- the sparse counter, node counts and swap / move deltas of
+   count_crossing.fast as loops over int64 endpoint arrays, compiled with
+   numba when it is installed (``pip install numba``; not a requirement)
+-- without numba the same calls go to count_crossing.fast, so results never
+   depend on which backend ran; ``python -m count_crossing.verify`` checks
+   whichever one is active
+-- the backend is picked on first use: "numba" when it imports, otherwise
+   "python". The ARCPROPORTION_CROSSING_BACKEND environment variable or
+   set_backend() overrides it, and active_backend() reports it
+
+The reference counters call these with ``backend="accel"``.
+
+A swap or a move relabels positions but keeps the chords, so the chords
+at the moved nodes are the same before and after. The delta kernel walks
+them once, comparing each with every other chord in both labellings.
+
+"""
+
+import os
+
+from count_crossing import ArcTuple, NodeLabel
+from count_crossing.fast import (chords, count_graph_crossings_sparse,
+                                 count_node_crossings_sparse, move_delta,
+                                 swap_delta)
+
+BACKENDS = ("numba", "python")
+ENVIRONMENT = "ARCPROPORTION_CROSSING_BACKEND"
+
+_backend = None
+_compiled = None
+
+
+def _sweep_kernel(left, right, tree):
+    # count_graph_crossings_sparse over chords sorted by left endpoint;
+    # 'tree' is a zeroed Fenwick tree of len(node_labels) + 1 entries
+    size = len(tree) - 1
+    total = 0
+    start = 0
+    m = len(left)
+    while start < m:
+        stop = start
+        while stop < m and left[stop] == left[start]:
+            stop += 1
+        for k in range(start, stop):
+            # inserted right endpoints strictly inside (left, right)
+            position = right[k]
+            while position > 0:
+                total += tree[position]
+                position -= position & -position
+            position = left[k] + 1
+            while position > 0:
+                total -= tree[position]
+                position -= position & -position
+        for k in range(start, stop):
+            position = right[k] + 1
+            while position <= size:
+                tree[position] += 1
+                position += position & -position
+        start = stop
+    return total
+
+
+def _touching_kernel(left, right, touched):
+    # crossing pairs with at least one chord in 'touched', each pair once
+    total = 0
+    m = len(left)
+    for p in range(m):
+        if not touched[p]:
+            continue
+        a, b = left[p], right[p]
+        for q in range(m):
+            if touched[q] and q <= p:
+                continue
+            c, d = left[q], right[q]
+            if (a < c and c < b and b < d) or (c < a and a < d and d < b):
+                total += 1
+    return total
+
+
+def _delta_kernel(left, right, new_left, new_right, touched):
+    # change in the crossing pairs touching 'touched' between two
+    # labellings of the same chords
+    total = 0
+    m = len(left)
+    for p in range(m):
+        if not touched[p]:
+            continue
+        a, b = left[p], right[p]
+        e, f = new_left[p], new_right[p]
+        for q in range(m):
+            if touched[q] and q <= p:
+                continue
+            c, d = left[q], right[q]
+            if (a < c and c < b and b < d) or (c < a and a < d and d < b):
+                total -= 1
+            c, d = new_left[q], new_right[q]
+            if (e < c and c < f and f < d) or (c < e and e < d and d < f):
+                total += 1
+    return total
+
+
+def _numba_available():
+    try:
+        import numba  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _compile():
+    """
+    Compile the kernels with numba (once per process; numba caches the
+    machine code next to this file between runs).
+    """
+    global _compiled
+    if _compiled is None:
+        from numba import njit
+        _compiled = {
+            "sweep": njit(cache=True)(_sweep_kernel),
+            "touching": njit(cache=True)(_touching_kernel),
+            "delta": njit(cache=True)(_delta_kernel),
+        }
+    return _compiled
+
+
+def set_backend(name=None):
+    """
+    Select the kernels used by this module: "numba", "python", or None to
+    pick "numba" when it is installed.
+
+    Output:  the backend now active
+    Raises ValueError for an unknown name, or "numba" without numba.
+    """
+    global _backend
+    if name is None:
+        name = "numba" if _numba_available() else "python"
+    if name not in BACKENDS: raise ValueError(
+            f"Unknown accelerated backend {name!r}, expected one of {BACKENDS}"
+        )
+    if name == "numba":
+        if not _numba_available(): raise ValueError(
+                "The 'numba' backend needs numba, which is not installed"
+            )
+        _compile()
+    _backend = name
+    return name
+
+
+def active_backend():
+    """
+    Returns the backend in use, choosing it on the first call (from
+    ARCPROPORTION_CROSSING_BACKEND if set).
+    """
+    if _backend is None:
+        set_backend(os.environ.get(ENVIRONMENT) or None)
+    return _backend
+
+
+def _endpoints(node_labels, arcs):
+    """
+    Distinct chords of the graph as two int64 arrays (left < right).
+    """
+    import numpy as np
+
+    ends = np.array(chords(node_labels, arcs), dtype=np.int64).reshape(-1, 2)
+    return ends[:, 0].copy(), ends[:, 1].copy()
+
+
+def count_sorted_chords(left, right, size):
+    """
+    Crossing count of distinct chords given as int64 arrays sorted by left
+    endpoint, on 'size' positions: the compiled sweep, or the same loop in
+    Python on lists.
+    """
+    if active_backend() == "python":
+        return _sweep_kernel(left.tolist(), right.tolist(), [0] * (size + 1))
+    import numpy as np
+
+    tree = np.zeros(size + 1, dtype=np.int64)
+    return int(_compiled["sweep"](left, right, tree))
+
+
+def count_graph_crossings_accel(
+    node_labels: list[NodeLabel] = [],
+    arcs: list[ArcTuple] = []
+) -> int:
+    """
+    Returns the crossing count of the circular drawing of the graph, like
+    count_graph_crossings, with the compiled Fenwick-tree sweep.
+    """
+    if active_backend() == "python":
+        return count_graph_crossings_sparse(node_labels, arcs)
+    import numpy as np
+
+    left, right = _endpoints(node_labels, arcs)
+    by_left = np.argsort(left, kind="stable")
+    return count_sorted_chords(left[by_left], right[by_left],
+                               len(node_labels))
+
+
+def count_node_crossings_accel(
+    node: NodeLabel,
+    node_labels: list[NodeLabel] = [],
+    arcs: list[ArcTuple] = []
+) -> int:
+    """
+    Returns the count of crossings on the incident edges of 'node', like
+    count_node_crossings, in O(deg(node) * m) compiled steps.
+    """
+    if active_backend() == "python":
+        return count_node_crossings_sparse(node, node_labels, arcs)
+    if node not in node_labels: raise ValueError(
+            f"Node {node} is not in node_labels: {node_labels}"
+        )
+
+    index = node_labels.index(node)
+    left, right = _endpoints(node_labels, arcs)
+    touched = (left == index) | (right == index)
+    return int(_compiled["touching"](left, right, touched))
+
+
+def _relabelled(left, right, new_position):
+    import numpy as np
+
+    a, b = new_position[left], new_position[right]
+    return np.minimum(a, b), np.maximum(a, b)
+
+
+def swap_delta_accel(
+    node_labels: list[NodeLabel],
+    arcs: list[ArcTuple],
+    i: int,
+    j: int
+) -> int:
+    """
+    Returns the change in the crossing count when the nodes at positions
+    'i' and 'j' trade places, like fast.swap_delta.
+    """
+    if active_backend() == "python":
+        return swap_delta(node_labels, arcs, i, j)
+    if i == j:
+        return 0
+    import numpy as np
+
+    left, right = _endpoints(node_labels, arcs)
+    new_position = np.arange(len(node_labels), dtype=np.int64)
+    new_position[i], new_position[j] = j, i
+    new_left, new_right = _relabelled(left, right, new_position)
+    touched = (left == i) | (right == i) | (left == j) | (right == j)
+    return int(_compiled["delta"](left, right, new_left, new_right, touched))
+
+
+def move_delta_accel(
+    node_labels: list[NodeLabel],
+    arcs: list[ArcTuple],
+    node: NodeLabel,
+    position: int
+) -> int:
+    """
+    Returns the change in the crossing count when 'node' is removed and
+    re-inserted at 'position', like fast.move_delta.
+    """
+    if active_backend() == "python":
+        return move_delta(node_labels, arcs, node, position)
+    import numpy as np
+
+    index = node_labels.index(node)
+    order = list(range(len(node_labels)))
+    order.pop(index)
+    order.insert(position, index)
+    new_position = np.empty(len(order), dtype=np.int64)
+    new_position[order] = np.arange(len(order))
+
+    left, right = _endpoints(node_labels, arcs)
+    new_left, new_right = _relabelled(left, right, new_position)
+    touched = (left == index) | (right == index)
+    return int(_compiled["delta"](left, right, new_left, new_right, touched))
@@ -0,0 +1,208 @@
+"""
+Fast crossing counts
+-- alternatives to the O(n^4) adjacency-matrix sums in count_crossing that
+   work on the edge list instead: a Fenwick-tree (BIT) sweep in
+   O(m log n), a NumPy pairwise count in O(m^2 / 64) vectorized steps, and
+   node-local counts that give the exact change of a swap or a move
+-- every function returns exactly what the reference would: arcs are
+   undirected, duplicate arcs count once and self-loops never cross
+-- checked against the reference by ``python -m count_crossing.verify``
+
+Two chords with endpoint positions a < b and c < d cross when exactly one
+of c, d lies strictly between a and b, i.e. a < c < b < d or c < a < d < b.
+Chords sharing an endpoint never cross.
+
+"""
+
+from count_crossing import ArcTuple, NodeLabel
+
+Chord = tuple[int, int]
+
+
+def chords(
+    node_labels: list[NodeLabel] = [],
+    arcs: list[ArcTuple] = []
+) -> list[Chord]:
+    """
+    Returns the distinct arcs of the graph as (i, j) position pairs with
+    i < j, in first-seen order. Self-loops are dropped.
+
+    Raises ValueError if an arc endpoint is not in 'node_labels'.
+    """
+    position = {node: i for i, node in enumerate(node_labels)}
+    seen = set()
+    result = []
+    for arc in arcs:
+        try:
+            i, j = position[arc[0]], position[arc[1]]
+        except KeyError:
+            raise ValueError("Node not found in the graph.")
+        if i == j:
+            continue
+        chord = (i, j) if i < j else (j, i)
+        if chord not in seen:
+            seen.add(chord)
+            result.append(chord)
+    return result
+
+
+def crosses(first: Chord, second: Chord) -> bool:
+    """
+    Returns whether two normalized chords (i < j) cross.
+    """
+    a, b = first
+    c, d = second
+    return a < c < b < d or c < a < d < b
+
+
+def count_graph_crossings_sparse(
+    node_labels: list[NodeLabel] = [],
+    arcs: list[ArcTuple] = []
+) -> int:
+    """
+    Returns the crossing count of the circular drawing of the graph, like
+    count_graph_crossings, with a Fenwick-tree sweep in O(m log n).
+
+    Chords are visited by left endpoint. A chord (c, d) crosses every
+    earlier chord (a, b) with a < c < b < d, so it adds the number of
+    already inserted right endpoints strictly inside (c, d). Chords with the
+    same left endpoint share it, so they are all queried before any is
+    inserted.
+    """
+    node_size = len(node_labels)
+    tree = [0] * (node_size + 1)
+
+    def insert(position):
+        position += 1
+        while position <= node_size:
+            tree[position] += 1
+            position += position & -position
+
+    def prefix(position):
+        # inserted right endpoints at positions < 'position'
+        total = 0
+        while position > 0:
+            total += tree[position]
+            position -= position & -position
+        return total
+
+    by_left = sorted(chords(node_labels, arcs))
+    total = 0
+    start = 0
+    while start < len(by_left):
+        stop = start
+        while stop < len(by_left) and by_left[stop][0] == by_left[start][0]:
+            stop += 1
+        for c, d in by_left[start:stop]:
+            total += prefix(d) - prefix(c + 1)
+        for _, d in by_left[start:stop]:
+            insert(d)
+        start = stop
+    return total
+
+
+def count_graph_crossings_numpy(
+    node_labels: list[NodeLabel] = [],
+    arcs: list[ArcTuple] = [],
+    block: int = 2048
+) -> int:
+    """
+    Returns the crossing count of the circular drawing of the graph, like
+    count_graph_crossings, by comparing all chord pairs with NumPy in
+    blocks of 'block' rows (O(block * m) memory).
+    """
+    import numpy as np
+
+    pairs = chords(node_labels, arcs)
+    if len(pairs) < 2:
+        return 0
+    ends = np.array(pairs, dtype=np.int64)
+    left, right = ends[:, 0], ends[:, 1]
+
+    total = 0
+    for start in range(0, len(ends), block):
+        a = left[start:start + block, None]
+        b = right[start:start + block, None]
+        # each crossing pair counted once, from the chord with the smaller
+        # left endpoint: a < c < b < d
+        total += int(np.count_nonzero((a < left) & (left < b) & (b < right)))
+    return total
+
+
+def _crossings_touching(ends, touched):
+    """
+    Number of crossing chord pairs with at least one chord in 'touched'
+    (a set of indices into 'ends').
+    """
+    total = 0
+    for index in touched:
+        first = ends[index]
+        for other, second in enumerate(ends):
+            # count pairs inside 'touched' once
+            if other in touched and other <= index:
+                continue
+            if crosses(first, second):
+                total += 1
+    return total
+
+
+def count_node_crossings_sparse(
+    node: NodeLabel,
+    node_labels: list[NodeLabel] = [],
+    arcs: list[ArcTuple] = []
+) -> int:
+    """
+    Returns the count of crossings on the incident edges of 'node', like
+    count_node_crossings, in O(deg(node) * m).
+    """
+    if node not in node_labels: raise ValueError(
+            f"Node {node} is not in node_labels: {node_labels}"
+        )
+
+    index = node_labels.index(node)
+    ends = chords(node_labels, arcs)
+    touched = {k for k, chord in enumerate(ends) if index in chord}
+    return _crossings_touching(ends, touched)
+
+
+def swap_delta(
+    node_labels: list[NodeLabel],
+    arcs: list[ArcTuple],
+    i: int,
+    j: int
+) -> int:
+    """
+    Returns the change in the crossing count when the nodes at positions
+    'i' and 'j' trade places. Only chords at those two nodes can change, so
+    this costs O((deg_i + deg_j) * m) instead of two full counts.
+    """
+    if i == j:
+        return 0
+    swapped = list(node_labels)
+    swapped[i], swapped[j] = swapped[j], swapped[i]
+
+    before = chords(node_labels, arcs)
+    after = chords(swapped, arcs)
+    touched_before = {k for k, c in enumerate(before) if i in c or j in c}
+    touched_after = {k for k, c in enumerate(after) if i in c or j in c}
+    return (_crossings_touching(after, touched_after)
+            - _crossings_touching(before, touched_before))
+
+
+def move_delta(
+    node_labels: list[NodeLabel],
+    arcs: list[ArcTuple],
+    node: NodeLabel,
+    position: int
+) -> int:
+    """
+    Returns the change in the crossing count when 'node' is removed and
+    re-inserted at 'position' (list.pop then list.insert, as in
+    local_adjusting). The other nodes keep their circular order, so only
+    chords at 'node' can change: O(deg * m).
+    """
+    moved = list(node_labels)
+    moved.remove(node)
+    moved.insert(position, node)
+    return (count_node_crossings_sparse(node, moved, arcs)
+            - count_node_crossings_sparse(node, node_labels, arcs))
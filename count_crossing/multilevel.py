@@ -0,0 +1,329 @@
+"""
+Multilevel ordering
+-- orders graphs far too large for local_adjusting (which needs O(n^5)
+   work): coarsen, order the small coarse graph, then refine level by level
+-- coarsening merges pairs of nodes along their heaviest edge (heavy-edge
+   matching); with a ``group_dict`` only nodes of the same group merge, so
+   groups coarsen internally and stay contiguous
+-- the coarsest graph is ordered exactly when it has at most
+   EXACT_LIMIT nodes, otherwise with AVSDF (arc_crossing)
+-- each finer level is refined by sifting: every node is moved through a
+   window of nearby positions one adjacent swap at a time, and the change
+   in crossings of each swap is computed from the two nodes' edges alone
+
+A coarse edge carries the number of original edges it stands for, and two
+crossing coarse edges count as the product of their weights. On the
+original graph every weight is 1, so the deltas are the exact changes in
+count_graph_crossings (checked by ``python -m count_crossing.verify``).
+
+"""
+
+from itertools import permutations
+
+from arc_crossing import minimize_crossings
+from count_crossing import ArcTuple, NodeLabel
+from count_crossing.fast import count_graph_crossings_sparse
+from instrument import count, heuristic, note, progress
+
+# Largest coarse graph (without groups) ordered by trying every order
+EXACT_LIMIT = 7
+
+
+def _adjacency(size, pairs):
+    """
+    List of {neighbor: weight} dicts over node indices 0..size-1, each
+    distinct undirected pair with weight 1. Self-loops are dropped.
+    """
+    adj = [{} for _ in range(size)]
+    for i, j in pairs:
+        if i != j:
+            adj[i][j] = 1
+            adj[j][i] = 1
+    return adj
+
+
+def adjacent_swap_delta(order, position, adj, i):
+    """
+    Returns the change in (weighted) crossings when the nodes at positions
+    'i' and 'i + 1' of the circular order 'order' trade places.
+
+    Inputs:
+        order:     list of node indices
+        position:  list mapping each node index to its place in 'order'
+        adj:       list of {neighbor: weight} dicts
+        i:         position of the first node of the pair
+
+    Only pairs of edges (a, x), (b, y) with a, b the swapped nodes and x, y
+    two other distinct nodes can change, and each such pair flips: before
+    the swap it crosses when x comes before y going clockwise from the
+    pair, afterwards when y comes before x. Costs O(d log d) for the two
+    degrees d.
+    """
+    n = len(order)
+    a, b = order[i], order[(i + 1) % n]
+    start = i + 2
+
+    xs = sorted(((position[x] - start) % n, w)
+                for x, w in adj[a].items() if x != b)
+    ys = sorted(((position[y] - start) % n, w)
+                for y, w in adj[b].items() if y != a)
+
+    # merge by rank; equal ranks are the same node, which never crosses
+    before = after = 0
+    seen_x = seen_y = 0
+    p = q = 0
+    while p < len(xs) or q < len(ys):
+        if q == len(ys) or (p < len(xs) and xs[p][0] < ys[q][0]):
+            after += xs[p][1] * seen_y
+            seen_x += xs[p][1]
+            p += 1
+        elif p == len(xs) or ys[q][0] < xs[p][0]:
+            before += ys[q][1] * seen_x
+            seen_y += ys[q][1]
+            q += 1
+        else:
+            after += xs[p][1] * seen_y
+            before += ys[q][1] * seen_x
+            seen_x += xs[p][1]
+            seen_y += ys[q][1]
+            p += 1
+            q += 1
+    return after - before
+
+
+def sifting_move_delta(
+    node_labels: list[NodeLabel],
+    arcs: list[ArcTuple],
+    node: NodeLabel,
+    position: int
+) -> int:
+    """
+    Returns the change in the crossing count when 'node' is removed and
+    re-inserted at 'position', like fast.move_delta, as the sum of the
+    adjacent swaps that carry it there.
+    """
+    index = {label: k for k, label in enumerate(node_labels)}
+    try:
+        pairs = [(index[a[0]], index[a[1]]) for a in arcs]
+    except KeyError:
+        raise ValueError("Node not found in the graph.")
+    adj = _adjacency(len(node_labels), pairs)
+
+    order = list(range(len(node_labels)))
+    place = list(order)
+    current = index[node]
+    total = 0
+    while current != position:
+        i = current if position > current else current - 1
+        total += adjacent_swap_delta(order, place, adj, i)
+        _swap(order, place, i)
+        current += 1 if position > current else -1
+    return total
+
+
+def _swap(order, position, i):
+    a, b = order[i], order[i + 1]
+    order[i], order[i + 1] = b, a
+    position[a], position[b] = i + 1, i
+
+
+def _coarsen(adj, group):
+    """
+    One round of heavy-edge matching. Nodes are visited from lowest to
+    highest degree; each unmatched node merges with the unmatched neighbor
+    (of the same group) joined by the heaviest edge.
+
+    Output:  (members, coarse_adj, coarse_group)
+        members:  coarse node -> list of one or two fine nodes
+    """
+    size = len(adj)
+    match = [None] * size
+    members = []
+    for u in sorted(range(size), key=lambda u: (len(adj[u]), u)):
+        if match[u] is not None:
+            continue
+        best = None
+        for v, w in adj[u].items():
+            if match[v] is not None or group[v] != group[u]:
+                continue
+            key = (w, -len(adj[v]), -v)
+            if best is None or key > best[0]:
+                best = (key, v)
+        match[u] = len(members)
+        if best is None:
+            members.append([u])
+        else:
+            match[best[1]] = len(members)
+            members.append([u, best[1]])
+
+    coarse_adj = [{} for _ in members]
+    for u in range(size):
+        for v, w in adj[u].items():
+            cu, cv = match[u], match[v]
+            if cu != cv:
+                coarse_adj[cu][cv] = coarse_adj[cu].get(cv, 0) + w
+    coarse_group = [group[m[0]] for m in members]
+    return members, coarse_adj, coarse_group
+
+
+def _weighted_crossings(order, adj):
+    """
+    Weighted crossing count of a (small) coarse graph, pair by pair.
+    """
+    position = {node: k for k, node in enumerate(order)}
+    edges = [(min(position[u], position[v]), max(position[u], position[v]), w)
+             for u in range(len(adj)) for v, w in adj[u].items() if u < v]
+    total = 0
+    for p, (a, b, w) in enumerate(edges):
+        for c, d, x in edges[p + 1:]:
+            if a < c < b < d or c < a < d < b:
+                total += w * x
+    return total
+
+
+def _exact_order(adj):
+    """
+    Crossing-minimal circular order of a tiny graph. Node 0 stays first
+    (rotations give the same crossings) and reflections are skipped.
+    """
+    size = len(adj)
+    best = None
+    for rest in permutations(range(1, size)):
+        if size > 2 and rest[0] > rest[-1]:
+            continue  # reflection of an order already tried
+        order = [0, *rest]
+        cost = _weighted_crossings(order, adj)
+        if best is None or cost < best[0]:
+            best = (cost, order)
+    return best[1]
+
+
+def _initial_order(adj, group, blocks):
+    """
+    Order of the coarsest graph: exact when it is tiny and ungrouped,
+    otherwise AVSDF. Groups are then gathered into their blocks, keeping
+    the AVSDF order inside each.
+    """
+    if len(blocks) == 1 and len(adj) <= EXACT_LIMIT:
+        return _exact_order(adj) if adj else []
+
+    pairs = [(u, v) for u in range(len(adj)) for v in adj[u] if u < v]
+    order = minimize_crossings(list(range(len(adj))), pairs)
+    rank = {g: k for k, g in enumerate(blocks)}
+    return sorted(order, key=lambda u: rank[group[u]])
+
+
+def _sift(order, adj, group, window, passes):
+    """
+    Move each node, highest degree first, to the best position within
+    'window' steps on either side (never past the edge of its group), using
+    adjacent swap deltas. Repeats up to 'passes' times while anything moves.
+
+    Output:  total change in (weighted) crossings
+    """
+    n = len(order)
+    position = [0] * n
+    for k, u in enumerate(order):
+        position[u] = k
+    ranked = sorted(range(n), key=lambda u: (-len(adj[u]), u))
+
+    total = 0
+    for _ in range(passes):
+        moved = False
+        for u in ranked:
+            start = position[u]
+            best_delta, best_place = 0, start
+            for step in (1, -1):
+                delta = 0
+                place = start
+                while (abs(place - start) < window
+                       and 0 <= place + step < n
+                       and group[order[place + step]] == group[u]):
+                    i = place if step == 1 else place - 1
+                    delta += adjacent_swap_delta(order, position, adj, i)
+                    _swap(order, position, i)
+                    place += step
+                    if delta < best_delta:
+                        best_delta, best_place = delta, place
+                # walk back to the start before trying the other side
+                while place != start:
+                    i = place - 1 if step == 1 else place
+                    _swap(order, position, i)
+                    place -= step
+            count("moves_tried")
+            if best_place != start:
+                step = 1 if best_place > start else -1
+                place = start
+                while place != best_place:
+                    _swap(order, position, place if step == 1 else place - 1)
+                    place += step
+                total += best_delta
+                moved = True
+                count("moves_accepted")
+        if not moved:
+            break
+    return total
+
+
+@heuristic("multilevel")
+def multilevel_order(nodes=[], arcs=[], group_dict=None, window=8, passes=4,
+                     coarsest=EXACT_LIMIT):
+    """
+    Order 'nodes' to reduce crossings of 'arcs' with a multilevel
+    coarsen-solve-refine scheme; meant for graphs far too large for LS and
+    LA.
+
+    Inputs:
+        nodes:       node labels (any hashable type)
+        arcs:        tuples whose first two entries are node labels; further
+                     entries (weights, colors) are ignored
+        group_dict:  optional node -> group map. Nodes only merge with and
+                     move among nodes of their own group, and groups stay
+                     contiguous in the order of their first node in 'nodes'
+        window:      how far (in positions) sifting moves a node
+        passes:      sifting passes per level
+        coarsest:    stop coarsening at this many nodes per group
+
+    Output:  new list of the node labels
+
+    """
+    nodes = list(nodes)
+    if len(nodes) < 3:
+        return nodes
+
+    index = {label: k for k, label in enumerate(nodes)}
+    try:
+        pairs = [(index[a[0]], index[a[1]]) for a in arcs]
+    except KeyError:
+        raise ValueError("Node not found in the graph.")
+    adj = _adjacency(len(nodes), pairs)
+
+    if group_dict is None:
+        group = [0] * len(nodes)
+    else:
+        group = [group_dict[label] for label in nodes]
+    blocks = list(dict.fromkeys(group))
+
+    # coarsen while matching still shrinks the graph
+    levels = []
+    while len(adj) > coarsest * len(blocks):
+        members, coarse_adj, coarse_group = _coarsen(adj, group)
+        if len(members) > 0.9 * len(adj):
+            break
+        levels.append((members, adj, group))
+        adj, group = coarse_adj, coarse_group
+    note("levels", len(levels))
+    note("coarsest_nodes", len(adj))
+
+    # solve the coarsest level, then refine it and every finer level after
+    # projecting (each coarse node becomes its members)
+    order = _initial_order(adj, group, blocks)
+    while levels:
+        _sift(order, adj, group, window, passes)
+        members, adj, group = levels.pop()
+        order = [u for c in order for u in members[c]]
+
+    crossings = count_graph_crossings_sparse(order, pairs)
+    progress(crossings)
+    progress(crossings + _sift(order, adj, group, window, passes))
+    return [nodes[u] for u in order]
@@ -0,0 +1,143 @@
+"""
+Parallel crossing counts
+-- one full count of a graph with hundreds of thousands of edges, split
+   across a process pool: the deduplicated chords go into a
+   ``multiprocessing.shared_memory`` block once, each worker counts a range
+   of left endpoints, and the partial counts are summed
+-- count_graph_crossings switches to it above PARALLEL_THRESHOLD arcs, and
+   proportion_arc uses it for the final crossing count of the split graph
+-- below the threshold, or with one CPU, the same partition is counted in
+   this process
+
+Chords (c, d) are sorted by left endpoint and cut into ranges that never
+split a run of equal left endpoints. A chord crosses every chord (a, b)
+with a < c < b < d, which is either in an earlier range or in its own:
+
+-- earlier ranges: a < c always holds, so this is the number of earlier
+   right endpoints strictly inside (c, d), read off a histogram of them
+-- its own range: the Fenwick-tree sweep of count_crossing.accel
+
+"""
+
+import os
+
+from count_crossing import PARALLEL_THRESHOLD, ArcTuple, NodeLabel
+from count_crossing.accel import count_sorted_chords
+
+
+def sorted_chords(node_labels, arcs):
+    """
+    Distinct chords of the graph as two int64 arrays (left < right), sorted
+    by left then right endpoint. Self-loops are dropped.
+
+    Raises ValueError if an arc endpoint is not in 'node_labels'.
+    """
+    import numpy as np
+
+    size = len(node_labels)
+    position = {node: k for k, node in enumerate(node_labels)}
+    try:
+        ends = np.array([position[node] for arc in arcs for node in arc[:2]],
+                        dtype=np.int64).reshape(-1, 2)
+    except KeyError:
+        raise ValueError("Node not found in the graph.")
+    left, right = ends.min(axis=1), ends.max(axis=1)
+    keep = left != right
+    codes = np.unique(left[keep] * size + right[keep])
+    return codes // size, codes % size
+
+
+def _ranges(left, parts):
+    """
+    Cut the sorted chords into about 'parts' (start, stop) index ranges of
+    similar length, each boundary at the first chord of its left endpoint.
+    """
+    import numpy as np
+
+    m = len(left)
+    cuts = np.searchsorted(left, left[np.arange(1, parts) * m // parts])
+    bounds = [0, *sorted(set(cuts.tolist()) - {0}), m]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _range_count(left, right, size, start, stop):
+    """
+    Crossings in which the chord with the larger left endpoint is one of
+    chords start .. stop - 1.
+    """
+    import numpy as np
+
+    # earlier[x] = number of right endpoints < x among chords 0 .. start - 1
+    earlier = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(right[:start], minlength=size), out=earlier[1:])
+    c, d = left[start:stop], right[start:stop]
+    total = int((earlier[d] - earlier[c + 1]).sum())
+    return total + count_sorted_chords(c, d, size)
+
+
+def _shared_range_count(name, m, size, start, stop):
+    """
+    Worker: _range_count over the chords in shared memory block 'name'
+    (left endpoints, then right endpoints).
+    """
+    from multiprocessing import shared_memory
+
+    import numpy as np
+
+    block = shared_memory.SharedMemory(name=name)
+    ends = np.ndarray((2, m), dtype=np.int64, buffer=block.buf)
+    try:
+        return _range_count(ends[0], ends[1], size, start, stop)
+    finally:
+        # the view must go before the block can close
+        del ends
+        block.close()
+
+
+def count_graph_crossings_parallel(
+    node_labels: list[NodeLabel] = [],
+    arcs: list[ArcTuple] = [],
+    workers: int | None = None,
+    threshold: int = PARALLEL_THRESHOLD,
+    parts: int | None = None
+) -> int:
+    """
+    Returns the crossing count of the circular drawing of the graph, like
+    count_graph_crossings.
+
+    Inputs:
+        workers:    pool size (default: CPU count); 1 counts in-process
+        threshold:  fewer distinct chords than this are counted in-process
+        parts:      number of left-endpoint ranges (default: 'workers')
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    import numpy as np
+
+    size = len(node_labels)
+    left, right = sorted_chords(node_labels, arcs)
+    m = len(left)
+    if m < 2:
+        return 0
+
+    workers = workers or os.cpu_count() or 1
+    ranges = _ranges(left, parts or workers)
+    if workers == 1 or m < threshold or len(ranges) == 1:
+        return sum(_range_count(left, right, size, start, stop)
+                   for start, stop in ranges)
+
+    block = shared_memory.SharedMemory(create=True, size=2 * m * 8)
+    try:
+        ends = np.ndarray((2, m), dtype=np.int64, buffer=block.buf)
+        ends[0], ends[1] = left, right
+        del ends
+        workers = min(workers, len(ranges))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_shared_range_count, block.name, m, size,
+                                   start, stop)
+                       for start, stop in ranges]
+            return sum(future.result() for future in futures)
+    finally:
+        block.close()
+        block.unlink()
@@ -0,0 +1,186 @@
+"""
+Parallel per-cluster refinement
+-- refines the clusters of a grouped order (LS or LA inside each run of
+   same-group nodes) in worker processes instead of one after another,
+   with the same result as the in-order pass
+-- reordering inside cluster A only changes whether two arcs cross when
+   both have an end in A; unless A shares an arc with cluster B, no pair
+   of arcs depends on the order inside both, so the changes made in A and
+   in B simply add up, and neither changes what the other decides
+-- the in-order pass refines cluster k after every earlier cluster, but it
+   only has to wait for the earlier clusters it shares an arc with. Each
+   cluster gets the level one past its highest earlier neighbor; clusters
+   of one level share no arc, so they are refined at once against the same
+   snapshot of the order, and every block is merged back
+
+Each task carries the snapshot and its cluster's range in it; the arcs
+and node map go to each worker once, when the pool starts.
+
+"""
+
+import os
+
+from count_crossing import ArcTuple, NodeLabel, cluster_local_adjusting
+from count_crossing.fast import count_graph_crossings_sparse
+from instrument import active, count, heuristic, note, progress, recording
+
+# Arcs and node map of the current pool, set in each worker
+_SHARED = {}
+
+
+def cluster_spans(nodes, node_map):
+    """
+    Returns the clusters of 'nodes' as (start, end) index ranges: maximal
+    runs of consecutive nodes with the same value under 'node_map'.
+    """
+    spans = []
+    start = 0
+    while start < len(nodes):
+        end = start
+        group = node_map[nodes[start]]
+        while end < len(nodes) and node_map[nodes[end]] == group:
+            end += 1
+        spans.append((start, end))
+        start = end
+    return spans
+
+
+def color_clusters(spans, nodes, arcs, node_map):
+    """
+    Color the cluster-interaction graph (clusters joined by an arc) by
+    level: in order, each cluster gets one more than the highest color of
+    its neighbors earlier in 'spans'.
+
+    Output:  list of color classes, each a list of indices into 'spans', in
+             the order they can run
+    """
+    cluster = {}
+    for k, (start, end) in enumerate(spans):
+        for node in nodes[start:end]:
+            cluster[node] = k
+
+    neighbors = [set() for _ in spans]
+    for a in arcs:
+        u, v = cluster[a[0]], cluster[a[1]]
+        if u != v:
+            neighbors[u].add(v)
+            neighbors[v].add(u)
+
+    color = [0] * len(spans)
+    for k in range(len(spans)):
+        color[k] = max((color[j] + 1 for j in neighbors[k] if j < k),
+                       default=0)
+
+    classes = [[] for _ in range(max(color, default=-1) + 1)]
+    for k, c in enumerate(color):
+        classes[c].append(k)
+    return classes
+
+
+def adjusting_inside_cluster(start_index, cur_crossings, nodes, arcs,
+                             node_map):
+    """
+    cluster_local_adjusting on the cluster starting at 'start_index', in
+    the calling convention of local_search_inside_clusters: 'nodes' is
+    updated in place and (end_index, cur_crossings) returned.
+    """
+    end_index = start_index
+    cur_group = node_map[nodes[start_index]]
+    while end_index < len(nodes) and node_map[nodes[end_index]] == cur_group:
+        end_index += 1
+    nodes[:] = cluster_local_adjusting(start_index, end_index - 1,
+                                       nodes=nodes, arcs=arcs)
+    return end_index, cur_crossings
+
+
+def _start_worker(arcs, node_map, refine):
+    _SHARED.update(arcs=arcs, node_map=node_map, refine=refine)
+
+
+def _refine_span(snapshot, start, end, crossings, record):
+    """
+    Worker: refine nodes start .. end - 1 of 'snapshot', which has
+    'crossings' crossings.
+
+    Output:  (new order of those nodes, change in crossings, counters
+             recorded while refining)
+    """
+    nodes = list(snapshot)
+    arcs = _SHARED["arcs"]
+    counters = {}
+    if record:
+        with recording() as stats:
+            _SHARED["refine"](start, crossings, nodes, arcs,
+                              _SHARED["node_map"])
+        counters = stats.totals()
+    else:
+        _SHARED["refine"](start, crossings, nodes, arcs, _SHARED["node_map"])
+    delta = count_graph_crossings_sparse(nodes, arcs) - crossings
+    return nodes[start:end], delta, counters
+
+
+@heuristic("refine_clusters")
+def refine_clusters(
+    nodes: list[NodeLabel],
+    arcs: list[ArcTuple],
+    node_map,
+    refine,
+    workers: int | None = None
+) -> int:
+    """
+    Refine every cluster of 'nodes' once with 'refine', running clusters of
+    the same color in parallel. The order ends up the same as refining the
+    clusters one after another, left to right.
+
+    Inputs:
+        nodes:     node labels, grouped into clusters (reordered in place)
+        arcs:      list of (source, dest) tuples
+        node_map:  node -> cluster label (dict, or list indexed by node)
+        refine:    module-level function with the signature of
+                   local_search_inside_clusters: (start_index,
+                   cur_crossings, nodes, arcs, node_map), reordering
+                   nodes in place
+        workers:   pool size (default: CPU count); 1 runs in-process
+
+    Output:  crossing count of the final order
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    spans = cluster_spans(nodes, node_map)
+    classes = color_clusters(spans, nodes, arcs, node_map)
+    note("clusters", len(spans))
+    note("cluster_colors", len(classes))
+    record = active() is not None
+
+    crossings = count_graph_crossings_sparse(nodes, arcs)
+    progress(crossings)
+
+    workers = workers or os.cpu_count() or 1
+    pool = None
+    if workers > 1 and len(classes) < len(spans):
+        pool = ProcessPoolExecutor(max_workers=workers,
+                                   initializer=_start_worker,
+                                   initargs=(arcs, node_map, refine))
+    else:
+        _start_worker(arcs, node_map, refine)
+
+    try:
+        for batch in classes:
+            tasks = [(nodes, *spans[k], crossings, record) for k in batch]
+            if pool is None:
+                results = [_refine_span(*task) for task in tasks]
+            else:
+                results = list(pool.map(_refine_span, *zip(*tasks)))
+            # clusters of one color share no arc, so their deltas add
+            for k, (block, delta, counters) in zip(batch, results):
+                for name, n in counters.items():
+                    count(name, n)
+                start, end = spans[k]
+                nodes[start:end] = block
+                crossings += delta
+            progress(crossings)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        _SHARED.clear()
+    return crossings
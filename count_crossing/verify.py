@@ -0,0 +1,313 @@
+"""
+Differential crossing-count verifier
+
+    python -m count_crossing.verify [--trials 500] [--seed 0]
+                                    [--max-nodes 12] [--backend NAME ...]
+                                    [--accel numba|python]
+
+-- generates random graphs and orderings (including the awkward cases:
+   duplicate and reversed arcs, self-loops, isolated nodes, fewer than four
+   nodes) and checks that every crossing-count backend agrees with the
+   O(n^4) reference in count_crossing and with a brute-force count over
+   edge pairs
+-- checks node crossing counts (whose circular indexing goes through
+   ``permutator``) the same way, and that the reference is invariant under
+   rotating and reflecting the order
+-- verifies swap / move deltas against a full recount before and after
+-- on the first failure, shrinks the graph to a minimal reproduction,
+   prints it and exits with status 1
+
+New fast backends go in GRAPH_BACKENDS / NODE_BACKENDS / SWAP_DELTAS /
+MOVE_DELTAS below, so they are checked before anything uses them.
+
+"""
+
+import argparse
+import random
+import sys
+from functools import partial
+
+from count_crossing import count_graph_crossings, count_node_crossings
+from count_crossing.accel import (BACKENDS, active_backend,
+                                  count_graph_crossings_accel,
+                                  count_node_crossings_accel, move_delta_accel,
+                                  set_backend, swap_delta_accel)
+from count_crossing.bitset import (count_graph_crossings_bitset,
+                                   count_node_crossings_bitset)
+from count_crossing.fast import (chords, count_graph_crossings_numpy,
+                                 count_graph_crossings_sparse,
+                                 count_node_crossings_sparse, crosses,
+                                 move_delta, swap_delta)
+from count_crossing.multilevel import sifting_move_delta
+from count_crossing.parallel import count_graph_crossings_parallel
+
+
+# name -> f(node_labels, arcs) -> int
+GRAPH_BACKENDS = {
+    "reference": count_graph_crossings,
+    "sparse": count_graph_crossings_sparse,
+    "numpy": count_graph_crossings_numpy,
+    "bitset": count_graph_crossings_bitset,
+    "accel": count_graph_crossings_accel,
+    # the range split of the process pool, counted in-process
+    "parallel": partial(count_graph_crossings_parallel, workers=1, parts=3),
+}
+
+# name -> f(node, node_labels, arcs) -> int
+NODE_BACKENDS = {
+    "reference": count_node_crossings,
+    "sparse": count_node_crossings_sparse,
+    "bitset": count_node_crossings_bitset,
+    "accel": count_node_crossings_accel,
+}
+
+# name -> f(node_labels, arcs, i, j) -> change in crossings
+SWAP_DELTAS = {"local": swap_delta, "accel": swap_delta_accel}
+
+# name -> f(node_labels, arcs, node, position) -> change in crossings
+MOVE_DELTAS = {"local": move_delta, "sifting": sifting_move_delta,
+               "accel": move_delta_accel}
+
+
+def brute_force_crossings(node_labels, arcs):
+    """
+    Crossing count straight from the definition: every pair of distinct
+    chords, tested one by one.
+
+    """
+    ends = chords(node_labels, arcs)
+    return sum(crosses(ends[p], ends[q])
+               for p in range(len(ends)) for q in range(p + 1, len(ends)))
+
+
+def brute_force_node_crossings(node, node_labels, arcs):
+    """
+    Crossing pairs in which at least one chord ends at `node`.
+
+    """
+    index = node_labels.index(node)
+    ends = chords(node_labels, arcs)
+    return sum(crosses(ends[p], ends[q])
+               for p in range(len(ends)) for q in range(p + 1, len(ends))
+               if index in ends[p] or index in ends[q])
+
+
+def random_case(rng, max_nodes=12):
+    """
+    A random ordering and arc list on up to `max_nodes` nodes. Arcs may
+    repeat, appear in both directions or be self-loops; some nodes may have
+    no arcs at all.
+
+    Output:  (node_labels, arcs)
+
+    """
+    n = rng.randint(0, max_nodes)
+    node_labels = [f"n{i}" for i in range(n)]
+    rng.shuffle(node_labels)
+    if n == 0:
+        return node_labels, []
+
+    density = rng.random()
+    arcs = [(a, b) for p, a in enumerate(node_labels)
+            for b in node_labels[p + 1:] if rng.random() < density]
+    rng.shuffle(arcs)
+    arcs = [(b, a) if rng.random() < 0.5 else (a, b) for a, b in arcs]
+    if arcs and rng.random() < 0.3:
+        arcs += rng.choices(arcs, k=rng.randint(1, 3))        # duplicates
+    if rng.random() < 0.3:
+        arcs += [(node, node) for node in rng.sample(node_labels, 1)]
+    return node_labels, arcs
+
+
+def _check_graph(node_labels, arcs, backends):
+    expected = brute_force_crossings(node_labels, arcs)
+    for name, backend in backends.items():
+        got = backend(node_labels, arcs)
+        if got != expected:
+            return f"graph backend {name!r} returned {got}, expected {expected}"
+
+    reference = GRAPH_BACKENDS["reference"]
+    rotated = node_labels[1:] + node_labels[:1]
+    for label, order in (("rotation", rotated),
+                         ("reflection", node_labels[::-1])):
+        got = reference(order, arcs)
+        if got != expected:
+            return (f"reference changed under {label}: {got}, "
+                    f"expected {expected}")
+    return None
+
+
+def _check_nodes(node_labels, arcs, backends):
+    for node in node_labels:
+        expected = brute_force_node_crossings(node, node_labels, arcs)
+        for name, backend in backends.items():
+            got = backend(node, node_labels, arcs)
+            if got != expected:
+                return (f"node backend {name!r} returned {got} for {node!r}, "
+                        f"expected {expected}")
+    return None
+
+
+def _check_deltas(node_labels, arcs, rng, swaps, moves):
+    n = len(node_labels)
+    if n < 2:
+        return None
+    before = brute_force_crossings(node_labels, arcs)
+
+    i, j = rng.sample(range(n), 2)
+    swapped = list(node_labels)
+    swapped[i], swapped[j] = swapped[j], swapped[i]
+    expected = brute_force_crossings(swapped, arcs) - before
+    for name, delta in swaps.items():
+        got = delta(node_labels, arcs, i, j)
+        if got != expected:
+            return (f"swap delta {name!r} for positions ({i}, {j}) returned "
+                    f"{got}, expected {expected}")
+
+    node = rng.choice(node_labels)
+    position = rng.randrange(n)
+    moved = list(node_labels)
+    moved.remove(node)
+    moved.insert(position, node)
+    expected = brute_force_crossings(moved, arcs) - before
+    for name, delta in moves.items():
+        got = delta(node_labels, arcs, node, position)
+        if got != expected:
+            return (f"move delta {name!r} for {node!r} -> {position} "
+                    f"returned {got}, expected {expected}")
+    return None
+
+
+def check_case(node_labels, arcs, seed=0, graph=None, node=None, swaps=None,
+               moves=None):
+    """
+    Run every check on one graph.
+
+    Inputs:
+        node_labels, arcs:         the graph, in drawing order
+        seed:                      seed for the swap / move picked
+        graph, node, swaps, moves: backend dicts to check (default: all
+                                   registered ones)
+
+    Output:  None if everything agrees, otherwise a message describing the
+             first disagreement
+
+    """
+    rng = random.Random(seed)
+    graph = GRAPH_BACKENDS if graph is None else graph
+    node = NODE_BACKENDS if node is None else node
+    swaps = SWAP_DELTAS if swaps is None else swaps
+    moves = MOVE_DELTAS if moves is None else moves
+    return (_check_graph(node_labels, arcs, graph)
+            or _check_nodes(node_labels, arcs, node)
+            or _check_deltas(node_labels, arcs, rng, swaps, moves))
+
+
+def shrink(node_labels, arcs, fails):
+    """
+    Greedily drop arcs, then nodes without arcs, while `fails(node_labels,
+    arcs)` stays true.
+
+    Output:  (node_labels, arcs), a smaller failing case
+
+    """
+    changed = True
+    while changed:
+        changed = False
+        for k in range(len(arcs)):
+            candidate = arcs[:k] + arcs[k + 1:]
+            if fails(node_labels, candidate):
+                arcs = candidate
+                changed = True
+                break
+
+    used = {node for arc in arcs for node in arc[:2]}
+    for node in list(node_labels):
+        if node in used:
+            continue
+        candidate = [n for n in node_labels if n != node]
+        if fails(candidate, arcs):
+            node_labels = candidate
+    return node_labels, arcs
+
+
+def _select(backends, names):
+    if not names:
+        return backends
+    return {name: f for name, f in backends.items()
+            if name in names or name == "reference"}
+
+
+def run(trials=500, seed=0, max_nodes=12, names=None, report=print):
+    """
+    Check `trials` random cases.
+
+    Output:  None if all pass, otherwise (message, node_labels, arcs, case
+             seed) for the shrunk first failure
+
+    """
+    backends = {"graph": _select(GRAPH_BACKENDS, names),
+                "node": _select(NODE_BACKENDS, names),
+                "swaps": _select(SWAP_DELTAS, names),
+                "moves": _select(MOVE_DELTAS, names)}
+    rng = random.Random(seed)
+
+    for trial in range(trials):
+        case_seed = rng.randrange(2**32)
+        node_labels, arcs = random_case(random.Random(case_seed), max_nodes)
+        message = check_case(node_labels, arcs, case_seed, **backends)
+        if message is None:
+            continue
+
+        def fails(labels, candidate):
+            return check_case(labels, candidate, case_seed,
+                              **backends) is not None
+
+        node_labels, arcs = shrink(node_labels, arcs, fails)
+        message = check_case(node_labels, arcs, case_seed, **backends)
+        return message, node_labels, arcs, case_seed
+
+    if report:
+        report(f"{trials} random cases agree: graph "
+               f"{', '.join(backends['graph'])}; node "
+               f"{', '.join(backends['node'])}; swap deltas "
+               f"{', '.join(backends['swaps'])}; move deltas "
+               f"{', '.join(backends['moves'])} "
+               f"(accel kernels: {active_backend()})")
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m count_crossing.verify")
+    parser.add_argument("--trials", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-nodes", type=int, default=12,
+                        help="largest random graph (the reference is "
+                             "O(n^4), so keep this small)")
+    parser.add_argument("--backend", action="append", metavar="NAME",
+                        help="check only this backend (repeatable); the "
+                             "reference is always included")
+    parser.add_argument("--accel", choices=BACKENDS,
+                        help="kernels behind the 'accel' backend (default: "
+                             "numba when it is installed)")
+    args = parser.parse_args(argv)
+    if args.accel:
+        try:
+            set_backend(args.accel)
+        except ValueError as error:
+            parser.error(str(error))
+
+    failure = run(args.trials, args.seed, args.max_nodes, args.backend)
+    if failure is None:
+        return 0
+
+    message, node_labels, arcs, case_seed = failure
+    print(f"FAILED: {message}")
+    print(f"case seed: {case_seed}")
+    print(f"node_labels = {node_labels!r}")
+    print(f"arcs = {arcs!r}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Crossing-method cost model
+-- ``crossing_method="auto"`` in the chart entry points: estimate how long
+   each method would take on the graph at hand, and pick the one that
+   ended with the fewest crossings on benchmark graphs of about its size
+   among those that fit TARGET_SECONDS
+-- an estimate is a fitted per-method coefficient times a work count: for
+   LS and LA (and the node-level local adjusting before them on
+   proportional charts), crossing-count evaluations times the ~N^4 / 24
+   inner steps of the reference count on N nodes; for "multilevel" and
+   "sort", (n + m) log2(n + m)
+-- LS and LA may also run in parallel (count_crossing.schedule) when the
+   caller allows more than one worker and that is what makes them fit
+-- the coefficients and the quality rankings (one per size band, see
+   ``size_band``) come from benchmark results:
+
+       PYTHONHASHSEED=0 python benchmarks/pipeline.py \
+           --max-ordering-seconds 600 --calibrate crossing_cost.json
+
+-- nothing is logged: each decision (method, workers, estimates) is noted
+   in the active ``instrument`` recording, so it shows up in
+   ``PipelineStats.noted()`` and in the job "values" of
+   ``python -m arcproportion render --stats --timings FILE``
+
+"""
+
+import json
+import math
+import os
+from statistics import median
+
+from instrument import note
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "crossing_cost.json")
+
+# Default latency budget for the ordering stage of one chart
+TARGET_SECONDS = 2.0
+
+# Charts with a crossing_method
+CHARTS = ("proportion_arc", "grouped_arc", "chord")
+
+# Charts whose LS / LA take a ``workers`` argument
+PARALLEL_CHARTS = ("proportion_arc", "grouped_arc")
+
+_models = {}
+
+
+def _reference_steps(size):
+    # inner iterations of count_graph_crossings on 'size' nodes
+    return size ** 4 / 24
+
+
+def describe(chart, nodes, arcs, group_dict=None):
+    """
+    The graph sizes the cost model needs.
+
+    Inputs:
+        chart:       "proportion_arc", "grouped_arc" or "chord"
+        nodes:       node labels
+        arcs:        tuples whose first two entries are node labels
+        group_dict:  node -> group (grouped_arc and grouped chord charts)
+
+    Output:  dict with
+        nodes, arcs:  n and m
+        clusters:     sizes of the runs LS / LA refine: each node's ports
+                      (two per self-loop) for proportional charts, the
+                      groups otherwise
+        colors:       levels of the cluster-interaction graph, colored
+                      in input order as count_crossing.schedule colors it,
+                      i.e. how many batches the schedule would run
+    """
+    if chart == "proportion_arc":
+        cluster_of = {node: node for node in nodes}
+    elif group_dict is not None:
+        cluster_of = {node: group_dict[node] for node in nodes}
+    else:
+        cluster_of = {node: None for node in nodes}
+
+    if chart == "proportion_arc":
+        sizes = {node: 0 for node in nodes}
+        for a in arcs:
+            sizes[a[0]] += 1
+            sizes[a[1]] += 1
+    else:
+        sizes = {}
+        for node in nodes:
+            sizes[cluster_of[node]] = sizes.get(cluster_of[node], 0) + 1
+
+    index = {c: k for k, c in enumerate(sizes)}
+    neighbors = [set() for _ in sizes]
+    for a in arcs:
+        u, v = index[cluster_of[a[0]]], index[cluster_of[a[1]]]
+        if u != v:
+            neighbors[u].add(v)
+            neighbors[v].add(u)
+    color = [0] * len(sizes)
+    for k in range(len(sizes)):
+        color[k] = max((color[j] + 1 for j in neighbors[k] if j < k),
+                       default=0)
+
+    return {"nodes": len(nodes), "arcs": len(arcs),
+            "clusters": sorted(sizes.values(), reverse=True),
+            "colors": max(color, default=-1) + 1}
+
+
+def size_band(graph):
+    """
+    Size band of a graph described by ``describe``: its node count rounded
+    on a log2 scale, so 10 nodes fall in band 3 (8 to 11), 20 in band 4
+    and 40 in band 5. Graphs in one band share a quality ranking.
+    """
+    return round(math.log2(max(graph["nodes"], 1)))
+
+
+def work(chart, method, graph):
+    """
+    Work count of 'method' on a graph described by ``describe``.
+
+    Output:  (serial, per_cluster): the part that always runs in order,
+             and the part count_crossing.schedule can spread over workers
+    """
+    n, m = graph["nodes"], graph["arcs"]
+    sizes = graph["clusters"]
+    if method is None:
+        return 0.0, 0.0
+    if method in ("multilevel", "sort"):
+        # "sort": AVSDF, spectral and multilevel on the nodes, sweep counts
+        # and sorted ports
+        return (n + m) * math.log2(n + m + 2), 0.0
+
+    if chart == "proportion_arc":
+        # node_cluster_order runs local adjusting on the nodes first: n node
+        # counts and n positions per node, then LS / LA on the split graph
+        serial = (n * n + n) * _reference_steps(n)
+        size = 2 * m
+    else:
+        # the group order is tiny next to the nodes' refinement
+        serial = 0.0
+        size = n
+    if method == "LS":
+        pairs = (sum(s * (s - 1) // 2 for s in sizes) if chart == "chord"
+                 else sum(s * (s - 1) for s in sizes))
+        return serial, pairs * _reference_steps(size)
+    # LA: one node count and one count per position for every node
+    return serial, sum(s * s for s in sizes) * _reference_steps(size)
+
+
+def fit_model(results):
+    """
+    Fit the cost model to benchmark results (the "results" list written by
+    benchmarks/pipeline.py, each with a "graph" from ``describe``).
+
+    -- coefficient of (chart, method): the median of ordering seconds per
+       unit of work over the cases with any work
+    -- quality of (chart, method) in a size band: the mean, over the
+       band's graphs on which every method run in the band finished, of
+       (crossings + 1) / (fewest crossings of any method + 1); methods are
+       ranked by it, ties going to the one with the shorter median
+       ordering time in the band. A method that never ran in a band (the
+       suite's time cap) is left out of that band's ranking, and graphs
+       with a single method (chord charts without groups) rank nothing
+
+    Output:  model dict, as stored in crossing_cost.json
+    """
+    ratios = {}
+    runs = {}
+    seconds = {}
+    for r in results:
+        if "graph" not in r or r["chart"] not in CHARTS \
+                or r["method"] == "auto":
+            continue
+        serial, per_cluster = work(r["chart"], r["method"], r["graph"])
+        if serial + per_cluster > 0:
+            ratios.setdefault((r["chart"], str(r["method"])), []).append(
+                r["seconds"].get("ordering", 0.0) / (serial + per_cluster))
+        key = (r["chart"], size_band(r["graph"]))
+        graph_name = r["case"].rsplit("/", 2)[0]
+        runs.setdefault(key, {}).setdefault(graph_name, {})[
+            str(r["method"])] = r["crossings"]
+        seconds.setdefault((*key, str(r["method"])), []).append(
+            r["seconds"].get("ordering", 0.0))
+
+    quality = {}
+    for (chart, band), graphs in sorted(runs.items()):
+        graphs = {name: crossings for name, crossings in graphs.items()
+                  if len(crossings) > 1}
+        if not graphs:
+            continue
+        methods = set().union(*graphs.values())
+        scores = {method: [] for method in methods}
+        for crossings in graphs.values():
+            if set(crossings) != methods:
+                continue    # --quick skips LA / LS on the larger graphs
+            best = min(crossings.values())
+            for method, c in crossings.items():
+                scores[method].append((c + 1) / (best + 1))
+        ranking = dict(sorted(
+            ((method, sum(s) / len(s)) for method, s in scores.items() if s),
+            key=lambda item: (item[1],
+                              median(seconds[chart, band, item[0]]))))
+        if ranking:
+            quality.setdefault(chart, {})[str(band)] = ranking
+
+    return {
+        "coefficients": {
+            chart: {method: median(ratios[c, method])
+                    for c, method in sorted(ratios) if c == chart}
+            for chart in sorted({c for c, _ in ratios})
+        },
+        "quality": quality,
+    }
+
+
+def load_model(path=MODEL_PATH):
+    """
+    The stored cost model (read once per path).
+    """
+    if path not in _models:
+        with open(path, encoding="utf-8") as f:
+            _models[path] = json.load(f)
+    return _models[path]
+
+
+def _method(name):
+    return None if name == "None" else name
+
+
+def _ranking(model, chart, graph):
+    # the ranking of the calibrated band nearest the graph's, the smaller
+    # band on a tie
+    bands = model["quality"][chart]
+    band = size_band(graph)
+    return bands[min(bands, key=lambda b: (abs(int(b) - band), int(b)))]
+
+
+def estimate_seconds(chart, method, graph, model=None, workers=1):
+    """
+    Estimated ordering seconds of 'method' on a graph described by
+    ``describe``, with 'workers' processes for LS / LA.
+
+    Raises KeyError when the model has no coefficient for the method.
+    """
+    model = load_model() if model is None else model
+    if method is None:
+        return 0.0
+    coefficient = model["coefficients"][chart][str(method)]
+    serial, per_cluster = work(chart, method, graph)
+    if workers != 1 and per_cluster:
+        # one pass over the levels, each spread over at most its clusters
+        parallelism = max(1.0, len(graph["clusters"]) / graph["colors"])
+        per_cluster /= min(workers, parallelism)
+    return coefficient * (serial + per_cluster)
+
+
+def choose_crossing_method(chart, nodes, arcs, group_dict=None,
+                           target_seconds=TARGET_SECONDS, model=None,
+                           workers=1):
+    """
+    Pick a crossing_method (and worker count) for a chart.
+
+    Inputs:
+        chart:           "proportion_arc", "grouped_arc" or "chord"
+        nodes, arcs:     the graph
+        group_dict:      node -> group, for grouped charts
+        target_seconds:  latency budget for the ordering stage
+        model:           cost model dict (default: crossing_cost.json)
+        workers:         most processes LS / LA may use (None: one per
+                         CPU); 1 keeps them in-process
+
+    Output:  (crossing_method, workers). The method is the best-ranked one
+             in the graph's size band (the nearest calibrated one) whose
+             estimate fits 'target_seconds', first in-process and then
+             with the allowed workers; if none fits, the fastest.
+    """
+    model = load_model() if model is None else model
+    graph = describe(chart, nodes, arcs, group_dict)
+    allowed = workers or os.cpu_count() or 1
+
+    if chart == "chord" and group_dict is None:
+        # without groups the chord chart keeps the given node order
+        choice, seconds, used = None, 0.0, 1
+        estimates = {}
+    else:
+        estimates = {}
+        choice = None
+        for name in _ranking(model, chart, graph):
+            method = _method(name)
+            seconds = estimate_seconds(chart, method, graph, model)
+            estimates[name] = seconds
+            used = 1
+            if (seconds > target_seconds and allowed > 1
+                    and method in ("LS", "LA") and chart in PARALLEL_CHARTS):
+                seconds = estimate_seconds(chart, method, graph, model,
+                                           allowed)
+                used = allowed
+            if seconds <= target_seconds:
+                choice = (method, seconds, used)
+                break
+        if choice is None:
+            name = min(estimates, key=estimates.get)
+            choice = (_method(name), estimates[name], 1)
+        choice, seconds, used = choice
+
+    note("auto_crossing_method", choice)
+    note("auto_workers", used)
+    note("auto_estimate_seconds", seconds)
+    note("auto_estimates", estimates)
+    return choice, used
@@ -0,0 +1,150 @@
+"""
+Chart geometry
+-- pure NumPy vertex/code builders shared by every output backend
+-- the matplotlib renderers wrap these arrays in Path/PathCollection
+   objects; the SVG writer turns them straight into path data
+-- no matplotlib import, so layouts can be turned into geometry headlessly
+
+Path codes use the same integer values as matplotlib.path.Path, so code
+arrays built here can be handed to Path unchanged.
+
+"""
+
+import numpy as np
+
+
+# Same values as matplotlib.path.Path.{MOVETO, LINETO, CURVE3, CLOSEPOLY}
+MOVETO = 1
+LINETO = 2
+CURVE3 = 3
+CLOSEPOLY = 79
+CODE_TYPE = np.uint8
+
+
+# --- Chord chart ---
+
+def arc_points(theta_start, theta_end, radius=1.0, steps=24):
+    """
+    Sample `steps` points along a circular arc. `theta_start` and
+    `theta_end` may be scalars or equal-length arrays; for arrays the result
+    has shape (len(theta_start), steps, 2) so many arcs are sampled at once.
+
+    """
+    thetas = np.linspace(theta_start, theta_end, steps, axis=-1)
+    return np.stack((radius * np.cos(thetas), radius * np.sin(thetas)),
+                    axis=-1)
+
+
+def node_ring_paths(starts, ends, inner_radius=1.02, outer_radius=1.08,
+                    ring_steps=48):
+    """
+    Build the annular ring segment for every node in one pass. Each segment
+    runs along the outer radius from `start` to `end`, back along the inner
+    radius, and closes.
+
+    Returns (verts, codes): verts has shape (n, 2 * ring_steps + 1, 2) and
+    codes is the shared (2 * ring_steps + 1,) code array.
+
+    """
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+
+    verts = np.empty((len(starts), 2 * ring_steps + 1, 2))
+    verts[:, :ring_steps] = arc_points(starts, ends, outer_radius, ring_steps)
+    verts[:, ring_steps:2 * ring_steps] = arc_points(ends, starts,
+                                                     inner_radius, ring_steps)
+    verts[:, -1] = verts[:, 0]
+
+    codes = np.full(2 * ring_steps + 1, LINETO, dtype=CODE_TYPE)
+    codes[0] = MOVETO
+    codes[-1] = CLOSEPOLY
+    return verts, codes
+
+
+def chord_ribbon_paths(src_arcs, dst_arcs, arc_steps=24):
+    """
+    Build every ribbon in one pass. A ribbon's endpoints are arcs on the
+    unit circle and its sides are quadratic Bezier curves through the origin:
+
+        src_start -> src_end   (arc, LINETO)
+        src_end -> dst_start   (CURVE3 via origin)
+        dst_start -> dst_end   (arc, LINETO)
+        dst_end -> src_start   (CURVE3 via origin)
+
+    Inputs:
+        src_arcs, dst_arcs:  (k, 2) arrays of (theta_start, theta_end)
+        arc_steps:           sample points along each endpoint arc
+
+    Returns (verts, codes): verts has shape (k, 2 * arc_steps + 3, 2) and
+    codes is the shared (2 * arc_steps + 3,) code array.
+
+    """
+    src_arcs = np.asarray(src_arcs, dtype=float).reshape(-1, 2)
+    dst_arcs = np.asarray(dst_arcs, dtype=float).reshape(-1, 2)
+    s = arc_steps
+
+    src_pts = arc_points(src_arcs[:, 0], src_arcs[:, 1], steps=s)
+    dst_pts = arc_points(dst_arcs[:, 0], dst_arcs[:, 1], steps=s)
+
+    verts = np.zeros((len(src_arcs), 2 * s + 3, 2))
+    verts[:, :s] = src_pts
+    # verts[:, s] is the origin control point
+    verts[:, s + 1:2 * s + 1] = dst_pts
+    # verts[:, 2 * s + 1] is the origin control point
+    verts[:, 2 * s + 2] = src_pts[:, 0]
+
+    codes = np.full(2 * s + 3, LINETO, dtype=CODE_TYPE)
+    codes[0] = MOVETO
+    codes[s:s + 2] = CURVE3
+    codes[2 * s + 1:] = CURVE3
+    return verts, codes
+
+
+def batched_by_steps(build, src, dst, steps):
+    """
+    Call `build(src_subset, dst_subset, n_steps)` once per distinct entry of
+    `steps` (one sample count per item) and return a list of (verts, codes)
+    pairs, one per item, in the original order.
+
+    """
+    src = np.asarray(src, dtype=float)
+    dst = np.asarray(dst, dtype=float)
+    steps = np.asarray(steps)
+    out = [None] * len(src)
+    for n_steps in np.unique(steps):
+        idx = np.flatnonzero(steps == n_steps)
+        verts, codes = build(src[idx], dst[idx], int(n_steps))
+        for i, v in zip(idx, verts):
+            out[i] = (v, codes)
+    return out
+
+
+# --- Proportional arc chart ---
+
+def half_ellipse_points(left, right, steps=100, aspect=2.0):
+    """
+    Sample the half-ellipse drawn above the x-axis between `left` and
+    `right` (horizontal radius r, height `aspect` * r), from the right
+    endpoint to the left one. Proportional ribbons use aspect 2; basic arcs
+    use aspect 0.5. Returns an array of shape (steps, 2).
+
+    """
+    midpoint = (left + right) / 2
+    radius = np.abs(left - midpoint)
+
+    theta = np.radians(np.linspace(0, 180, steps))
+    return np.column_stack((midpoint + radius * np.cos(theta),
+                            aspect * radius * np.sin(theta)))
+
+
+def proportional_ribbon_polygon(pair1, pair2, steps=100):
+    """
+    Outline of a proportional ribbon: the outer boundary arc (`pair1`)
+    followed by the inner boundary arc (`pair2`) in reverse, so the points
+    trace the region between the two. Returns an array of shape
+    (2 * steps, 2).
+
+    """
+    outer = half_ellipse_points(pair1[0], pair1[1], steps)
+    inner = half_ellipse_points(pair2[0], pair2[1], steps)
+    return np.concatenate([outer, inner[::-1]])
@@ -7,10 +7,12 @@ Author:  Nathan Cordner
 
 import textwrap
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
 import numpy as np
 
+from geometry import proportional_ribbon_polygon
+from instrument import staged
+from layout_solver import auto_figure_width
+
 
 _DEFAULT_WRAP_WIDTH = 12
 
@@ -31,6 +33,7 @@ def wrap_labels(labels, width=_DEFAULT_WRAP_WIDTH):
             for label in labels]
 
 
+@staged("label_measurement")
 def _label_line_widths(labels):
     """
     Measure the rendered pixel width of each label. Multi-line labels are
@@ -43,30 +46,34 @@ def _label_line_widths(labels):
         widths:      list[float] — widest-line pixel width per label
         max_lines:   int — highest line count across all labels
 
-    Reference:  https://stackoverflow.com/questions/5320205/matplotlib-text-dimensions
+    Text is measured with a standalone Agg renderer at the default figure
+    dpi and font, so no pyplot figure is created and concurrent calls from
+    different threads don't share state.
 
     """
-    fig, ax = plt.subplots()
-    plt.xlim(0, max(1, len(labels)))
-    fig.canvas.draw()
-    r = fig.canvas.get_renderer()
+    import matplotlib
+    from matplotlib import cbook
+    from matplotlib.backends.backend_agg import RendererAgg
+    from matplotlib.font_manager import FontProperties
+
+    renderer = RendererAgg(1, 1, matplotlib.rcParams['figure.dpi'])
+    prop = FontProperties()
 
     widths = []
     max_lines = 1
-    for i, label in enumerate(labels):
+    for label in labels:
         line_count = label.count("\n") + 1
         if line_count > max_lines:
             max_lines = line_count
 
         widest = 0
         for line in label.split("\n"):
-            t = plt.text(i, 0, line)
-            bb = t.get_window_extent(renderer=r)
-            if bb.width > widest:
-                widest = bb.width
+            width, _, _ = renderer.get_text_width_height_descent(
+                line, prop, ismath=cbook.is_math_text(line))
+            if width > widest:
+                widest = width
         widths.append(widest)
 
-    plt.close(fig)
     return widths, max_lines
 
 
@@ -91,29 +98,93 @@ def auto_resize(node_labels, default_width=6.4, padding=1.3,
         (fig_width, max_lines_per_label)    when return_lines is True
 
     """
+    import matplotlib
+
     wrapped = wrap_labels(node_labels, width=wrap_width)
     widths, max_lines = _label_line_widths(wrapped)
-    n = max(1, len(widths))
-    widest = max(widths) if widths else 0
 
-    dpi = plt.rcParams['figure.dpi']
     # Labels are placed at integer x-positions 0..N-1, so neighboring label
     # centers are `fig_width / (N-1)` inches apart. That interval must be
     # wider than the widest label, otherwise neighbors overlap.
-    # `min_gap_px` keeps a small breathing space between long labels.
-    min_gap_px = 10
-    if n > 1:
-        slot_inches = (widest + min_gap_px) * (n - 1) / dpi
-    else:
-        slot_inches = widest / dpi
-    fit_inches = max(sum(widths) / dpi, slot_inches) * padding
-    fig_width = max(fit_inches, default_width)
+    fig_width = auto_figure_width(widths, default_width, padding,
+                                  dpi=matplotlib.rcParams['figure.dpi'])
 
     if return_lines:
         return fig_width, max_lines
     return fig_width
 
 
+def new_figure(figsize, pyplot=True, dpi=None):
+    """
+    Create the figure and single Axes a chart is drawn on.
+
+    Input:
+        figsize:  (width, height) in inches
+        pyplot:   when True, use ``plt.subplots`` so the figure is managed
+                  by pyplot (shown by ``plt.show``); when False, build a
+                  standalone ``Figure`` on an Agg canvas that pyplot never
+                  sees — safe for servers and threads, and freed as soon as
+                  the caller drops it
+        dpi:      dots per inch (default rcParams['figure.dpi'])
+    Output:
+        (fig, ax)
+
+    """
+    if pyplot:
+        import matplotlib.pyplot as plt
+        return plt.subplots(figsize=figsize, dpi=dpi)
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def axes_pixel_size(figsize, dpi=None):
+    """
+    Pixel (width, height) of the single Axes that `plt.subplots` creates on
+    a figure of `figsize` inches, using the default subplot margins.
+
+    Input:
+        figsize:  (width, height) in inches
+        dpi:      dots per inch (default rcParams['figure.dpi'])
+    Output:
+        (width_px, height_px)
+
+    """
+    import matplotlib
+
+    if dpi is None:
+        dpi = matplotlib.rcParams['figure.dpi']
+    rc = matplotlib.rcParams
+    x_frac = rc['figure.subplot.right'] - rc['figure.subplot.left']
+    y_frac = rc['figure.subplot.top'] - rc['figure.subplot.bottom']
+    return figsize[0] * dpi * x_frac, figsize[1] * dpi * y_frac
+
+
+def adaptive_steps(length_px, px_per_step=3.0, min_steps=2, max_steps=100):
+    """
+    Pick how many points to sample along a curve so that consecutive
+    samples sit roughly `px_per_step` pixels apart on screen. Tiny arcs get
+    only a handful of points while arcs spanning the figure are capped at
+    `max_steps`.
+
+    Input:
+        length_px:    on-screen curve length in pixels (scalar or array)
+        px_per_step:  target pixel distance between samples (default 3)
+        min_steps:    lower bound on the sample count (default 2)
+        max_steps:    upper bound on the sample count (default 100)
+    Output:
+        int sample count, or an int array matching `length_px`
+
+    """
+    steps = np.ceil(np.asarray(length_px, dtype=float) / px_per_step) + 1
+    steps = np.clip(steps, min_steps, max_steps).astype(int)
+    return steps if steps.ndim else int(steps)
+
+
 # Functions for proportional arc chart
 def draw_arc(left, right, ax, color="tab:blue"):
     """
@@ -129,6 +200,8 @@ def draw_arc(left, right, ax, color="tab:blue"):
         radius (float): half of |right - left|; useful for setting ylim
 
     """
+    import matplotlib.patches as mpatches
+
     midpoint = (left + right) / 2
     radius = np.abs(right - midpoint)
 
@@ -139,7 +212,27 @@ def draw_arc(left, right, ax, color="tab:blue"):
     return radius
 
 
-def shade_arc(pair1, pair2, ax, color="tab:blue"):
+def half_ellipse_length_px(left, right, x_scale, y_scale):
+    """
+    Approximate on-screen length of the half-ellipse drawn between `left`
+    and `right` by `draw_arc` / `shade_arc` (horizontal radius r, height 2r),
+    given the pixels per data unit along each axis.
+
+    Input:
+        left, right:       float x-coordinates of the arc's endpoints
+        x_scale, y_scale:  pixels per data unit on the x and y axes
+    Output:
+        approximate arc length in pixels (Ramanujan's perimeter estimate)
+
+    """
+    radius = np.abs(right - left) / 2
+    a = radius * x_scale
+    b = 2 * radius * y_scale
+    h = ((a - b) / (a + b)) ** 2 if a + b > 0 else 0
+    return np.pi * (a + b) * (1 + 3 * h / (10 + np.sqrt(4 - 3 * h))) / 2
+
+
+def shade_arc(pair1, pair2, ax, color="tab:blue", steps=100):
     """
     Shade the region between two half-ellipse arcs to produce a proportional
     ribbon. `pair1` defines the outer arc's left/right x-endpoints and `pair2`
@@ -151,23 +244,13 @@ def shade_arc(pair1, pair2, ax, color="tab:blue"):
         ax:     matplotlib Axes to draw on
         color:  fill color for the shaded ribbon (default "tab:blue",
                 rendered at alpha=0.5)
+        steps:  points sampled along each boundary (default 100); see
+                `adaptive_steps` for choosing this from on-screen size,
+                measured with `axes_pixel_size` at the dpi the figure will
+                be saved at
 
     """
-    # Find points on ellipse using parametric coordinates
-    midpoint1 = (pair1[0] + pair1[1]) / 2
-    radius1 = np.abs(pair1[0] - midpoint1)
-
-    theta1 = np.radians(np.linspace(0, 180, 100))
-    x1 = midpoint1 + radius1 * np.cos(theta1)
-    y1 = 2 * radius1 * np.sin(theta1)
-
-    midpoint2 = (pair2[0] + pair2[1]) / 2
-    radius2 = np.abs(pair2[0] - midpoint2)
-
-    theta2 = np.radians(np.linspace(0, 180, 100))
-    x2 = midpoint2 + radius2 * np.cos(theta2)
-    y2 = 2 * radius2 * np.sin(theta2)
+    points = proportional_ribbon_polygon(pair1, pair2, steps)
 
     # Fill the area between the arcs
-    ax.fill_between(np.concatenate([x1, x2[::-1]]), np.concatenate([y1, y2[::-1]]),
-                    color=color, alpha=0.5)
+    ax.fill_between(points[:, 0], points[:, 1], color=color, alpha=0.5)
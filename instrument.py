@@ -0,0 +1,452 @@
+"""
+Pipeline instrumentation
+-- records wall time, counters (crossing-count evaluations, moves tried /
+   accepted, graph sizes) and optionally peak memory and cProfile data for
+   each stage of a chart pipeline: ingest, ordering, split, layout,
+   label_measurement, render
+-- chart code marks stages with ``stage(name)`` and bumps counters with
+   ``count(name)``; both are no-ops unless a ``recording()`` is active, so
+   they cost almost nothing in normal use
+-- the active recording is held in a context variable, so concurrent
+   recordings in different threads or tasks don't mix
+-- ordering heuristics additionally report per-routine evaluation counts
+   and crossing improvements (``heuristic`` / ``progress``), and with
+   ``recording(trace=True)`` a convergence trace of crossings against
+   evaluations and time
+-- standard library only
+
+Example:
+
+    from instrument import recording
+
+    with recording(trace_memory=True) as stats:
+        proportion_arc_chart(nodes=nodes, arcs=arcs, pyplot=False)
+    print(stats.report())
+    stats.totals()["crossing_evaluations"]
+
+    with recording(trace=True) as stats:
+        compute_proportion_arc_layout(nodes=nodes, arcs=arcs)
+    stats.trace   # [{"routine", "evaluations", "seconds", "crossings"}, ...]
+
+"""
+
+import contextvars
+import functools
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+_ACTIVE = contextvars.ContextVar("arcproportion_stats", default=None)
+
+# Counters that represent one crossing-count evaluation each; they advance
+# the evaluation axis of the convergence trace
+EVALUATION_COUNTERS = ("crossing_evaluations", "node_crossing_evaluations")
+
+
+class StageRecord:
+
+    """
+    One finished (or running) pipeline stage.
+
+    Attributes:
+        name:         stage name
+        depth:        nesting level (0 for top-level stages)
+        seconds:      wall time, including nested stages
+        own_seconds:  wall time minus nested stages
+        counters:     dict of counter name -> count bumped in this stage
+                      (not including nested stages)
+        values:       dict of noted values (graph sizes, final crossings)
+        peak_memory:  peak traced bytes during the stage, or None when
+                      memory tracing is off
+        profile:      cProfile.Profile for the stage, or None when
+                      profiling is off (only top-level stages are profiled)
+
+    """
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.seconds = 0.0
+        self.nested_seconds = 0.0
+        self.counters = {}
+        self.values = {}
+        self.peak_memory = None
+        self.profile = None
+
+    @property
+    def own_seconds(self):
+        return self.seconds - self.nested_seconds
+
+    def to_dict(self):
+        return {"name": self.name, "depth": self.depth,
+                "seconds": self.seconds, "own_seconds": self.own_seconds,
+                "counters": dict(self.counters),
+                "values": dict(self.values), "peak_memory": self.peak_memory}
+
+
+class HeuristicRecord:
+
+    """
+    One call of an ordering heuristic.
+
+    Attributes:
+        name:              routine name
+        depth:             nesting level among heuristics (an LA run inside
+                           node_cluster_order has depth 1)
+        seconds:           wall time
+        counters:          evaluations and moves made during the call,
+                           including nested heuristics
+        start_crossings:   first crossing count the routine reported
+        best_crossings:    lowest crossing count it reported
+        improvements:      how many reports lowered the count
+
+    """
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.seconds = 0.0
+        self.counters = {}
+        self.start_crossings = None
+        self.best_crossings = None
+        self.improvements = 0
+
+    @property
+    def improvement(self):
+        if self.start_crossings is None:
+            return None
+        return self.start_crossings - self.best_crossings
+
+    def to_dict(self):
+        return {"name": self.name, "depth": self.depth,
+                "seconds": self.seconds, "counters": dict(self.counters),
+                "start_crossings": self.start_crossings,
+                "best_crossings": self.best_crossings,
+                "improvement": self.improvement,
+                "improvements": self.improvements}
+
+
+class PipelineStats:
+
+    """
+    Everything recorded during one ``recording()``: the stages in the order
+    they started, plus counters and values recorded outside any stage.
+
+    """
+
+    def __init__(self, profile=False, trace_memory=False, callback=None,
+                 trace=False):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.callback = callback
+        self.stages = []
+        self.counters = {}
+        self.values = {}
+        self.heuristics = []
+        self.trace = [] if trace else None
+        self.evaluations = 0
+        self._open = []
+        self._open_heuristics = []
+        self._start = time.perf_counter()
+
+    def _bump(self, name, n):
+        target = self._open[-1].counters if self._open else self.counters
+        target[name] = target.get(name, 0) + n
+        for record in self._open_heuristics:
+            record.counters[name] = record.counters.get(name, 0) + n
+        if name in EVALUATION_COUNTERS:
+            self.evaluations += n
+
+    def _trace_point(self, record, crossings):
+        self.trace.append({"routine": record.name,
+                           "evaluations": self.evaluations,
+                           "seconds": time.perf_counter() - self._start,
+                           "crossings": crossings})
+
+    def _progress(self, crossings, traced=True):
+        if not self._open_heuristics:
+            return
+        record = self._open_heuristics[-1]
+        if record.start_crossings is None:
+            record.start_crossings = record.best_crossings = crossings
+        elif crossings < record.best_crossings:
+            record.best_crossings = crossings
+            record.improvements += 1
+        else:
+            return
+        if traced and self.trace is not None:
+            self._trace_point(record, crossings)
+
+    @contextmanager
+    def heuristic(self, name):
+        record = HeuristicRecord(name, len(self._open_heuristics))
+        self.heuristics.append(record)
+        self._open_heuristics.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            self._open_heuristics.pop()
+            if record.best_crossings is not None:
+                # Close the curve at the routine's last evaluation, and let
+                # wrapper routines (per-cluster loops) see the result
+                if self.trace is not None:
+                    self._trace_point(record, record.best_crossings)
+                self._progress(record.best_crossings, traced=False)
+
+    def _set(self, name, value):
+        target = self._open[-1].values if self._open else self.values
+        target[name] = value
+
+    @contextmanager
+    def stage(self, name):
+        record = StageRecord(name, len(self._open))
+        self.stages.append(record)
+
+        if self.trace_memory:
+            # Fold the parent's peak so far into it before resetting, so
+            # every open stage still ends up with its true peak
+            if self._open:
+                parent = self._open[-1]
+                parent.peak_memory = max(parent.peak_memory or 0,
+                                         tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+        profiler = None
+        if self.profile and not self._open:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        self._open.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            self._open.pop()
+            if self._open:
+                self._open[-1].nested_seconds += record.seconds
+
+            if profiler is not None:
+                profiler.disable()
+                record.profile = profiler
+
+            if self.trace_memory:
+                record.peak_memory = max(record.peak_memory or 0,
+                                         tracemalloc.get_traced_memory()[1])
+                if self._open:
+                    parent = self._open[-1]
+                    parent.peak_memory = max(parent.peak_memory or 0,
+                                             record.peak_memory)
+
+            if self.callback is not None:
+                self.callback(record)
+
+    def by_stage(self):
+        """
+        Wall time per stage name, excluding nested stages, so the values
+        add up to the total. Stages can run more than once (e.g. ordering
+        before and after node splitting).
+
+        """
+        totals = {}
+        for record in self.stages:
+            totals[record.name] = (totals.get(record.name, 0.0)
+                                   + record.own_seconds)
+        return totals
+
+    def totals(self):
+        """
+        Every counter summed across all stages.
+
+        """
+        totals = dict(self.counters)
+        for record in self.stages:
+            for name, n in record.counters.items():
+                totals[name] = totals.get(name, 0) + n
+        return totals
+
+    def noted(self):
+        """
+        Every noted value; later notes of the same name win.
+
+        """
+        values = dict(self.values)
+        for record in self.stages:
+            values.update(record.values)
+        return values
+
+    def to_dict(self):
+        return {"stages": [record.to_dict() for record in self.stages],
+                "heuristics": [record.to_dict()
+                               for record in self.heuristics],
+                "totals": self.totals(), "values": self.noted(),
+                "trace": self.trace}
+
+    def report(self):
+        """
+        Human-readable table: one line per stage with its time, peak memory
+        and counters, indented by nesting depth.
+
+        """
+        lines = []
+        for record in self.stages:
+            name = "  " * record.depth + record.name
+            line = f"{name:<24} {record.seconds * 1000:10.1f} ms"
+            if record.peak_memory is not None:
+                line += f"  {record.peak_memory / 2**20:8.2f} MiB peak"
+            fields = {**record.counters, **record.values}
+            if fields:
+                line += "  " + ", ".join(f"{k}={v}" for k, v
+                                         in fields.items())
+            lines.append(line)
+        fields = {**self.counters, **self.values}
+        if fields:
+            lines.append(", ".join(f"{k}={v}" for k, v in fields.items()))
+        for record in self.heuristics:
+            name = "  " * record.depth + record.name
+            evaluations = sum(record.counters.get(k, 0)
+                              for k in EVALUATION_COUNTERS)
+            line = (f"{name:<36} {record.seconds * 1000:10.1f} ms  "
+                    f"evaluations={evaluations}")
+            if record.start_crossings is not None:
+                line += (f"  crossings {record.start_crossings} -> "
+                         f"{record.best_crossings}")
+            lines.append(line)
+        return "\n".join(lines)
+
+    def print_profiles(self, sort="cumulative", limit=15):
+        """
+        Print the cProfile statistics of every profiled stage.
+
+        """
+        import pstats
+
+        for record in self.stages:
+            if record.profile is not None:
+                print(f"--- {record.name} ---")
+                pstats.Stats(record.profile).sort_stats(sort) \
+                    .print_stats(limit)
+
+
+@contextmanager
+def recording(profile=False, trace_memory=False, callback=None, trace=False):
+    """
+    Record every instrumented stage and heuristic run inside the ``with``
+    block.
+
+    Inputs:
+        profile:       run each top-level stage under cProfile
+        trace_memory:  track peak memory per stage with tracemalloc
+                       (noticeably slows allocation-heavy code)
+        callback:      called with each StageRecord as its stage finishes
+        trace:         keep a convergence trace: one point per improvement
+                       reported by an ordering heuristic (plus its final
+                       value), with the evaluations and seconds elapsed
+                       since the recording started
+
+    Output:  the PipelineStats being filled in (yielded)
+
+    """
+    stats = PipelineStats(profile, trace_memory, callback, trace)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    token = _ACTIVE.set(stats)
+    try:
+        yield stats
+    finally:
+        _ACTIVE.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def active():
+    """
+    The PipelineStats of the innermost active recording, or None.
+
+    """
+    return _ACTIVE.get()
+
+
+@contextmanager
+def stage(name):
+    """
+    Mark a pipeline stage. Does nothing unless a recording is active.
+
+    """
+    stats = _ACTIVE.get()
+    if stats is None:
+        yield None
+        return
+    with stats.stage(name) as record:
+        yield record
+
+
+def staged(name):
+    """
+    Decorator form of ``stage``: run every call of the function as stage
+    `name`.
+
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _ACTIVE.get() is None:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def heuristic(name):
+    """
+    Mark one call of an ordering heuristic; usable as a decorator. Counters
+    bumped inside are also attributed to it, and ``progress`` reports go to
+    the innermost open heuristic. Does nothing unless recording.
+
+    """
+    stats = _ACTIVE.get()
+    if stats is None:
+        yield None
+        return
+    with stats.heuristic(name) as record:
+        yield record
+
+
+def progress(crossings):
+    """
+    Report the crossing count a heuristic currently holds (its starting
+    value, then after each accepted move), if recording.
+
+    """
+    stats = _ACTIVE.get()
+    if stats is not None:
+        stats._progress(crossings)
+
+
+def count(name, n=1):
+    """
+    Add `n` to counter `name` in the current stage, if recording.
+
+    """
+    stats = _ACTIVE.get()
+    if stats is not None:
+        stats._bump(name, n)
+
+
+def note(name, value):
+    """
+    Set counter `name` to `value` in the current stage, if recording
+    (graph sizes, chosen methods, final crossing counts).
+
+    """
+    stats = _ACTIVE.get()
+    if stats is not None:
+        stats._set(name, value)
@@ -0,0 +1,126 @@
+"""
+Chart layouts
+-- a Layout holds everything a renderer needs to draw a chart, as plain
+   lists of numbers, strings and colors (no matplotlib objects)
+-- layouts are produced by the ``compute_*_layout`` functions in each chart
+   module and can be cached, serialized to JSON and rendered later by any
+   backend (matplotlib axes, svg_backend)
+
+Fields shared by every chart type:
+    chart:    "basic_arc", "proportion_arc" or "chord"
+    figsize:  (width, height) in inches
+    title:    chart title
+    xlim:     (min, max) data x-range
+    ylim:     (min, max) data y-range
+    nodes:    node labels in display order
+
+"basic_arc" (basic and grouped arc charts):
+    labels:        wrapped x-tick labels
+    x_positions:   node x-coordinates
+    label_colors:  x-tick label color per node
+    arcs:          (left_x, right_x) per arc
+    arc_colors:    outline color per arc
+    arc_widths:    line width per arc
+
+"proportion_arc":
+    labels:         wrapped x-tick labels
+    x_positions:    node rectangle centers
+    widths:         node rectangle widths
+    node_colors:    node rectangle colors
+    ribbon_outer:   (left_x, right_x) of each ribbon's outer boundary arc
+    ribbon_inner:   (left_x, right_x) of each ribbon's inner boundary arc
+    ribbon_colors:  color per ribbon
+
+"chord":
+    node_start, node_end:    angular extent (radians) of each node's arc
+    node_colors:             ring segment color per node
+    label_colors:            label color per node
+    ribbon_src, ribbon_dst:  (theta_start, theta_end) of each ribbon's ends
+    ribbon_colors:           color per ribbon
+
+"""
+
+import json
+
+
+class Layout(dict):
+
+    """
+    Computed chart layout. A plain dict of the fields listed in the module
+    docstring, with attribute access (``layout.x_positions``) and JSON
+    round-tripping.
+
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def to_json(self):
+        """
+        Serialize the layout to a JSON string. Tuples come back as lists.
+
+        """
+        def convert(value):
+            # NumPy scalars and arrays both provide tolist()
+            if hasattr(value, "tolist"):
+                return value.tolist()
+            raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+        return json.dumps(self, default=convert)
+
+    @classmethod
+    def from_json(cls, text):
+        """
+        Rebuild a layout from ``to_json`` output.
+
+        """
+        return cls(json.loads(text))
+
+    def save(self, file_name):
+        """
+        Write the layout to ``file_name`` as JSON.
+
+        """
+        with open(file_name, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Read a layout previously written with ``save``.
+
+        """
+        with open(file_name, encoding="utf-8") as f:
+            return cls.from_json(f.read())
+
+
+def render_layout(layout, ax, tessellation="fixed", dpi=None):
+    """
+    Draw any chart layout onto a matplotlib Axes using the renderer for its
+    chart type.
+
+    Inputs:
+        layout:        Layout (or equivalent dict)
+        ax:            matplotlib Axes to draw on
+        tessellation:  "fixed" or "adaptive" ribbon sampling (ignored by
+                       basic arc charts, whose arcs matplotlib samples itself)
+        dpi:           resolution "adaptive" samples for, i.e. the dpi the
+                       figure will be saved at (default the figure's dpi)
+
+    """
+    chart = layout["chart"]
+    if chart == "basic_arc":
+        from basic_arc import render_basic_arc_layout
+        render_basic_arc_layout(layout, ax)
+    elif chart == "proportion_arc":
+        from proportion_arc import render_proportion_arc_layout
+        render_proportion_arc_layout(layout, ax, tessellation=tessellation,
+                                     dpi=dpi)
+    elif chart == "chord":
+        from chord_chart import render_chord_layout
+        render_chord_layout(layout, ax, tessellation=tessellation, dpi=dpi)
+    else:
+        raise ValueError(f"Unknown chart type {chart!r}.")
@@ -0,0 +1,160 @@
+"""
+Proportional chart sizing
+-- closed-form gap and figure-width solver for proportional arc charts
+-- works from label widths and node widths only; no matplotlib import, so
+   sizing for many charts can be precomputed headlessly
+-- label widths can come from real text measurement (helper module) or from
+   the built-in DejaVu Sans advance-width estimate below
+
+Geometry being solved: node i has width w_i (data units) and centers are
+placed (w_i + w_{i+1}) / 2 + gap apart. The x-limits pad the span by `gap`
+on both sides, so the axes covers
+
+    span = sum(w) + (n + 1) * gap
+
+data units over `ax_frac * fig_width` inches. Adjacent labels i, i+1 fit
+when their center distance in inches is at least `padding` times their
+half-summed label widths L_i:
+
+    ((w_i + w_{i+1}) / 2 + gap) * E / span  >=  padding * L_i
+
+where E = ax_frac * fig_width. Each pair is linear in `gap`, so the
+smallest feasible gap is a max over per-pair bounds.
+
+"""
+
+import math
+
+
+# Advance widths of DejaVu Sans (matplotlib's default font) for printable
+# ASCII 32..126, in 1/1000 em.
+_DEJAVU_ADVANCES = (
+    318, 401, 460, 838, 636, 950, 780, 275, 390, 390, 500, 838, 318, 361,
+    318, 337, 636, 636, 636, 636, 636, 636, 636, 636, 636, 636, 337, 337,
+    838, 838, 838, 531, 1000, 684, 686, 698, 770, 632, 575, 775, 752, 295,
+    295, 656, 557, 863, 748, 787, 603, 787, 695, 635, 611, 732, 684, 989,
+    685, 611, 685, 390, 337, 390, 838, 500, 500, 613, 635, 550, 635, 615,
+    352, 635, 634, 278, 278, 579, 278, 974, 634, 612, 635, 635, 411, 521,
+    392, 634, 592, 818, 592, 592, 525, 636, 337, 636, 838,
+)
+_DEFAULT_ADVANCE = 636   # other Latin/Greek/Cyrillic characters
+_WIDE_ADVANCE = 1000     # CJK and other full-width characters
+
+# Fraction of the figure width covered by the axes with matplotlib's default
+# subplot margins (left 0.125, right 0.9), rounded down for tick overhang.
+AX_FRAC = 0.78
+
+# Relative slack the axes width must keep over the widest pair's threshold
+# in solve_gap. The per-pair gap bound divides by E - p * L_i * (n + 1); at
+# an exact power of `grow` the floating-point log and floor can leave E a
+# few ulps from the threshold, and the bound blows up.
+_GAP_EPS = 1e-9
+
+
+def _char_advance(ch):
+    code = ord(ch)
+    if 32 <= code <= 126:
+        return _DEJAVU_ADVANCES[code - 32]
+    if code >= 0x2E80:
+        return _WIDE_ADVANCE
+    return _DEFAULT_ADVANCE
+
+
+def estimate_label_widths(labels, font_size=10, dpi=100):
+    """
+    Estimate the rendered pixel width of each label without matplotlib.
+    Same contract as helper._label_line_widths: multi-line labels are
+    measured by their widest line.
+
+    Input:
+        labels:     list of (possibly multi-line) label strings
+        font_size:  font size in points (matplotlib default 10)
+        dpi:        figure dpi (matplotlib default 100)
+    Output:
+        widths:     list[float] — widest-line pixel width per label
+        max_lines:  int — highest line count across all labels
+
+    """
+    px_per_unit = font_size * dpi / 72 / 1000
+
+    widths = []
+    max_lines = 1
+    for label in labels:
+        lines = str(label).split("\n")
+        max_lines = max(max_lines, len(lines))
+        widths.append(max(sum(_char_advance(ch) for ch in line)
+                          for line in lines) * px_per_unit)
+    return widths, max_lines
+
+
+def auto_figure_width(label_widths_px, default_width=6.4, padding=1.3,
+                      dpi=100, min_gap_px=10):
+    """
+    Figure width (inches) that fits every label side by side, as used by
+    helper.auto_resize: the larger of the summed label widths and N - 1
+    slots as wide as the widest label, times `padding`, and never below
+    `default_width`.
+
+    """
+    n = max(1, len(label_widths_px))
+    widest = max(label_widths_px) if label_widths_px else 0
+
+    if n > 1:
+        slot_inches = (widest + min_gap_px) * (n - 1) / dpi
+    else:
+        slot_inches = widest / dpi
+    fit_inches = max(sum(label_widths_px) / dpi, slot_inches) * padding
+    return max(fit_inches, default_width)
+
+
+def solve_gap(widths, label_widths_px, fig_width, gap=0.15, padding=1.05,
+              dpi=100, ax_frac=AX_FRAC, grow=1.5):
+    """
+    Smallest gap (>= the requested `gap`) and figure width at which every
+    adjacent pair of labels fits, in one pass.
+
+    For each adjacent pair the fit condition (see module docstring) gives
+
+        gap * (E - p * L_i * (n + 1))  >=  p * L_i * S - h_i * E
+
+    with h_i the half-summed node widths, S = sum(widths), p = padding.
+    A pair with E <= p * L_i * (n + 1) cannot fit at any gap, so the figure
+    is first widened by the smallest power of `grow` that clears the
+    widest pair, by more than a relative _GAP_EPS; the gap is then the max
+    of the per-pair lower bounds.
+
+    Inputs:
+        widths:           node widths in data units, in display order
+        label_widths_px:  rendered label width per node in pixels
+        fig_width:        starting figure width in inches
+        gap:              requested minimum gap in data units
+        padding:          multiplicative breathing room on label widths
+        dpi:              dpi the label widths were measured at
+        ax_frac:          fraction of the figure width covered by the axes
+        grow:             figure widening factor when no gap fits
+    Output:
+        (gap, fig_width)
+
+    """
+    n = len(widths)
+    if n < 2 or not label_widths_px:
+        return gap, fig_width
+
+    sum_w = sum(widths)
+    pairs = [((widths[i] + widths[i + 1]) / 2,
+              padding * (label_widths_px[i] + label_widths_px[i + 1]) / 2 / dpi)
+             for i in range(n - 1)]
+
+    threshold = max(need_in for _, need_in in pairs) * (n + 1) * (1 + _GAP_EPS)
+    if fig_width * ax_frac <= threshold:
+        steps = math.floor(math.log(threshold / (fig_width * ax_frac), grow)) + 1
+        fig_width *= grow ** steps
+        # the log can round down by one step
+        while fig_width * ax_frac <= threshold:
+            fig_width *= grow
+    eff_inches = fig_width * ax_frac
+
+    for half_w, need_in in pairs:
+        gap = max(gap, (need_in * sum_w - half_w * eff_inches)
+                  / (eff_inches - need_in * (n + 1)))
+    return gap, fig_width
@@ -12,24 +12,41 @@ Author:  Nathan Cordner
 
 """
 
-import pandas as pd
-import matplotlib.pyplot as plt
-from helper import auto_resize, draw_arc, shade_arc, wrap_labels
+from __future__ import annotations
+
+from helper import (adaptive_steps, axes_pixel_size, draw_arc,
+                    half_ellipse_length_px, new_figure, shade_arc,
+                    wrap_labels)
+from layout_solver import auto_figure_width, solve_gap
 
 from count_crossing import count_graph_crossings, local_adjusting, cluster_local_adjusting
-from arc_crossing import minimize_crossings
+from count_crossing.fast import count_graph_crossings_sparse
+from count_crossing.multilevel import multilevel_order
+from count_crossing.schedule import adjusting_inside_cluster, refine_clusters
+from crossing_cost import choose_crossing_method
+from instrument import active, count, heuristic, note, progress, stage, staged
+from layout import Layout
+from arc_crossing import minimize_crossings, spectral_order
+
 
-# test code
-from basic_arc import basic_arc_plot
-import time
+def _arc_color(arc, default="lightgray"):
+    """
+    Color of an input arc, or `default` if it has none. Empty DataFrame
+    cells arrive as NaN, the one value that isn't equal to itself.
+
+    """
+    if len(arc) >= 4 and arc[3] is not None and arc[3] == arc[3]:
+        return arc[3]
+    return default
 
 
 def convert_to_basic_arc(nodes, arcs, title = ""):
     """
-    Split each node into one copy per incident arc so the proportional chart
-    can treat each (split) endpoint as a distinct basic-arc node. The i-th
-    occurrence of a node ``X`` becomes the label ``X<i>``, and every input
-    arc becomes one arc between the corresponding split-labels.
+    Split each node into one port per incident arc so the proportional chart
+    can treat each endpoint as a distinct basic-arc node. Ports are integer
+    IDs: arc ``k`` runs from port ``2k`` to port ``2k + 1``, and two
+    parallel lists map every port back to its node and its arc. Node labels
+    are only used as dict keys, so they may be of any hashable type.
 
     Inputs:
         nodes:  list of node labels in desired display order
@@ -37,60 +54,37 @@ def convert_to_basic_arc(nodes, arcs, title = ""):
         title:  unused; preserved for backwards compatibility
 
     Output:
-        tmp_new_nodes:  list of split node labels, reordered so each run of
-                        labels coming from the same original node appears
-                        together, in the order ``nodes`` was given
-        new_arcs:       list of ``(split_source, split_dest, value)`` tuples
-                        whose endpoints are labels in ``tmp_new_nodes``
-        new_node_map:   dict mapping each split label back to its original
-                        node label
+        ports:      list of port IDs, grouped so the ports of each node
+                    appear together, in the order ``nodes`` was given;
+                    within a group, ports keep the order of their arcs
+        new_arcs:   list of ``(source_port, dest_port, value, color)``
+                    tuples, one per input arc and in the same order
+        port_node:  list mapping each port ID to its original node label
+        port_arc:   list mapping each port ID to its index in ``new_arcs``
 
     """
 
-    node_count = {x : 1 for x in nodes}
-    
-    # Create new nodes and edges
-    new_nodes = []
+    port_node = []
+    port_arc = []
     new_arcs = []
-    
-    clean_arcs = []
-    
-    # Map new nodes back to old groups
-    new_node_map = {}
-    
-    
-    for a in arcs:
-        node1 = a[0] + str(node_count[a[0]])
-        new_node_map[node1] = a[0]
-        node_count[a[0]] += 1       
-        
-        node2 = a[1] + str(node_count[a[1]])        
-        new_node_map[node2] = a[1]
-        node_count[a[1]] += 1 
 
-        # TODO:  maintain weights with arcs, or create separate set        
-        
-        new_nodes += [node1, node2]
+    for k, a in enumerate(arcs):
+        source = len(port_node)
+        port_node += [a[0], a[1]]
+        port_arc += [k, k]
+        new_arcs.append((source, source + 1, a[2], _arc_color(a)))
 
-        if len(a) >= 4 and pd.notna(a[3]):
-            new_arcs += [(node1, node2, a[2], a[3])]
-        else:
-            new_arcs += [(node1, node2, a[2], "lightgray")]
+    # order ports by the node list given in nodes: one stable bucket pass,
+    # linear in the number of arcs
+    buckets = {n: [] for n in nodes}
+    for port, n in enumerate(port_node):
+        buckets[n].append(port)
 
-        clean_arcs += [(node1, node2)]
-        
-        
-    new_nodes.sort() 
-                
-    # now reorder new_nodes based on list given in nodes
-    
-    tmp_new_nodes = []
+    ports = []
     for n in nodes:
-        for x in new_nodes:
-            if new_node_map[x] == n:
-                tmp_new_nodes.append(x)
-    
-    return tmp_new_nodes, new_arcs, new_node_map
+        ports += buckets[n]
+
+    return ports, new_arcs, port_node, port_arc
     
         
 def local_search_inside_clusters(start_index, cur_crossings, nodes, clean_arcs, node_map):
@@ -103,9 +97,10 @@ def local_search_inside_clusters(start_index, cur_crossings, nodes, clean_arcs,
     Inputs:
         start_index:    index into ``nodes`` where this cluster starts
         cur_crossings:  crossing count for the current ordering of ``nodes``
-        nodes:          list of split node labels (reordered in place)
-        clean_arcs:     list of (source, dest) tuples over split labels
-        node_map:       dict mapping split label back to original node
+        nodes:          list of ports (reordered in place)
+        clean_arcs:     list of (source, dest) tuples over ports
+        node_map:       port -> original node (a list indexed by port ID,
+                        or a dict)
 
     Output:
         (end_index, cur_crossings)
@@ -129,29 +124,94 @@ def local_search_inside_clusters(start_index, cur_crossings, nodes, clean_arcs,
                 # Try swapping
                 nodes[i], nodes[j] = nodes[j], nodes[i]
                 new_crossings = count_graph_crossings(nodes, clean_arcs)
+                count("moves_tried")
                 if new_crossings < cur_crossings:
                     cur_crossings = new_crossings
+                    count("moves_accepted")
+                    progress(cur_crossings)
                 else:
                     # Swap back
                     nodes[i], nodes[j] = nodes[j], nodes[i]
     return end_index, cur_crossings
 
 
-def grouped_node_order(node_groups, nodes, arcs, node_map, method):
+def sort_ports(node_groups, nodes, arcs, node_map):
+    """
+    Order the ports of every group by where their arc goes,
+    in O(m log m) and without counting crossings. With the group order
+    fixed, this is the crossing-minimal port order:
+
+    -- ports whose far end lies in a group to the left come first, nearest
+       group first, so their ribbons nest instead of crossing
+    -- then the two ports of each self-loop, side by side, so the loop
+       encloses no other port
+    -- then ports going right, farthest group first
+    -- ties (several arcs between the same two groups) follow arc order on
+       the left group and the reverse on the right one, so those ribbons
+       nest too
+
+    What the key order guarantees: two ribbons that share an end node nest
+    or sit side by side whatever their far ends are, and a self-loop
+    encloses no port, so neither ever crosses. A crossing that remains is
+    between arcs a-c and b-d on four different nodes a < b < c < d, and
+    those cross in every port order, so no local refinement is needed
+    afterwards. On graphs without parallel arcs the port count therefore
+    equals the reference count of the node order (checked by
+    benchmarks/checks.py).
+
+    Inputs:
+        node_groups:  original node labels in display order
+        nodes:        list of port IDs (reordered in place)
+        arcs:         list of (source_port, dest_port, ...) tuples
+        node_map:     list mapping each port ID to its original node
+
+    """
+    position = {g: i for i, g in enumerate(node_groups)}
+    keys = [None] * len(node_map)
+    for k, a in enumerate(arcs):
+        for end, (near, far) in enumerate(((a[0], a[1]), (a[1], a[0]))):
+            here = position[node_map[near]]
+            there = position[node_map[far]]
+            if there < here:
+                keys[near] = (here, 0, -there, -k)
+            elif there == here:
+                keys[near] = (here, 1, k, end)
+            else:
+                keys[near] = (here, 2, -there, k)
+    nodes.sort(key=keys.__getitem__)
+
+
+@heuristic("grouped_node_order")
+def grouped_node_order(node_groups, nodes, arcs, node_map, method, workers=1):
     """
         node_groups:  labels of node clusters
-        nodes:  cluster_label followed by integer
-        arcs:  shows edges and weights between individual nodes
-        node_map:  maps node labels back to node cluster labels
+        nodes:  port IDs (see convert_to_basic_arc)
+        arcs:  shows edges and weights between ports
+        node_map:  maps port IDs back to node cluster labels
+        method:  "sort" or "multilevel" (sort_ports), "LS" (local search)
+                 or "LA" (local adjusting) inside each cluster; anything
+                 else keeps the order of ``nodes``
+        workers:  LS / LA only. 1 walks the clusters once, in order; any
+                  other value refines clusters that share no arc in
+                  parallel (count_crossing.schedule, None for one worker
+                  per CPU), with the same result
     """
     
     clean_arcs = [(a[0], a[1]) for a in arcs]
     
-    if method == "LS":
+    if method in ("sort", "multilevel"):
+        sort_ports(node_groups, nodes, arcs, node_map)
+
+    elif method in ("LS", "LA") and workers != 1:
+        refine = (local_search_inside_clusters if method == "LS"
+                  else adjusting_inside_cluster)
+        refine_clusters(nodes, clean_arcs, node_map, refine, workers)
+
+    elif method == "LS":
         
         # LOCAL SEARCH METHOD
         cur_crossings = count_graph_crossings(nodes, clean_arcs)
-        # print(cur_crossings)
+        progress(cur_crossings)
         
         # just swap order inside clusters
         start_index = 0
@@ -171,37 +231,59 @@ def grouped_node_order(node_groups, nodes, arcs, node_map, method):
             while end_index < len(nodes) and node_map[nodes[end_index]] == cur_group:
                 end_index += 1
             
-            nodes = cluster_local_adjusting(start_index, end_index - 1, nodes = nodes, arcs = clean_arcs)
+            nodes[:] = cluster_local_adjusting(start_index, end_index - 1, nodes = nodes, arcs = clean_arcs)
             cluster_sizes.append(end_index - start_index)
             
             start_index = end_index
-        print("num clusters:", len(cluster_sizes))
-        print("cluster sizes", sorted(cluster_sizes, reverse = True))        
+        note("clusters", len(cluster_sizes))
+        note("cluster_sizes", sorted(cluster_sizes, reverse = True))
 
     return clean_arcs
     
-def node_cluster_order(nodes, arcs):
+@heuristic("node_cluster_order")
+def node_cluster_order(nodes, arcs, method="LA"):
     """
-        Compute best of AVSDF, Local Adjusting 
+        Compute best of AVSDF, spectral, Local Adjusting 
         
         Edit node order accordingly    
+
+        method:  "sort" swaps Local Adjusting (O(n^2) reference counts) for
+                 the multilevel engine and counts with the O(m log n)
+                 sweep, so the default stays cheap on large graphs
     
     """
 
     clean_arcs = [(a[0], a[1]) for a in arcs]        
-    before_crossings = count_graph_crossings(nodes, clean_arcs)
+    if method == "sort":
+        crossings = count_graph_crossings_sparse
+    else:
+        crossings = count_graph_crossings
+    before_crossings = crossings(nodes, clean_arcs)
+    progress(before_crossings)
         
     # AVSDF
     avsdf_order = minimize_crossings(nodes, clean_arcs)
-    avsdf_crossings = count_graph_crossings(avsdf_order, clean_arcs)
+    avsdf_crossings = crossings(avsdf_order, clean_arcs)
+    progress(avsdf_crossings)
+
+    # Spectral, weighted by the arc values
+    spectral = spectral_order(nodes, clean_arcs,
+                              weights=[a[2] for a in arcs])
+    spectral_crossings = crossings(spectral, clean_arcs)
+    progress(spectral_crossings)
            
-    # Local Adjusting    
-    local_order = local_adjusting(nodes, clean_arcs)
-    local_crossings = count_graph_crossings(local_order, clean_arcs)
+    # Local Adjusting, or multilevel for "sort"
+    if method == "sort":
+        local_order = multilevel_order(nodes, arcs)
+    else:
+        local_order = local_adjusting(nodes, clean_arcs)
+    local_crossings = crossings(local_order, clean_arcs)
+    progress(local_crossings)
         
     # Find best
     candidates = [(before_crossings, nodes),
                   (avsdf_crossings, avsdf_order),
+                  (spectral_crossings, spectral),
                   (local_crossings, local_order)]
     
     # print(before_crossings, avsdf_crossings, local_crossings)
@@ -223,61 +305,69 @@ def _arcs_and_nodes_from_df(df:pd.DataFrame, source_col="source", dest_col="dest
         nodes = list(nodes)
         return arcs, nodes
 
-def proportion_arc_chart( df:pd.DataFrame=None, source_col="source", dest_col="dest", color_col="color", value_col="value", nodes=[], arcs=[], crossing_method = "LS", figsize = "auto", title: str = "", x_label_padding: float = 1.05, group_dict=None, color_dict=None, gap: float = 0.15):
+@staged("layout")
+def compute_proportion_arc_layout(df:pd.DataFrame=None, source_col="source", dest_col="dest", color_col="color", value_col="value", nodes=[], arcs=[], crossing_method = "sort", figsize = "auto", title: str = "", x_label_padding: float = 1.05, group_dict=None, color_dict=None, gap: float = 0.15, workers=1):
     """
-    Inputs:
-    -- nodes:  input nodes (previously split)
-    -- arcs  list of tuples to specify arcs (undirected)
-      -- Index 0:  label of node 1
-      -- Index 1:  label of node 2
-      -- Index 2:  arc value (total or percentage)
-      -- Index 3:  arc color (optional, default lightgray)
-    -- crossing_method:  LS for local search, LA for local adjusting, None for neither
-    -- gap:  spacing (in the same units as rectangle widths, i.e. fractions
-             of `total`) inserted between neighboring node rectangles. With
-             variable widths this controls how tightly nodes sit next to one
-             another; smaller values minimize whitespace.
+    Compute everything needed to draw a proportional arc chart, as plain
+    lists: node order, width-aware x-positions and widths, both boundary
+    arcs of every ribbon, colors and figure size. Inputs are the same as
+    ``proportion_arc_chart``.
 
-    Output: proportional arc chart showing flow from sources to destinations
+    Output:  ``Layout`` with chart type "proportion_arc" (see layout.py)
+
+    Inside an ``instrument.recording()`` the ingest, ordering, split and
+    label_measurement stages are recorded, along with the split graph size
+    and the final crossing count.
 
     """
 
-    if not df is None:
-        arcs, nodes = _arcs_and_nodes_from_df(df, source_col, dest_col, color_col, value_col)
+    with stage("ingest"):
+        if not df is None:
+            arcs, nodes = _arcs_and_nodes_from_df(df, source_col, dest_col, color_col, value_col)
 
-    start = time.time()
-    
-    # Find total resource flow
-    loc_totals = {x: 0 for x in nodes}
-    for a in arcs:
-        loc_totals[a[0]] += a[2]
-        loc_totals[a[1]] += a[2]   
-    total = max(loc_totals.values())
+        # Find total resource flow
+        loc_totals = {x: 0 for x in nodes}
+        for a in arcs:
+            loc_totals[a[0]] += a[2]
+            loc_totals[a[1]] += a[2]   
+        total = max(loc_totals.values())
+
+    if crossing_method == "auto":
+        crossing_method, workers = choose_crossing_method(
+            "proportion_arc", nodes, arcs, workers=workers)
     
     # compute clustered node order
-    if crossing_method:
-        nodes = node_cluster_order(nodes, arcs)
-    
-    # Split nodes by arcs
-    new_nodes, new_arcs, new_node_map = convert_to_basic_arc(nodes, arcs)
-    print(f"Transformed graph. {len(new_nodes)} nodes and {len(new_arcs)} edges")
-
-    # Redo node order
-    clean_arcs = grouped_node_order(nodes, new_nodes, new_arcs, new_node_map, crossing_method)
-
-    stop = time.time()
-    print("Proportion Arc Crossing Reduction Time:", stop - start)
-    # print(new_nodes)
-    # print(clean_arcs)
-    print("Final number of crossings:", count_graph_crossings(new_nodes, clean_arcs))
+    if crossing_method == "multilevel":
+        with stage("ordering"):
+            nodes = multilevel_order(nodes, arcs)
+    elif crossing_method:
+        with stage("ordering"):
+            nodes = node_cluster_order(nodes, arcs, crossing_method)
+    
+    # Split nodes into one port per arc end
+    with stage("split"):
+        ports, new_arcs, port_node, port_arc = convert_to_basic_arc(nodes, arcs)
+        note("split_nodes", len(ports))
+        note("split_arcs", len(new_arcs))
+
+    # Redo port order
+    with stage("ordering"):
+        clean_arcs = grouped_node_order(nodes, ports, new_arcs, port_node, crossing_method, workers)
+
+    # Only pay for the final count when recording; the split graph has two
+    # ports per arc, far past what the O(n^4) reference can count, so use
+    # the sweep (in a process pool for very large graphs)
+    if active() is not None:
+        note("final_crossings",
+             count_graph_crossings(ports, clean_arcs, backend="parallel"))
 
     
     # Node groups shall be preserved 
-    cur_node = new_node_map[new_nodes[0]]
+    cur_node = port_node[ports[0]]
     temp_nodes = [cur_node]
-    for n in new_nodes:
-        if new_node_map[n] != cur_node:
-            cur_node = new_node_map[n]
+    for p in ports:
+        if port_node[p] != cur_node:
+            cur_node = port_node[p]
             temp_nodes += [cur_node]
             
     # print(temp_nodes)
@@ -296,52 +386,29 @@ def proportion_arc_chart( df:pd.DataFrame=None, source_col="source", dest_col="d
 
     wrapped_nodes = wrap_labels(nodes)
 
+    # Measure labels once; both the auto figure width and the gap solver
+    # work from these widths
+    import matplotlib
+    from helper import _label_line_widths
+    label_widths_px, max_lines = _label_line_widths(wrapped_nodes)
+    dpi = matplotlib.rcParams['figure.dpi']
+
     if figsize == "auto":
-        figwidth, max_lines = auto_resize(nodes, 12, x_label_padding,
-                                          return_lines=True)
-        fig_height = figwidth / 3 + 0.25 * max(0, max_lines - 1)
+        figwidth = auto_figure_width(label_widths_px, 12, x_label_padding,
+                                     dpi=dpi)
     else:
         figwidth = figsize[0]
-        fig_height = figsize[1]
 
-    # Auto-grow `gap` (in data units) so every adjacent label pair has
-    # enough inches between x-positions to render without overlap. Use the
-    # widest adjacent *pair* (half-sum of neighbor label widths) — with a
-    # single-widest proxy, two equally-wide neighbors only get ~5% breathing
-    # room and visually touch. The relationship is self-referential (data
-    # span depends on `gap`), so iterate until it converges.
-    from helper import _label_line_widths
-    label_widths_px, _ = _label_line_widths(wrapped_nodes)
-    dpi = plt.rcParams['figure.dpi']
-    sum_w = sum(widths)
-    n = len(nodes)
-    half_pair_mins = [(widths[i] + widths[i + 1]) / 2 for i in range(n - 1)]
-    min_half_pair = min(half_pair_mins) if half_pair_mins else 0
-    if n > 1 and label_widths_px:
-        widest_pair_px = max((label_widths_px[i] + label_widths_px[i + 1]) / 2
-                             for i in range(n - 1))
+    # Grow `gap` (in data units), or the figure if no gap suffices, so every
+    # adjacent label pair has enough inches between x-positions to render
+    # without overlap
+    gap, figwidth = solve_gap(widths, label_widths_px, figwidth, gap,
+                              x_label_padding, dpi=dpi)
+
+    if figsize == "auto":
+        fig_height = figwidth / 3 + 0.25 * max(0, max_lines - 1)
     else:
-        widest_pair_px = max(label_widths_px) if label_widths_px else 0
-    widest_in = widest_pair_px / dpi
-    # Effective plotting inches: the axes occupies ~78% of fig_width after
-    # matplotlib's default margins, so use that for label-fit calculations.
-    # The x-limits also pad data_span by `gap` on each side (set below).
-    AX_FRAC = 0.78
-    if n > 1 and widest_in > 0:
-        for _ in range(8):
-            data_span = sum_w + (n + 1) * gap
-            eff_inches = figwidth * AX_FRAC
-            widest_data = widest_in * x_label_padding * data_span / eff_inches
-            needed_gap = widest_data - min_half_pair
-            if needed_gap <= gap:
-                break
-            denom = eff_inches - widest_in * x_label_padding * (n + 1)
-            if denom <= 0:
-                figwidth *= 1.5
-                fig_height = figwidth / 3 + 0.25 * max(0, max_lines - 1)
-                continue
-            gap = (widest_in * x_label_padding * sum_w - min_half_pair * eff_inches) / denom
-            gap = max(gap, 0)
+        fig_height = figsize[1]
 
     # Width-aware x-positions: each node's center sits one (half-width +
     # gap + half-width) step from the previous center, so narrow nodes no
@@ -353,8 +420,6 @@ def proportion_arc_chart( df:pd.DataFrame=None, source_col="source", dest_col="d
         )
     node_center = dict(zip(nodes, x_positions))
 
-    fig, ax = plt.subplots(figsize=(figwidth, fig_height))
-    
     # node_color
     bar_colors = []
 
@@ -369,99 +434,189 @@ def proportion_arc_chart( df:pd.DataFrame=None, source_col="source", dest_col="d
 
         bar_colors.append(cur_color)
         
-    # Rectangles beneath each node label at their width-aware positions
-    ax.bar(x_positions, [-2] * len(nodes), width=widths, color=bar_colors)
-    ax.set_xticks(x_positions)
-    ax.set_xticklabels(wrapped_nodes)
-    
     # Calculate arc boundaries
-    # Define L and R boundaries for each of the new nodes, anchored to the
-    # width-aware x-position of the original (pre-split) node.
-    node_boundary_dict = {}
-    cur_group = new_node_map[new_nodes[0]]
-    cur_left = node_center[cur_group] - widths[0] / 2
-
-    for n in new_nodes:
-        cur_arc = None
-        # Find arc involving n
-        for arc in new_arcs:
-            if n == arc[0] or n == arc[1]:
-                cur_arc = arc
-                break
-        if cur_arc is None:
-            continue  # go to next node
-
-        if cur_group != new_node_map[n]:
-            cur_group = new_node_map[n]
-            idx = nodes.index(cur_group)
-            cur_left = node_center[cur_group] - widths[idx] / 2
-
-        left = cur_left
-        right = cur_left + (cur_arc[2] / total)
-
-        # save
-        node_boundary_dict[n] = [left, right]
-
-        # update
-        cur_left = right
-        
-    # print(node_boundary_dict)
+    # Define L and R boundaries for each port, anchored to the width-aware
+    # x-position of the original (pre-split) node. Ports are integers, so
+    # the boundaries and positions live in lists indexed by port ID.
+    node_width = dict(zip(nodes, widths))
+
+    port_left = [0.0] * len(port_node)
+    port_right = [0.0] * len(port_node)
+    cur_group = port_node[ports[0]]
+    cur_left = node_center[cur_group] - node_width[cur_group] / 2
+
+    for p in ports:
+        if cur_group != port_node[p]:
+            cur_group = port_node[p]
+            cur_left = node_center[cur_group] - node_width[cur_group] / 2
+
+        port_left[p] = cur_left
+        port_right[p] = cur_left + (new_arcs[port_arc[p]][2] / total)
+        cur_left = port_right[p]
         
-    # Plot arcs
+    # Ribbon boundaries
     
-    node_index = {}
-    for i in range(len(new_nodes)):
-        cur_node = new_nodes[i]
-        node_index[cur_node] = i
+    port_index = [0] * len(port_node)
+    for i, p in enumerate(ports):
+        port_index[p] = i
     
-    lefts = []
-    rights = []
+    outer = []
+    inner = []
     arc_colors = []
-    for a in new_arcs:
-        source = a[0]
-        dest = a[1]
-        color = a[3] if len(a) >= 4 and pd.notna(a[3]) else "lightgray"
-
-        if node_index[source] > node_index[dest]:
+    max_radius = 0
+    for source, dest, _, color in new_arcs:
+        if port_index[source] > port_index[dest]:
             source, dest = dest, source # swap so order is left to right
         
-        # Create arc coordinates
-        lefts += node_boundary_dict[source]      
-        rights += node_boundary_dict[dest][::-1]
+        # Outer boundary runs from the source's left edge to the dest's
+        # right edge; inner from the source's right edge to the dest's left
+        src_left, src_right = port_left[source], port_right[source]
+        dst_left, dst_right = port_left[dest], port_right[dest]
+        outer.append((src_left, dst_right))
+        inner.append((src_right, dst_left))
         arc_colors.append(color)
-    
-    max_radius = 0
 
-    # draw the two boundary arcs for each proportional arc
-    for i in range(0, len(lefts), 2):
-        color = arc_colors[i // 2]
+        max_radius = max(max_radius, abs(dst_right - src_left) / 2,
+                         abs(dst_left - src_right) / 2)
+
+    return Layout(
+        chart="proportion_arc",
+        figsize=(figwidth, fig_height),
+        title=title,
+        # Tight x-limits around the node rectangles so there's no dead space
+        xlim=(-widths[0] / 2 - gap, x_positions[-1] + widths[-1] / 2 + gap),
+        ylim=(-0.2, max_radius * 2),
+        nodes=list(nodes),
+        labels=wrapped_nodes,
+        x_positions=x_positions,
+        widths=widths,
+        node_colors=bar_colors,
+        ribbon_outer=outer,
+        ribbon_inner=inner,
+        ribbon_colors=arc_colors,
+    )
 
-        cur_radius = draw_arc(lefts[i], rights[i], ax, color)
-        if cur_radius > max_radius:
-            max_radius = cur_radius
 
-        cur_radius = draw_arc(lefts[i+1], rights[i+1], ax, color)
-        if cur_radius > max_radius:
-            max_radius = cur_radius
+def _tessellation_steps(layout, tessellation="fixed", dpi=None):
+    """
+    Number of points sampled along each ribbon boundary of ``layout``: 100
+    for "fixed", or one count per ribbon picked from its size in pixels at
+    'dpi' (default rcParams['figure.dpi']) for "adaptive" (so tiny ribbons
+    don't carry the full 100 points per side).
+
+    """
+    if tessellation != "adaptive":
+        return [100] * len(layout["ribbon_outer"])
+
+    width_px, height_px = axes_pixel_size(layout["figsize"], dpi)
+    x_scale = width_px / (layout["xlim"][1] - layout["xlim"][0])
+    y_scale = height_px / (layout["ylim"][1] - layout["ylim"][0])
+    return [adaptive_steps(half_ellipse_length_px(left, right, x_scale, y_scale))
+            for left, right in layout["ribbon_outer"]]
+
+
+@staged("render")
+def render_proportion_arc_layout(layout, ax, tessellation="fixed", dpi=None):
+    """
+    Draw a proportional arc chart layout (from
+    ``compute_proportion_arc_layout``) onto ``ax``. "adaptive" tessellation
+    samples for 'dpi', the resolution the figure will be saved at (default
+    the figure's own dpi); pass the savefig dpi when it differs.
+
+    """
+    # Rectangles beneath each node label at their width-aware positions
+    ax.bar(layout["x_positions"], [-2] * len(layout["nodes"]),
+           width=layout["widths"], color=layout["node_colors"])
+    ax.set_xticks(layout["x_positions"])
+    ax.set_xticklabels(layout["labels"])
+
+    # draw the two boundary arcs for each proportional arc
+    for outer, inner, color in zip(layout["ribbon_outer"],
+                                   layout["ribbon_inner"],
+                                   layout["ribbon_colors"]):
+        draw_arc(outer[0], outer[1], ax, color)
+        draw_arc(inner[0], inner[1], ax, color)
 
     # shade the area between the two boundaries
-    for i in range(0, len(lefts), 2):
-        color = arc_colors[i // 2]
-        shade_arc((lefts[i], rights[i]), (lefts[i+1], rights[i+1]), ax, color)
+    steps = _tessellation_steps(layout, tessellation,
+                                dpi or ax.figure.dpi)
+    for outer, inner, color, n_steps in zip(layout["ribbon_outer"],
+                                            layout["ribbon_inner"],
+                                            layout["ribbon_colors"], steps):
+        shade_arc(outer, inner, ax, color, steps=n_steps)
         
     # Final adjustments
-    ax.set_ylim(-0.2, max_radius * 2)
-    # Tight x-limits around the node rectangles so there's no dead space
-    ax.set_xlim(-widths[0] / 2 - gap, x_positions[-1] + widths[-1] / 2 + gap)
+    ax.set_ylim(*layout["ylim"])
+    ax.set_xlim(*layout["xlim"])
 
     ax.set_yticklabels([])
     ax.spines[["left", "right", "top", "bottom"]].set_visible(False)
     ax.tick_params(axis = "both", length = 0)
     
-    ax.set_title(title)
-            
-    plt.show()
-        
+    ax.set_title(layout["title"])
+
+
+def proportion_arc_chart( df:pd.DataFrame=None, source_col="source", dest_col="dest", color_col="color", value_col="value", nodes=[], arcs=[], crossing_method = "sort", figsize = "auto", title: str = "", x_label_padding: float = 1.05, group_dict=None, color_dict=None, gap: float = 0.15, tessellation="fixed", pyplot=True, workers=1):
+    """
+    Inputs:
+    -- nodes:  input nodes (previously split)
+    -- arcs  list of tuples to specify arcs (undirected)
+      -- Index 0:  label of node 1
+      -- Index 1:  label of node 2
+      -- Index 2:  arc value (total or percentage)
+      -- Index 3:  arc color (optional, default lightgray)
+    -- crossing_method:  "sort" (default) orders each node's ribbons by
+                         where they go (sort_ports, O(m log m)); LS for
+                         local search, LA for local adjusting, None for
+                         neither. Every method but None first reorders the
+                         nodes themselves (node_cluster_order: the best of
+                         AVSDF, spectral and local adjusting; "sort" tries
+                         the multilevel engine instead of local adjusting,
+                         which would cost O(n^2) full crossing counts).
+                         "multilevel" orders the nodes with
+                         count_crossing.multilevel instead, for graphs too
+                         large for node_cluster_order, then sorts ports.
+                         "auto" picks one of these (and 'workers') from
+                         the graph size (crossing_cost.py)
+    -- workers:  for LS / LA, refine the ports of nodes that share no arc
+                 in this many processes at once (None: one per CPU); 1
+                 (default) refines the nodes one after another. Both give
+                 the same order. With "auto", the most processes it may
+                 use
+    -- gap:  spacing (in the same units as rectangle widths, i.e. fractions
+             of `total`) inserted between neighboring node rectangles. With
+             variable widths this controls how tightly nodes sit next to one
+             another; smaller values minimize whitespace.
+    -- tessellation:  "fixed" samples every ribbon boundary with 100 points;
+                      "adaptive" picks the sample count per ribbon from its
+                      on-screen size at the figure size and the figure's
+                      DPI (to save at another DPI, draw the layout with
+                      render_proportion_arc_layout(..., dpi=))
+    -- pyplot:  True (default) draws on a pyplot figure and calls plt.show();
+                False draws on a standalone Agg Figure that pyplot never
+                sees and doesn't show it (non-blocking, thread-safe)
+
+    Output: proportional arc chart showing flow from sources to destinations,
+            returned as (fig, ax)
+
+    """
+
+    layout = compute_proportion_arc_layout(
+        df=df, source_col=source_col, dest_col=dest_col, color_col=color_col,
+        value_col=value_col, nodes=nodes, arcs=arcs,
+        crossing_method=crossing_method, figsize=figsize, title=title,
+        x_label_padding=x_label_padding, group_dict=group_dict,
+        color_dict=color_dict, gap=gap, workers=workers)
+
+    fig, ax = new_figure(layout["figsize"], pyplot=pyplot)
+    render_proportion_arc_layout(layout, ax, tessellation=tessellation)
+
+    if pyplot:
+        import matplotlib.pyplot as plt
+        plt.show()
+
+    return fig, ax
+
     
 def read_csv(file_name, source_col = "source", dest_col = "dest", connections_col = "connections", color_col = "color", default_color = "lightgray"):
     """
@@ -471,6 +626,7 @@ def read_csv(file_name, source_col = "source", dest_col = "dest", connections_co
         Total of each location = sum of arc weights where location is either source or dest
     
     """
+    import pandas as pd
 
     df = pd.read_csv(file_name)
     
@@ -561,11 +717,15 @@ if __name__ == "__main__":
 
     print(f"Original graph. {len(nodes)} nodes and {len(arcs)} edges")
 
-    proportion_arc_chart(
-        nodes,
-        arcs,
-        group_dict=group_dict,
-        color_dict=color_dict,
-        crossing_method="LS",
-        title="Test: Arc Colors Different from Node Colors"
-    )
+    from instrument import recording
+
+    with recording() as stats:
+        proportion_arc_chart(
+            nodes=nodes,
+            arcs=arcs,
+            group_dict=group_dict,
+            color_dict=color_dict,
+            crossing_method="LS",
+            title="Test: Arc Colors Different from Node Colors"
+        )
+    print(stats.report())
@@ -0,0 +1,436 @@
+"""
+Direct SVG / PNG output
+-- writes a computed chart layout straight to SVG text without creating a
+   matplotlib figure or any artists, for bulk server-side rendering
+-- ribbon and ring outlines come from geometry.py, the same builders the
+   matplotlib renderers use, so both backends draw identical shapes
+-- PNG output goes through matplotlib's Agg canvas only when requested
+
+Layouts come from the ``compute_*_layout`` functions of each chart module
+(see layout.py); basic/grouped arc, proportional arc and chord charts are
+supported.
+
+"""
+
+import os
+import re
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from geometry import (CLOSEPOLY, CURVE3, LINETO, MOVETO, batched_by_steps,
+                      chord_ribbon_paths, half_ellipse_points,
+                      node_ring_paths, proportional_ribbon_polygon)
+from instrument import staged
+
+
+# matplotlib defaults mirrored here so output lines up with the Agg render
+_DPI = 100
+_SUBPLOT = {"left": 0.125, "right": 0.9, "bottom": 0.11, "top": 0.88}
+_FONT_SIZE_PT = 10
+_TITLE_SIZE_PT = 12
+_TITLE_PAD_PT = 6
+_TICK_PAD_PT = 3.5
+_FONT_FAMILY = "DejaVu Sans, Bitstream Vera Sans, Arial, sans-serif"
+
+# matplotlib's own color names; CSS names ("lightgray") are SVG keywords
+_BASE_COLORS = {"b": "#0000ff", "g": "#008000", "r": "#ff0000",
+                "c": "#00bfbf", "m": "#bf00bf", "y": "#bfbf00",
+                "k": "#000000", "w": "#ffffff"}
+_TAB10 = ("#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+          "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf")
+_TAB_COLORS = dict(zip(("blue", "orange", "green", "red", "purple", "brown",
+                        "pink", "gray", "olive", "cyan"), _TAB10),
+                   grey=_TAB10[7])
+
+
+def _svg_color(color):
+    """
+    Convert a matplotlib color spec to an SVG color, without matplotlib for
+    the common ones: RGB(A) tuples, hex strings, gray levels ("0.5"), the
+    one-letter and "tab:" names, "C0".."C9" (the default color cycle) and
+    CSS names, which SVG takes as they are. Alpha is dropped, as in
+    matplotlib's to_hex. Anything else ("xkcd:sky blue", ...) still goes
+    through matplotlib.colors.
+
+    """
+    if not isinstance(color, str):
+        channels = [min(max(float(v), 0.0), 1.0) for v in color][:3]
+        return "#" + "".join(f"{round(v * 255):02x}" for v in channels)
+
+    name = color.strip().lower()
+    if re.fullmatch(r"#([0-9a-f]{3,4}|[0-9a-f]{6}|[0-9a-f]{8})", name):
+        digits = name[1:]
+        if len(digits) <= 4:
+            digits = "".join(d * 2 for d in digits)
+        return "#" + digits[:6]
+    if name in _BASE_COLORS:
+        return _BASE_COLORS[name]
+    if name.startswith("tab:") and name[4:] in _TAB_COLORS:
+        return _TAB_COLORS[name[4:]]
+    if re.fullmatch(r"c[0-9]", name):
+        return _TAB10[int(name[1])]
+    if re.fullmatch(r"[a-z]+", name):
+        return name
+    try:
+        level = float(name)
+    except ValueError:
+        from matplotlib.colors import to_hex
+        return to_hex(color)
+    return _svg_color((level, level, level))
+
+
+def _pt_to_px(pt, dpi):
+    return pt * dpi / 72
+
+
+def _axes_box(layout, dpi, equal_aspect=False):
+    """
+    Return (left, top, width, height) of the axes in pixels, using the same
+    default subplot margins as ``plt.subplots``. With `equal_aspect` the box
+    shrinks (centered) so one data unit has the same length on both axes.
+
+    """
+    fig_w = layout["figsize"][0] * dpi
+    fig_h = layout["figsize"][1] * dpi
+    left = fig_w * _SUBPLOT["left"]
+    width = fig_w * (_SUBPLOT["right"] - _SUBPLOT["left"])
+    top = fig_h * (1 - _SUBPLOT["top"])
+    height = fig_h * (_SUBPLOT["top"] - _SUBPLOT["bottom"])
+
+    if equal_aspect:
+        x_span = layout["xlim"][1] - layout["xlim"][0]
+        y_span = layout["ylim"][1] - layout["ylim"][0]
+        scale = min(width / x_span, height / y_span)
+        left += (width - x_span * scale) / 2
+        top += (height - y_span * scale) / 2
+        width = x_span * scale
+        height = y_span * scale
+    return left, top, width, height
+
+
+def _data_to_px(layout, box):
+    """
+    Return a function mapping an (..., 2) array of data coordinates to SVG
+    pixel coordinates (y pointing down) inside `box`.
+
+    """
+    left, top, width, height = box
+    x0, x1 = layout["xlim"]
+    y0, y1 = layout["ylim"]
+    sx = width / (x1 - x0)
+    sy = height / (y1 - y0)
+
+    def transform(points):
+        points = np.asarray(points, dtype=float)
+        out = np.empty_like(points)
+        out[..., 0] = left + (points[..., 0] - x0) * sx
+        out[..., 1] = top + height - (points[..., 1] - y0) * sy
+        return out
+
+    return transform
+
+
+def _path_data(verts, codes):
+    """
+    Turn a vertex array and matplotlib-style code array into SVG path data.
+    CURVE3 codes come in (control point, end point) pairs.
+
+    """
+    parts = []
+    i = 0
+    n = len(codes)
+    while i < n:
+        code = codes[i]
+        x, y = verts[i]
+        if code == MOVETO:
+            parts.append(f"M{x:.2f} {y:.2f}")
+        elif code == LINETO:
+            parts.append(f"L{x:.2f} {y:.2f}")
+        elif code == CURVE3:
+            ex, ey = verts[i + 1]
+            parts.append(f"Q{x:.2f} {y:.2f} {ex:.2f} {ey:.2f}")
+            i += 1
+        elif code == CLOSEPOLY:
+            parts.append("Z")
+        i += 1
+    return "".join(parts)
+
+
+def _points_data(points, closed=False):
+    """
+    SVG path data for a polyline through `points`.
+
+    """
+    data = "M" + "L".join(f"{x:.2f} {y:.2f}" for x, y in points)
+    return data + "Z" if closed else data
+
+
+def _svg_document(layout, dpi, body, box):
+    """
+    Wrap `body` elements in an SVG document sized to the layout's figure,
+    with a clip path for the axes box and the chart title.
+
+    """
+    fig_w = layout["figsize"][0] * dpi
+    fig_h = layout["figsize"][1] * dpi
+    left, top, width, height = box
+
+    title = ""
+    if layout.get("title"):
+        font_px = _pt_to_px(_TITLE_SIZE_PT, dpi)
+        title_y = fig_h * (1 - _SUBPLOT["top"]) - _pt_to_px(_TITLE_PAD_PT, dpi)
+        title_x = fig_w * (_SUBPLOT["left"] + _SUBPLOT["right"]) / 2
+        title = (f'<text x="{title_x:.2f}" y="{title_y:.2f}" '
+                 f'font-size="{font_px:.2f}" text-anchor="middle">'
+                 f'{escape(str(layout["title"]))}</text>')
+
+    return "\n".join([
+        '<?xml version="1.0" encoding="utf-8"?>',
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{fig_w:.0f}" '
+        f'height="{fig_h:.0f}" viewBox="0 0 {fig_w:.2f} {fig_h:.2f}" '
+        f'font-family="{_FONT_FAMILY}">',
+        f'<rect width="100%" height="100%" fill="#ffffff"/>',
+        '<defs><clipPath id="axes">'
+        f'<rect x="{left:.2f}" y="{top:.2f}" width="{width:.2f}" '
+        f'height="{height:.2f}"/></clipPath></defs>',
+        *body,
+        title,
+        '</svg>',
+    ])
+
+
+def _tick_labels(layout, box, to_px, dpi):
+    """
+    Centered (possibly multi-line) x-tick labels below the axes box.
+
+    """
+    labels = []
+    font_px = _pt_to_px(_FONT_SIZE_PT, dpi)
+    label_top = box[1] + box[3] + _pt_to_px(_TICK_PAD_PT, dpi)
+    colors = layout.get("label_colors") or ["black"] * len(layout["labels"])
+    for x, label, color in zip(layout["x_positions"], layout["labels"], colors):
+        x_px = to_px([(x, 0)])[0, 0]
+        lines = str(label).split("\n")
+        tspans = "".join(
+            f'<tspan x="{x_px:.2f}" dy="{font_px * (0.8 if i == 0 else 1.2):.2f}">'
+            f'{escape(line)}</tspan>' for i, line in enumerate(lines))
+        labels.append(f'<text y="{label_top:.2f}" font-size="{font_px:.2f}" '
+                      f'text-anchor="middle" fill="{_svg_color(color)}">'
+                      f'{tspans}</text>')
+    return labels
+
+
+# --- Basic / grouped arc chart ---
+
+def basic_arc_svg(layout, tessellation="fixed", dpi=_DPI):
+    """
+    Render a basic (or grouped) arc chart layout to SVG text. Arcs are
+    sampled with 100 points each regardless of `tessellation`, matching
+    matplotlib's own smooth Arc patch.
+
+    Inputs:
+        layout:        Layout from ``basic_arc.compute_basic_arc_layout`` or
+                       ``cluster_arc.compute_grouped_arc_layout``
+        tessellation:  accepted for a uniform signature; unused
+        dpi:           pixels per inch for the output canvas (default 100)
+
+    Output:
+        SVG document as a string
+
+    """
+    box = _axes_box(layout, dpi)
+    to_px = _data_to_px(layout, box)
+
+    arcs = []
+    for (left, right), color, width in zip(layout["arcs"],
+                                           layout["arc_colors"],
+                                           layout["arc_widths"]):
+        points = to_px(half_ellipse_points(left, right, 100, aspect=0.5))
+        arcs.append(f'<path d="{_points_data(points)}" fill="none" '
+                    f'stroke="{_svg_color(color)}" '
+                    f'stroke-width="{_pt_to_px(width, dpi):.2f}"/>')
+
+    body = ['<g clip-path="url(#axes)">', *arcs, '</g>',
+            *_tick_labels(layout, box, to_px, dpi)]
+    return _svg_document(layout, dpi, body, box)
+
+
+# --- Proportional arc chart ---
+
+def proportion_arc_svg(layout, tessellation="fixed", dpi=_DPI):
+    """
+    Render a proportional arc chart layout to SVG text.
+
+    Inputs:
+        layout:        Layout from
+                       ``proportion_arc.compute_proportion_arc_layout``
+        tessellation:  "fixed" or "adaptive" (see ``proportion_arc_chart``)
+        dpi:           pixels per inch for the output canvas (default 100)
+
+    Output:
+        SVG document as a string
+
+    """
+    from proportion_arc import _tessellation_steps
+
+    box = _axes_box(layout, dpi)
+    to_px = _data_to_px(layout, box)
+
+    shapes = []
+    # Node rectangles hang below y=0 and get clipped by the axes box
+    for x, w, color in zip(layout["x_positions"], layout["widths"],
+                           layout["node_colors"]):
+        (x0, y0), (x1, y1) = to_px([(x - w / 2, 0), (x + w / 2, -2)])
+        shapes.append(f'<rect x="{x0:.2f}" y="{y0:.2f}" '
+                      f'width="{x1 - x0:.2f}" height="{y1 - y0:.2f}" '
+                      f'fill="{_svg_color(color)}"/>')
+
+    steps = _tessellation_steps(layout, tessellation, dpi)
+    stroke_px = _pt_to_px(0.5, dpi)
+    outlines = []
+    fills = []
+    for outer, inner, color, n_steps in zip(layout["ribbon_outer"],
+                                            layout["ribbon_inner"],
+                                            layout["ribbon_colors"], steps):
+        color = _svg_color(color)
+        for left, right in (outer, inner):
+            points = to_px(half_ellipse_points(left, right, n_steps))
+            outlines.append(f'<path d="{_points_data(points)}" fill="none" '
+                            f'stroke="{color}" stroke-width="{stroke_px:.2f}"/>')
+        points = to_px(proportional_ribbon_polygon(outer, inner, n_steps))
+        fills.append(f'<path d="{_points_data(points, closed=True)}" '
+                     f'fill="{color}" fill-opacity="0.5"/>')
+
+    body = ['<g clip-path="url(#axes)">', *shapes, *outlines, *fills, '</g>',
+            *_tick_labels(layout, box, to_px, dpi)]
+    return _svg_document(layout, dpi, body, box)
+
+
+# --- Chord chart ---
+
+def chord_chart_svg(layout, tessellation="fixed", dpi=_DPI):
+    """
+    Render a chord chart layout to SVG text.
+
+    Inputs:
+        layout:        Layout from ``chord_chart.compute_chord_layout``
+        tessellation:  "fixed" or "adaptive" (see ``chord_chart_plot``)
+        dpi:           pixels per inch for the output canvas (default 100)
+
+    Output:
+        SVG document as a string
+
+    """
+    from chord_chart import _tessellation_steps
+
+    box = _axes_box(layout, dpi, equal_aspect=True)
+    to_px = _data_to_px(layout, box)
+    ring_steps, arc_steps = _tessellation_steps(layout, tessellation, dpi)
+
+    body = ['<g clip-path="url(#axes)">']
+
+    if layout["nodes"]:
+        verts, codes = node_ring_paths(layout["node_start"], layout["node_end"],
+                                       ring_steps=ring_steps)
+        stroke_px = _pt_to_px(0.5, dpi)
+        for v, color in zip(to_px(verts), layout["node_colors"]):
+            body.append(f'<path d="{_path_data(v, codes)}" '
+                        f'fill="{_svg_color(color)}" stroke="#ffffff" '
+                        f'stroke-width="{stroke_px:.2f}"/>')
+
+    if layout["ribbon_src"]:
+        if np.ndim(arc_steps) == 0:
+            verts, codes = chord_ribbon_paths(layout["ribbon_src"],
+                                              layout["ribbon_dst"],
+                                              arc_steps=arc_steps)
+            paths = [(v, codes) for v in verts]
+        else:
+            paths = batched_by_steps(chord_ribbon_paths, layout["ribbon_src"],
+                                     layout["ribbon_dst"], arc_steps)
+        for (v, codes), color in zip(paths, layout["ribbon_colors"]):
+            body.append(f'<path d="{_path_data(to_px(v), codes)}" '
+                        f'fill="{_svg_color(color)}" fill-opacity="0.6"/>')
+    body.append('</g>')
+
+    # Labels sit just outside the ring, rotated radially; labels on the
+    # left half flip 180 degrees so text stays upright
+    font_px = _pt_to_px(_FONT_SIZE_PT, dpi)
+    for start, end, label, color in zip(layout["node_start"],
+                                        layout["node_end"], layout["nodes"],
+                                        layout["label_colors"]):
+        angle = (start + end) / 2
+        x, y = to_px([(1.14 * np.cos(angle), 1.14 * np.sin(angle))])[0]
+        rotation = np.degrees(angle)
+        anchor = "start"
+        if np.cos(angle) < 0:
+            rotation += 180
+            anchor = "end"
+        body.append(f'<text x="{x:.2f}" y="{y:.2f}" font-size="{font_px:.2f}" '
+                    f'text-anchor="{anchor}" dominant-baseline="central" '
+                    f'fill="{_svg_color(color)}" '
+                    f'transform="rotate({-rotation:.2f} {x:.2f} {y:.2f})">'
+                    f'{escape(str(label))}</text>')
+
+    return _svg_document(layout, dpi, body, box)
+
+
+# --- Output ---
+
+_SVG_WRITERS = {
+    "basic_arc": basic_arc_svg,
+    "proportion_arc": proportion_arc_svg,
+    "chord": chord_chart_svg,
+}
+
+
+@staged("render")
+def layout_to_svg(layout, tessellation="fixed", dpi=_DPI):
+    """
+    Render any supported chart layout to SVG text.
+
+    """
+    try:
+        writer = _SVG_WRITERS[layout["chart"]]
+    except KeyError:
+        raise ValueError(f"No SVG writer for chart type {layout['chart']!r}.")
+    return writer(layout, tessellation=tessellation, dpi=dpi)
+
+
+def _render_png(layout, file_name, tessellation="fixed", dpi=_DPI):
+    """
+    Draw the layout with the matplotlib renderer on a standalone Agg canvas
+    (no pyplot figure manager involved) and save it as PNG.
+
+    """
+    from helper import new_figure
+    from layout import render_layout
+
+    fig, ax = new_figure(layout["figsize"], pyplot=False, dpi=dpi)
+    render_layout(layout, ax, tessellation=tessellation, dpi=dpi)
+    fig.savefig(file_name, dpi=dpi)
+
+
+def save_layout(layout, file_name, tessellation="fixed", dpi=_DPI):
+    """
+    Write a chart layout to `file_name`. ``.svg`` files are written directly
+    as text; ``.png`` files go through the Agg renderer. Raises ValueError
+    for any other extension.
+
+    Inputs:
+        layout:        Layout from any ``compute_*_layout`` function
+        file_name:     output path ending in ``.svg`` or ``.png``
+        tessellation:  "fixed" or "adaptive" ribbon sampling
+        dpi:           pixels per inch (default 100)
+
+    """
+    extension = os.path.splitext(str(file_name))[1].lower()
+    if extension == ".png":
+        _render_png(layout, file_name, tessellation=tessellation, dpi=dpi)
+        return
+    if extension != ".svg":
+        raise ValueError(f"Unknown output format for {str(file_name)!r}; "
+                         f"expected .svg or .png.")
+
+    with open(file_name, "w", encoding="utf-8") as f:
+        f.write(layout_to_svg(layout, tessellation=tessellation, dpi=dpi))
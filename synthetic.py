@@ -0,0 +1,327 @@
+"""
+Synthetic graphs
+-- reproducible random graphs at any size, for scaling studies and for
+   stress-testing every chart type beyond the bundled datasets
+-- every generator takes a `seed` and returns plain lists in the shapes the
+   chart functions accept: node labels and (source, dest, weight) edges;
+   the clustered generator also returns a ``group_dict``
+-- ``to_dataframe`` / ``write_csv`` turn a graph into the source,dest,value
+   edge list the chart functions and the batch renderer read
+-- standard library only (pandas is imported by ``to_dataframe`` alone)
+
+Generators:
+    erdos_renyi       m distinct edges chosen uniformly (G(n, m))
+    power_law         Chung-Lu graph with a power-law expected degree
+                      sequence: a few hubs, many low-degree nodes
+    planted_clusters  k groups with a chosen share of edges inside groups
+    flow_graph        weighted flows like power_grid.csv: every node has a
+                      heavy self-loop and edges may run both ways
+
+Command line (writes CSVs usable with ``python -m arcproportion render``):
+
+    python synthetic.py planted_clusters 200 600 --seed 1 --out edges.csv
+                        --groups groups.csv
+
+"""
+
+import argparse
+import csv
+import random
+import sys
+
+
+def _labels(n, prefix="v"):
+    return [f"{prefix}{i}" for i in range(n)]
+
+
+def _check_edges(n, m):
+    limit = n * (n - 1) // 2
+    if m > limit:
+        raise ValueError(f"A simple graph on {n} nodes has at most {limit} "
+                         f"edges; {m} requested.")
+
+
+def _distinct_pairs(rng, n, m, pick, allowed=None):
+    """
+    Draw `m` distinct unordered pairs of node indices, each from ``pick()``.
+    After too many rejected draws (a skewed `pick` near saturation) the
+    remaining pairs are chosen uniformly from those still free.
+
+    Inputs:
+        rng:      random.Random instance
+        n:        number of nodes
+        m:        number of pairs to draw
+        pick:     callable returning a candidate (i, j) pair
+        allowed:  optional predicate; pairs it rejects are never returned
+
+    Output:  list of (i, j) pairs with i < j, in draw order
+
+    """
+    pairs = []
+    seen = set()
+    attempts = 0
+    while len(pairs) < m and attempts < 20 * m + 100:
+        attempts += 1
+        i, j = pick()
+        if i == j:
+            continue
+        pair = (min(i, j), max(i, j))
+        if pair in seen or (allowed is not None and not allowed(*pair)):
+            continue
+        seen.add(pair)
+        pairs.append(pair)
+
+    if len(pairs) < m:
+        free = [(i, j) for i in range(n) for j in range(i + 1, n)
+                if (i, j) not in seen and (allowed is None or allowed(i, j))]
+        if len(free) < m - len(pairs):
+            raise ValueError(f"Only {len(pairs) + len(free)} distinct edges "
+                             f"are possible; {m} requested.")
+        pairs += rng.sample(free, m - len(pairs))
+    return pairs
+
+
+def _weighted(rng, labels, pairs, weights):
+    low, high = weights
+    return [(labels[i], labels[j], rng.randint(low, high)) for i, j in pairs]
+
+
+def erdos_renyi(n, m, seed=0, weights=(1, 100)):
+    """
+    Uniform random graph with `n` nodes and exactly `m` distinct edges, no
+    self-loops.
+
+    Inputs:
+        n:        number of nodes
+        m:        number of edges (at most n * (n - 1) / 2)
+        seed:     random seed; the same arguments always give the same graph
+        weights:  (low, high) inclusive range of integer edge weights
+
+    Output:
+        (nodes, edges)
+            nodes:  list of labels "v0" ... "v{n-1}"
+            edges:  list of (source, dest, weight) tuples
+
+    """
+    _check_edges(n, m)
+    rng = random.Random(seed)
+    pairs = _distinct_pairs(rng, n, m, lambda: rng.sample(range(n), 2))
+    labels = _labels(n)
+    return labels, _weighted(rng, labels, pairs, weights)
+
+
+def power_law(n, m, exponent=2.5, seed=0, weights=(1, 100)):
+    """
+    Chung-Lu random graph whose expected degrees follow a power law with
+    the given `exponent`: node i is picked as an endpoint with probability
+    proportional to (i + 1) ** (-1 / (exponent - 1)). Node "v0" is the
+    biggest hub. No self-loops or duplicate edges.
+
+    Inputs:
+        n, m, seed, weights:  as in ``erdos_renyi``
+        exponent:             degree-distribution exponent (> 1); smaller
+                              values give heavier hubs
+
+    Output:  (nodes, edges) as in ``erdos_renyi``
+
+    """
+    if exponent <= 1:
+        raise ValueError("exponent must be greater than 1.")
+    _check_edges(n, m)
+    rng = random.Random(seed)
+    fitness = [(i + 1) ** (-1 / (exponent - 1)) for i in range(n)]
+    population = range(n)
+
+    def pick():
+        return tuple(rng.choices(population, weights=fitness, k=2))
+
+    pairs = _distinct_pairs(rng, n, m, pick)
+    labels = _labels(n)
+    return labels, _weighted(rng, labels, pairs, weights)
+
+
+def planted_clusters(n, m, k=4, p_in=0.8, seed=0, weights=(1, 100)):
+    """
+    Graph with `k` planted groups of (almost) equal size. About `p_in` of
+    the edges join two members of the same group, the rest join different
+    groups, so a good ordering keeps groups contiguous.
+
+    Inputs:
+        n, m, seed, weights:  as in ``erdos_renyi``
+        k:                    number of groups
+        p_in:                 share of edges inside groups (0..1)
+
+    Output:
+        (nodes, edges, group_dict)
+            group_dict:  node label -> group label "g0" ... "g{k-1}";
+                         nodes are listed group by group
+
+    """
+    if not 1 <= k <= n:
+        raise ValueError(f"k must be between 1 and n ({n}); got {k}.")
+    _check_edges(n, m)
+    rng = random.Random(seed)
+
+    group_of = [i * k // n for i in range(n)]
+    members = [[] for _ in range(k)]
+    for i, g in enumerate(group_of):
+        members[g].append(i)
+
+    # Pick a group by its number of internal pairs, then a pair inside it
+    group_pairs = [len(ms) * (len(ms) - 1) // 2 for ms in members]
+    m_in = m if k == 1 else min(round(m * p_in), sum(group_pairs))
+
+    def pick_inside():
+        ms = members[rng.choices(range(k), weights=group_pairs)[0]]
+        return tuple(rng.sample(ms, 2))
+
+    pairs = _distinct_pairs(rng, n, m_in, pick_inside,
+                            allowed=lambda i, j: group_of[i] == group_of[j])
+    pairs += _distinct_pairs(rng, n, m - m_in,
+                             lambda: rng.sample(range(n), 2),
+                             allowed=lambda i, j: group_of[i] != group_of[j])
+
+    labels = _labels(n)
+    group_dict = {labels[i]: f"g{group_of[i]}" for i in range(n)}
+    return labels, _weighted(rng, labels, pairs, weights), group_dict
+
+
+def flow_graph(n, m, self_loops=True, reciprocal=0.3, seed=0):
+    """
+    Weighted flow graph in the shape of power_grid.csv: every node keeps a
+    large share of its flow (a self-loop), and some pairs exchange flow in
+    both directions. Weights are log-normal, so a few flows dominate.
+
+    Inputs:
+        n:           number of nodes
+        m:           number of flows between distinct nodes (at most
+                     n * (n - 1); both directions of a pair count)
+        self_loops:  add one self-loop per node (not counted in `m`)
+        reciprocal:  chance that a flow also gets a reverse flow
+        seed:        random seed
+
+    Output:  (nodes, edges) as in ``erdos_renyi``; an edge (a, b, w) and its
+             reverse (b, a, w') may both appear
+
+    """
+    if m > n * (n - 1):
+        raise ValueError(f"At most {n * (n - 1)} directed flows fit on {n} "
+                         f"nodes; {m} requested.")
+    rng = random.Random(seed)
+    labels = _labels(n)
+
+    def flow():
+        return max(1, round(rng.lognormvariate(3, 1.2)))
+
+    directed = set()
+    edges = []
+    pairs = _distinct_pairs(rng, n, min(m, n * (n - 1) // 2),
+                            lambda: rng.sample(range(n), 2))
+    for i, j in pairs:
+        if len(edges) >= m:
+            break
+        if rng.random() < 0.5:
+            i, j = j, i
+        directed.add((i, j))
+        edges.append((labels[i], labels[j], flow()))
+        if len(edges) < m and rng.random() < reciprocal:
+            directed.add((j, i))
+            edges.append((labels[j], labels[i], flow()))
+
+    # Fill up with reverse flows when m exceeds the undirected pairs
+    reverse = [(j, i) for i, j in directed if (j, i) not in directed]
+    rng.shuffle(reverse)
+    for i, j in reverse[:m - len(edges)]:
+        edges.append((labels[i], labels[j], flow()))
+
+    if self_loops:
+        edges = [(label, label, flow() * 10) for label in labels] + edges
+    return labels, edges
+
+
+def round_robin_groups(nodes, k=4):
+    """
+    Assign nodes to `k` groups in turn ("g0", "g1", ...), for running grouped
+    charts on generators without planted groups.
+
+    """
+    return {node: f"g{i % k}" for i, node in enumerate(nodes)}
+
+
+def to_dataframe(edges, source_col="source", dest_col="dest",
+                 value_col="value"):
+    """
+    Edge list as a DataFrame with the given column names, ready for the
+    ``df=`` argument of any chart function.
+
+    """
+    import pandas as pd
+
+    return pd.DataFrame(list(edges), columns=[source_col, dest_col, value_col])
+
+
+def write_csv(edges, file_name, group_dict=None, groups_file=None):
+    """
+    Write edges as a source,dest,value CSV and, optionally, `group_dict` as
+    a node,group CSV (the formats the batch renderer reads).
+
+    """
+    with open(file_name, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["source", "dest", "value"])
+        writer.writerows(edges)
+
+    if group_dict is not None and groups_file is not None:
+        with open(groups_file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["node", "group"])
+            writer.writerows(group_dict.items())
+
+
+GENERATORS = {"erdos_renyi": erdos_renyi, "power_law": power_law,
+              "planted_clusters": planted_clusters, "flow_graph": flow_graph}
+
+
+def generate(kind, n, m, seed=0, groups=4):
+    """
+    Run generator `kind` (a GENERATORS key) and always return a group
+    assignment too: the planted groups for "planted_clusters", otherwise
+    ``round_robin_groups`` with `groups` groups.
+
+    Output:  (nodes, edges, group_dict)
+
+    """
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown generator {kind!r}; expected one of "
+                         f"{', '.join(GENERATORS)}.")
+    if kind == "planted_clusters":
+        return planted_clusters(n, m, k=groups, seed=seed)
+    nodes, edges = GENERATORS[kind](n, m, seed=seed)
+    return nodes, edges, round_robin_groups(nodes, groups)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python synthetic.py",
+                                     description="Write a synthetic graph "
+                                                 "as CSV.")
+    parser.add_argument("kind", choices=sorted(GENERATORS))
+    parser.add_argument("n", type=int, help="number of nodes")
+    parser.add_argument("m", type=int, help="number of edges")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=int, default=4,
+                        help="number of groups (default 4)")
+    parser.add_argument("--out", required=True, help="edge CSV to write")
+    parser.add_argument("--groups", metavar="FILE",
+                        help="also write a node,group CSV")
+    args = parser.parse_args(argv)
+
+    nodes, edges, group_dict = generate(args.kind, args.n, args.m,
+                                        seed=args.seed, groups=args.k)
+    write_csv(edges, args.out, group_dict, args.groups)
+    print(f"{args.kind}: {len(nodes)} nodes, {len(edges)} edges -> "
+          f"{args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())